@@ -0,0 +1,85 @@
+import glob
+import os
+import tempfile
+from typing import Callable, Dict, List
+
+from src.fake_services.server import RECORDINGS_DIR
+from src.prompt_template import build_analysis_prompt
+from src.services.cctv_fetcher import parse_news_index, parse_item_content
+from src.utils import html_optimizer, html_renderer
+from src.utils.image_processor import create_image_grid
+from src.utils.news_tagger import DEFAULT_DICTIONARY_PATH, NewsTagger
+
+# 基准测试与本地假服务共用录制的页面与图片
+FIXTURES_DIR = RECORDINGS_DIR
+
+
+def _read_text(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def _read_images() -> List[bytes]:
+    images = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, 'images', '*.jpg'))):
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return images
+
+
+class BenchmarkCase:
+    """一个基准测试用例：name 为基线中的键，iterations 为默认的计时次数。"""
+
+    def __init__(self, name: str, func: Callable[[], object], iterations: int, description: str):
+        self.name = name
+        self.func = func
+        self.iterations = iterations
+        self.description = description
+
+
+def load_cases() -> Dict[str, BenchmarkCase]:
+    index_html = _read_text('cctv_index.html')
+    item_html = _read_text('cctv_item.html')
+    analysis_text = _read_text('gemini_analysis.md')
+    images = _read_images()
+    # 与线上一致：一次分析约十余条新闻
+    news_contents = [parse_item_content(item_html, f"[视频]新闻{i}") for i in range(12)]
+    grid_path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "collage.jpg")
+
+    def render_html():
+        # 清空渲染缓存，测量的是真实的解析与渲染开销
+        html_renderer._render_cache.clear()
+        return html_renderer.render_platform_html(analysis_text)
+
+    rendered = html_renderer.render_platform_html(analysis_text)
+
+    def optimize_html():
+        html_optimizer._optimize_cache.clear()
+        return html_optimizer.optimize_platform_html(rendered)
+
+    # 优化器不应增大发布内容
+    for platform, report in optimize_html()[1].items():
+        if report["optimized_bytes"] > report["original_bytes"]:
+            raise RuntimeError(f"{platform} 的 HTML 优化后变大: {report['original_bytes']} -> {report['optimized_bytes']} 字节")
+
+    tagger = NewsTagger.from_file(DEFAULT_DICTIONARY_PATH)
+
+    cases = [
+        BenchmarkCase("parse_news_index", lambda: parse_news_index(index_html), 200,
+                      "BeautifulSoup 解析新闻联播索引页"),
+        BenchmarkCase("parse_item_content", lambda: parse_item_content(item_html, "[视频]新闻"), 300,
+                      "CONTENT_PATTERN 提取正文 + markdownify"),
+        BenchmarkCase("build_analysis_prompt", lambda: build_analysis_prompt(news_contents), 2000,
+                      "格式化新闻列表并填入分析提示词"),
+        BenchmarkCase("render_platform_html", render_html, 300,
+                      "Markdown 解析 + 标题间距处理 + 各平台模板渲染"),
+        BenchmarkCase("optimize_platform_html", optimize_html, 50,
+                      "各平台 HTML 清理、空节点合并与 CSS 内联"),
+        BenchmarkCase("compile_tagger", lambda: NewsTagger.from_file(DEFAULT_DICTIONARY_PATH), 50,
+                      "读取标签词典并编译 Aho-Corasick 自动机"),
+        BenchmarkCase("tag_contents", lambda: tagger.tag_contents(news_contents), 300,
+                      "一次扫描为十余条新闻打上板块、公司与政策标签"),
+        BenchmarkCase("create_image_grid", lambda: create_image_grid(images[:6], grid_path), 10,
+                      "解码 6 张图片、拼接 3x2 网格并按预算编码"),
+    ]
+    return {case.name: case for case in cases}
@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+# --- 配置项 ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DEFAULT_MODULE = "src.main"
+# 这些依赖只应在对应阶段执行时按需导入 (见 src/services/registry.py)，出现在启动导入中即视为回退
+LAZY_MODULES = ["google.generativeai", "PIL", "bs4", "lxml", "markdownify", "markdown", "premailer", "bleach", "numpy", "scipy"]
+DEFAULT_TOP = 15
+DEFAULT_RUNS = 5
+
+# python -X importtime 的输出行: "import time:  self [us] | cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_importtime(module: str) -> List[Dict[str, Any]]:
+    """在新的解释器中导入模块，返回每个被导入模块的自身耗时、累计耗时 (微秒) 与嵌套深度。"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    records = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            # 每多一层嵌套多缩进两个空格
+            records.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                            "depth": (len(indent) - 1) // 2})
+    return records
+
+
+def measure_cold_start(module: str, runs: int) -> List[float]:
+    """多次在新解释器中导入模块，返回每次的墙钟耗时 (秒)，包含解释器自身的启动。"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=PROJECT_ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def build_report(module: str, records: List[Dict[str, Any]], timings: List[float], top: int) -> Dict[str, Any]:
+    imported = {record["module"] for record in records}
+    target = next((record for record in records if record["module"] == module), None)
+    # 目标模块直接导入的依赖 (深度比目标多一层)，按累计耗时排序，定位拖慢启动的入口
+    target_depth = target["depth"] if target else 0
+    direct = [record for record in records if record["depth"] == target_depth + 1]
+    return {
+        "module": module,
+        "import_ms": round(target["cumulative_us"] / 1000, 1) if target else None,
+        "cold_start_ms": round(statistics.median(timings) * 1000, 1) if timings else None,
+        "module_count": len(records),
+        "eager_lazy_modules": [name for name in LAZY_MODULES if name in imported],
+        "top_cumulative": sorted(direct, key=lambda record: record["cumulative_us"], reverse=True)[:top],
+        "top_self": sorted(records, key=lambda record: record["self_us"], reverse=True)[:top],
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"模块: {report['module']}",
+        f"导入耗时: {report['import_ms']} ms (共导入 {report['module_count']} 个模块)",
+    ]
+    if report["cold_start_ms"] is not None:
+        lines.append(f"冷启动中位数: {report['cold_start_ms']} ms (含解释器启动)")
+    lines += ["", f"{'直接依赖':<48}{'累计 ms':>10}"]
+    lines += [f"{record['module']:<48}{record['cumulative_us'] / 1000:>10.1f}" for record in report["top_cumulative"]]
+    lines += ["", f"{'自身耗时最多的模块':<48}{'自身 ms':>10}"]
+    lines += [f"{record['module']:<48}{record['self_us'] / 1000:>10.1f}" for record in report["top_self"]]
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="启动导入耗时分析 (基于 python -X importtime)。")
+    parser.add_argument("module", nargs="?", default=DEFAULT_MODULE, help=f"要分析的模块，默认 {DEFAULT_MODULE}")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP, help="列出耗时最多的模块数")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="测量冷启动的次数，0 为不测量")
+    parser.add_argument("--budget-ms", type=float, default=None, help="导入耗时超过该值时以非零状态退出")
+    parser.add_argument("--json", dest="json_path", help="同时把报告写入指定的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    report = build_report(args.module, run_importtime(args.module), measure_cold_start(args.module, args.runs), args.top)
+    print(format_report(report))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=4)
+
+    failed = False
+    if report["eager_lazy_modules"]:
+        print(f"\n>>> [失败] 以下依赖应按需导入，却在启动时被导入: {report['eager_lazy_modules']}")
+        failed = True
+    if args.budget_ms is not None and report["import_ms"] is not None and report["import_ms"] > args.budget_ms:
+        print(f"\n>>> [失败] 导入耗时 {report['import_ms']} ms 超出预算 {args.budget_ms} ms。")
+        failed = True
+    if not failed:
+        print("\n>>> 启动导入检查通过。")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
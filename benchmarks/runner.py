@@ -0,0 +1,179 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict
+
+from benchmarks.cases import BenchmarkCase, load_cases
+
+# --- 配置项 ---
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# p50 延迟或峰值内存超过基线的该比例即视为回退
+DEFAULT_THRESHOLD = 0.25
+# p50 与基线相差不到该值 (毫秒) 时视为计时噪声，不按比例判定回退
+NOISE_FLOOR_MS = 0.05
+WARMUP_ITERATIONS = 3
+# 单个样本至少计时这么久；更快的用例会在一个样本内连续调用多次，降低计时噪声
+MIN_SAMPLE_SECONDS = 0.005
+# 每个用例至少计时这么久，默认计时次数不足时自动增加，使中位数足够稳定
+MIN_CASE_SECONDS = 1.0
+# 超出基线的用例会重新测量，取 p50 最好的一次；只有持续的回退才判定失败
+CONFIRM_RUNS = 2
+
+
+def measure(case: BenchmarkCase, iterations: int = None) -> Dict[str, Any]:
+    """
+    运行一个用例，返回吞吐量、延迟分位数与峰值内存。
+    未指定 iterations 时使用用例的默认次数，并在总计时不足 MIN_CASE_SECONDS 时按预热耗时增加次数。
+    """
+    # 被测函数中的进度输出不计入结果，也不刷屏
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        for _ in range(WARMUP_ITERATIONS):
+            case.func()
+        per_call = (time.perf_counter() - t0) / WARMUP_ITERATIONS
+        batch = max(1, int(MIN_SAMPLE_SECONDS / per_call)) if per_call else 1
+        if not iterations:
+            iterations = max(case.iterations, math.ceil(MIN_CASE_SECONDS / (per_call * batch))) if per_call else case.iterations
+
+        samples = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            for _ in range(batch):
+                case.func()
+            samples.append((time.perf_counter() - t0) / batch)
+        total = time.perf_counter() - started
+
+        # tracemalloc 会显著拖慢执行，峰值内存单独测一次；
+        # 先回收一次，使循环垃圾的回收时机与前面运行过的用例无关，峰值可复现
+        gc.collect()
+        tracemalloc.start()
+        case.func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations * batch / total, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> Dict[str, str]:
+    """
+    与基线比较，返回 {用例: 回退说明}。基线中没有的用例不参与比较。
+    p50 须同时超出基线的 threshold 比例与 NOISE_FLOOR_MS 才算回退，微秒级用例的计时抖动不会触发失败。
+    """
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        problems = []
+        for metric in ("p50_ms", "peak_kb"):
+            if metric == "p50_ms" and result[metric] - base.get(metric, 0) < NOISE_FLOOR_MS:
+                continue
+            if base.get(metric) and result[metric] > base[metric] * (1 + threshold):
+                problems.append(f"{metric} {base[metric]} -> {result[metric]} (+{(result[metric] / base[metric] - 1) * 100:.0f}%)")
+        if problems:
+            regressions[name] = "; ".join(problems)
+    return regressions
+
+
+def format_results(results: Dict[str, Dict], baseline: Dict[str, Dict]) -> str:
+    header = f"{'用例':<24}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'峰值 KB':>10}{'基线 p50':>10}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        base_p50 = baseline.get(name, {}).get("p50_ms", "-")
+        lines.append(f"{name:<24}{r['ops_per_sec']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['peak_kb']:>10}{base_p50:>10}")
+    return "\n".join(lines)
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get("cases", {})
+
+
+def save_baseline(results: Dict[str, Dict], path: str = BASELINE_PATH) -> None:
+    data = {
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()},
+        "cases": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+        f.write("\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="流水线 CPU 热点的基准测试。")
+    parser.add_argument("cases", nargs="*", help="只运行指定的用例，默认全部")
+    parser.add_argument("--iterations", type=int, default=None, help="覆盖各用例默认的计时次数")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="允许的回退比例，默认 0.25")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入 baseline.json")
+    parser.add_argument("--json", dest="json_path", help="同时把结果写入指定的 JSON 文件")
+    args = parser.parse_args(argv)
+
+    cases = load_cases()
+    selected = args.cases or list(cases)
+    unknown = [name for name in selected if name not in cases]
+    if unknown:
+        parser.error(f"未知的用例: {unknown}，可选: {list(cases)}")
+
+    results = {}
+    for name in selected:
+        print(f">>> 运行 {name}: {cases[name].description} ...")
+        results[name] = measure(cases[name], args.iterations)
+
+    baseline = load_baseline()
+    regressions = {}
+    if not args.update_baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for _ in range(CONFIRM_RUNS):
+            if not regressions:
+                break
+            print(f">>> 重新测量超出基线的用例，排除机器负载的瞬时波动: {list(regressions)}")
+            for name in regressions:
+                rerun = measure(cases[name], args.iterations)
+                if rerun["p50_ms"] < results[name]["p50_ms"]:
+                    results[name] = rerun
+            regressions = compare(results, baseline, args.threshold)
+
+    print()
+    print(format_results(results, baseline))
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+
+    if args.update_baseline:
+        save_baseline({**baseline, **results})
+        print(f"\n>>> 基线已更新: {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\n>>> [失败] 以下用例超出基线 {args.threshold:.0%}:")
+        for name, detail in regressions.items():
+            print(f"    - {name}: {detail}")
+        return 1
+    print("\n>>> 所有用例均在基线范围内。" if baseline else "\n>>> 尚无基线，使用 --update-baseline 生成。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
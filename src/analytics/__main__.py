@@ -0,0 +1,21 @@
+import argparse
+
+from src.analytics.trends import update_trends
+from src.utils.logger import set_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="增量更新标签索引，并导出标签趋势、突增与共现统计 (CSV / JSON)。")
+    parser.add_argument("--output-dir", default=None, help="输出目录，默认使用 [Analytics] output_dir (留空为 data/analytics)")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有索引，按当前词典重新处理全部归档")
+    args = parser.parse_args()
+
+    set_logger()
+    result = update_trends(rebuild=args.rebuild, output_dir=args.output_dir)
+    if result:
+        for path in sorted(result["files"].values()):
+            print(f"    {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,388 @@
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import scipy.sparse as sp
+
+from src.config import ANALYTICS_CONFIG
+from src.utils.json_store import STATE_DIR, write_text_atomic
+from src.utils.news_archive import NewsArchive, news_archive
+from src.utils.news_tagger import NewsTagger, get_tagger
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+ANALYTICS_DIR = os.path.join(STATE_DIR, 'analytics')
+INDEX_NAME = "term_index.npz"
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+# 上升最快的标签：最近 RISING_RECENT_DAYS 天与之前 RISING_BASELINE_DAYS 天的覆盖率之比
+RISING_RECENT_DAYS = 28
+RISING_BASELINE_DAYS = 84
+# 计算增长倍数时给覆盖率加的平滑项，避免从 0 次到 1 次的标签排在最前
+RISING_SMOOTHING = 0.01
+RISING_MIN_ITEMS = 2
+# 计算共现的标签类别，以及输出共现对的最少共同出现条数
+COOCCURRENCE_KINDS = ("policy", "sector")
+MIN_COOCCURRENCE = 2
+# z 分数的标准差下限：基线期几乎没有出现过的标签，单次出现不至于得到无穷大的 z 分数
+MIN_STD = 0.05
+# 报表供看板等其他程序读取
+REPORT_FILE_MODE = 0o644
+UNIX_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def _ordinal(news_date: str) -> int:
+    return datetime.date.fromisoformat(news_date).toordinal()
+
+
+def _date(ordinal: int) -> str:
+    return datetime.date.fromordinal(int(ordinal)).isoformat()
+
+
+def _dates(ordinals: np.ndarray) -> List[str]:
+    """批量把 date.toordinal() 转为 "YYYY-MM-DD" 字符串。"""
+    return (np.asarray(ordinals, dtype=np.int64) - UNIX_EPOCH_ORDINAL).astype("datetime64[D]").astype(str).tolist()
+
+
+class TermIndex:
+    """
+    增量维护的 "新闻条目 × 标签" 计数矩阵，以 COO 三元组保存在 data/analytics/term_index.npz。
+
+    每条新闻一行 (记录所属日期)，每个标签 (如 "sector:电力设备") 一列，值为标签在该条新闻中的出现次数。
+    每天的归档按 (修改时间, 大小) 记录版本，更新时只重新处理新增或变化的日期；
+    标签词典变化后标签的含义可能改变，整体重建。
+    """
+
+    def __init__(self, directory: str = ANALYTICS_DIR):
+        self.path = os.path.join(directory, INDEX_NAME)
+        self._reset("")
+
+    def _reset(self, dictionary: str) -> None:
+        self.dictionary = dictionary
+        self.terms: List[str] = []
+        self.codes: List[str] = []
+        self.term_ids: Dict[str, int] = {}
+        self.versions: Dict[str, Tuple[int, int]] = {}
+        self.item_day = np.zeros(0, dtype=np.int32)
+        self.rows = np.zeros(0, dtype=np.int32)
+        self.cols = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int32)
+
+    @property
+    def item_count(self) -> int:
+        return len(self.item_day)
+
+    def load(self) -> "TermIndex":
+        if not os.path.exists(self.path):
+            return self
+        with np.load(self.path, allow_pickle=False) as data:
+            self.dictionary = str(data["dictionary"])
+            self.terms = data["terms"].tolist()
+            self.codes = data["codes"].tolist()
+            self.versions = {news_date: (int(mtime), int(size)) for news_date, mtime, size
+                             in zip(data["version_dates"].tolist(), data["version_mtimes"], data["version_sizes"])}
+            self.item_day, self.rows, self.cols, self.counts = data["item_day"], data["rows"], data["cols"], data["counts"]
+        self.term_ids = {term: index for index, term in enumerate(self.terms)}
+        return self
+
+    def save(self) -> None:
+        """整个索引写入一个 npz 文件并原子替换，读者不会读到不一致的矩阵与版本记录。"""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".npz")
+        dates = sorted(self.versions)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, dictionary=np.array(self.dictionary), terms=np.array(self.terms, dtype=str),
+                         codes=np.array(self.codes, dtype=str), version_dates=np.array(dates, dtype=str),
+                         version_mtimes=np.array([self.versions[d][0] for d in dates], dtype=np.int64),
+                         version_sizes=np.array([self.versions[d][1] for d in dates], dtype=np.int64),
+                         item_day=self.item_day, rows=self.rows, cols=self.cols, counts=self.counts)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _term_id(self, tag: Dict[str, Any]) -> int:
+        term = f"{tag['kind']}:{tag['tag']}"
+        if term not in self.term_ids:
+            self.term_ids[term] = len(self.terms)
+            self.terms.append(term)
+            self.codes.append(tag.get("code") or "")
+        return self.term_ids[term]
+
+    def _drop_days(self, ordinals: List[int]) -> None:
+        """删除这些日期的所有新闻行，其余行重新编号。"""
+        keep = ~np.isin(self.item_day, np.array(ordinals, dtype=np.int32))
+        new_rows = np.cumsum(keep, dtype=np.int64) - 1
+        entry_keep = keep[self.rows]
+        self.rows = new_rows[self.rows[entry_keep]].astype(np.int32)
+        self.cols, self.counts = self.cols[entry_keep], self.counts[entry_keep]
+        self.item_day = self.item_day[keep]
+
+    def update(self, archive: NewsArchive, tagger: NewsTagger) -> Dict[str, int]:
+        """按归档的当前状态更新索引，返回新增/更新与删除的天数。"""
+        if self.dictionary != tagger.digest:
+            if self.dictionary:
+                logger.info("标签词典已变化，重建标签索引。")
+            self._reset(tagger.digest)
+        versions = {news_date: self.archive_version(archive, news_date) for news_date in archive.dates()}
+        changed = [news_date for news_date, version in versions.items() if version and self.versions.get(news_date) != version]
+        removed = [news_date for news_date in self.versions if news_date not in versions]
+        if not changed and not removed:
+            return {"updated": 0, "removed": 0}
+
+        self._drop_days([_ordinal(news_date) for news_date in changed + removed])
+        item_day, rows, cols, counts = [], [], [], []
+        for news_date in changed:
+            episode = archive.load(news_date) or {}
+            # 归档时用的是同一份词典则直接复用标签，否则按当前词典重新打标签
+            reuse = episode.get("tags_dictionary") == tagger.digest
+            for item in episode.get("items", []):
+                tags = item["tags"] if reuse and "tags" in item else \
+                    tagger.tag_text(f"{item.get('title', '')}\n{item.get('content') or ''}")
+                row = self.item_count + len(item_day)
+                item_day.append(_ordinal(news_date))
+                for tag in tags:
+                    rows.append(row)
+                    cols.append(self._term_id(tag))
+                    counts.append(tag["count"])
+            self.versions[news_date] = versions[news_date]
+        for news_date in removed:
+            del self.versions[news_date]
+
+        self.item_day = np.concatenate([self.item_day, np.array(item_day, dtype=np.int32)])
+        self.rows = np.concatenate([self.rows, np.array(rows, dtype=np.int32)])
+        self.cols = np.concatenate([self.cols, np.array(cols, dtype=np.int32)])
+        self.counts = np.concatenate([self.counts, np.array(counts, dtype=np.int32)])
+        self.save()
+        return {"updated": len(changed), "removed": len(removed)}
+
+    @staticmethod
+    def archive_version(archive: NewsArchive, news_date: str) -> Optional[Tuple[int, int]]:
+        version = archive.version(news_date)
+        return (int(version[0]), int(version[1])) if version else None
+
+    def matrix(self) -> sp.csr_matrix:
+        """新闻条目 × 标签的计数矩阵。"""
+        return sp.csr_matrix((self.counts, (self.rows, self.cols)), shape=(self.item_count, len(self.terms)), dtype=np.float64)
+
+
+class TrendReport:
+    """
+    基于 TermIndex 的向量化统计，所有按天、按周的聚合都是稀疏矩阵乘法：
+        days × items 的归属矩阵 S 乘以 items × terms 的计数矩阵 X，得到 days × terms 的每日计数；
+        滚动窗口与基线窗口是 days × days 的带状矩阵。
+    覆盖率 (share) = 提到某标签的新闻条数 / 当期新闻总条数，不受每天新闻条数多少的影响。
+    """
+
+    def __init__(self, index: TermIndex, settings: Dict[str, Any] = None):
+        self.index = index
+        self.settings = dict(settings or ANALYTICS_CONFIG)
+        counts = index.matrix()
+        self.first = int(index.item_day.min())
+        self.day_count = int(index.item_day.max()) - self.first + 1
+        day_of_item = index.item_day.astype(np.int64) - self.first
+        membership = sp.csr_matrix((np.ones(index.item_count), (day_of_item, np.arange(index.item_count))),
+                                   shape=(self.day_count, index.item_count))
+        mentioned = counts.copy()
+        mentioned.data[:] = 1.0
+        self.items = mentioned
+        # 每日的出现次数、提到该标签的新闻条数与新闻总条数 (没有归档的日期为 0)
+        self.daily_mentions = (membership @ counts).tocsr()
+        self.daily_items = (membership @ mentioned).tocsr()
+        self.items_per_day = np.bincount(day_of_item, minlength=self.day_count).astype(np.float64)
+
+    def _term_fields(self, column: int) -> Tuple[str, str, str]:
+        kind, _, tag = self.index.terms[column].partition(":")
+        return tag, kind, self.index.codes[column]
+
+    def _band(self, offsets: range) -> sp.csr_matrix:
+        """days × days 的带状矩阵：第 t 行在 t + offset 列为 1，用于按窗口求和。超出日期范围的对角线省略。"""
+        offsets = [offset for offset in offsets if abs(offset) < self.day_count]
+        if not offsets:
+            return sp.csr_matrix((self.day_count, self.day_count))
+        return sp.diags([np.ones(self.day_count - abs(offset)) for offset in offsets], offsets,
+                        shape=(self.day_count, self.day_count), format="csr")
+
+    def _shares(self) -> sp.csr_matrix:
+        """每日覆盖率矩阵：daily_items 的每一行除以当天的新闻条数。"""
+        inverse = np.divide(1.0, self.items_per_day, out=np.zeros(self.day_count), where=self.items_per_day > 0)
+        return (sp.diags(inverse) @ self.daily_items).tocsr()
+
+    def weekly(self) -> List[List[Any]]:
+        """每周 (周一开始) 每个标签的出现次数、提及条数与覆盖率。"""
+        ordinals = np.arange(self.day_count) + self.first
+        # date.toordinal() 中第 1 天 (0001-01-01) 是周一
+        week_of_day = (ordinals - 1) // 7
+        week_of_day -= week_of_day[0]
+        week_count = int(week_of_day[-1]) + 1
+        weeks = sp.csr_matrix((np.ones(self.day_count), (week_of_day, np.arange(self.day_count))),
+                              shape=(week_count, self.day_count))
+        mentions = (weeks @ self.daily_mentions).tocoo()
+        items = (weeks @ self.daily_items).tocsr()
+        items_per_week = weeks @ self.items_per_day
+        # 两个矩阵的非零位置相同，按出现次数矩阵的坐标一次取出提及条数
+        item_counts = np.asarray(items[mentions.row, mentions.col]).ravel()
+        shares = item_counts / items_per_week[mentions.row]
+        first_monday = ordinals[0] - (ordinals[0] - 1) % 7
+        order = np.lexsort((mentions.col, mentions.row))
+        week_starts = _dates(first_monday + 7 * mentions.row[order])
+        rows = []
+        for week_start, position in zip(week_starts, order):
+            tag, kind, code = self._term_fields(mentions.col[position])
+            rows.append([week_start, tag, kind, code, int(mentions.data[position]),
+                         int(item_counts[position]), round(float(shares[position]), 4)])
+        return rows
+
+    def rolling(self) -> List[List[Any]]:
+        """最近 rolling_days 天中，每天往前 rolling_window 天的滚动覆盖率。"""
+        window = self.settings["rolling_window"]
+        band = self._band(range(-(window - 1), 1))
+        items = (band @ self.daily_items).tocsr()
+        totals = band @ self.items_per_day
+        start = max(0, self.day_count - self.settings["rolling_days"])
+        recent = items[start:].tocoo()
+        shares = recent.data / totals[start + recent.row]
+        order = np.lexsort((recent.col, recent.row))
+        dates = _dates(self.first + start + recent.row[order])
+        rows = []
+        for news_date, position in zip(dates, order):
+            tag, kind, code = self._term_fields(recent.col[position])
+            rows.append([news_date, tag, kind, code, int(recent.data[position]), round(float(shares[position]), 4)])
+        return rows
+
+    def spikes(self) -> List[List[Any]]:
+        """
+        覆盖率的 z 分数突增：与之前 baseline_window 天 (只计有新闻的日期) 的均值和标准差比较，
+        z >= z_threshold 且基线期至少有一半的日期有新闻时记为突增。
+        """
+        window = self.settings["baseline_window"]
+        shares = self._shares()
+        band = self._band(range(-window, 0))
+        has_items = (self.items_per_day > 0).astype(np.float64)
+        observed = band @ has_items
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = np.where(observed > 0, 1.0 / observed, 0.0)
+        mean = (sp.diags(inverse) @ (band @ shares)).tocsr()
+        mean_square = (sp.diags(inverse) @ (band @ shares.power(2))).tocsr()
+
+        current = shares.tocoo()
+        valid = observed[current.row] >= window / 2
+        day_index, columns, values = current.row[valid], current.col[valid], current.data[valid]
+        if not len(values):
+            return []
+        means = np.asarray(mean[day_index, columns]).ravel()
+        variances = np.asarray(mean_square[day_index, columns]).ravel() - means ** 2
+        stds = np.maximum(np.sqrt(np.clip(variances, 0, None)), MIN_STD)
+        z_scores = (values - means) / stds
+        rows = []
+        for position in np.flatnonzero(z_scores >= self.settings["z_threshold"]):
+            tag, kind, code = self._term_fields(columns[position])
+            rows.append([_date(self.first + day_index[position]), tag, kind, code, round(float(values[position]), 4),
+                         round(float(means[position]), 4), round(float(stds[position]), 4), round(float(z_scores[position]), 2)])
+        return sorted(rows)
+
+    def rising(self) -> List[Dict[str, Any]]:
+        """最近 RISING_RECENT_DAYS 天覆盖率相对之前 RISING_BASELINE_DAYS 天增长最多的标签。"""
+        recent_start = max(0, self.day_count - RISING_RECENT_DAYS)
+        baseline_start = max(0, recent_start - RISING_BASELINE_DAYS)
+        recent_items = np.asarray(self.daily_items[recent_start:].sum(axis=0)).ravel()
+        baseline_items = np.asarray(self.daily_items[baseline_start:recent_start].sum(axis=0)).ravel()
+        recent_total = max(self.items_per_day[recent_start:].sum(), 1.0)
+        baseline_total = max(self.items_per_day[baseline_start:recent_start].sum(), 1.0)
+        recent_share, baseline_share = recent_items / recent_total, baseline_items / baseline_total
+        growth = (recent_share + RISING_SMOOTHING) / (baseline_share + RISING_SMOOTHING)
+        candidates = np.flatnonzero(recent_items >= RISING_MIN_ITEMS)
+        ranked = candidates[np.argsort(-growth[candidates], kind="stable")][:self.settings["top_n"]]
+        results = []
+        for column in ranked:
+            tag, kind, code = self._term_fields(column)
+            results.append({"tag": tag, "kind": kind, "code": code, "recent_items": int(recent_items[column]),
+                            "recent_share": round(float(recent_share[column]), 4),
+                            "baseline_share": round(float(baseline_share[column]), 4),
+                            "growth": round(float(growth[column]), 2)})
+        return results
+
+    def cooccurrence(self) -> List[List[Any]]:
+        """同一条新闻中同时出现的政策主题与板块：共同出现条数、Jaccard 系数与提升度 (lift)。"""
+        columns = np.array([index for index, term in enumerate(self.index.terms) if term.partition(":")[0] in COOCCURRENCE_KINDS],
+                           dtype=np.int64)
+        if not len(columns):
+            return []
+        binary = self.items[:, columns].tocsc()
+        together = (binary.T @ binary).tocoo()
+        totals = np.asarray(binary.sum(axis=0)).ravel()
+        item_count = max(self.index.item_count, 1)
+        rows = []
+        for i, j, count in zip(together.row, together.col, together.data):
+            if i >= j or count < MIN_COOCCURRENCE:
+                continue
+            tag_a, kind_a, _ = self._term_fields(columns[i])
+            tag_b, kind_b, _ = self._term_fields(columns[j])
+            jaccard = count / (totals[i] + totals[j] - count)
+            lift = count * item_count / (totals[i] * totals[j])
+            rows.append([tag_a, kind_a, tag_b, kind_b, int(count), round(float(jaccard), 4), round(float(lift), 2)])
+        return sorted(rows, key=lambda row: -row[4])
+
+
+def _write_csv(path: str, header: List[str], rows: List[List[Any]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    write_text_atomic(path, buffer.getvalue(), mode=REPORT_FILE_MODE)
+
+
+def _write_json(path: str, data: Any) -> None:
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=4), mode=REPORT_FILE_MODE)
+
+
+def export_reports(report: TrendReport, output_dir: str) -> Dict[str, str]:
+    """把各项统计写入 CSV / JSON，返回 {报表名: 文件路径}。"""
+    files = {name: os.path.join(output_dir, name) for name in
+             ("weekly.csv", "rolling.csv", "spikes.csv", "cooccurrence.csv", "rising.json", "summary.json")}
+    _write_csv(files["weekly.csv"], ["week", "tag", "kind", "code", "mentions", "items", "share"], report.weekly())
+    _write_csv(files["rolling.csv"], ["date", "tag", "kind", "code", "items", "share"], report.rolling())
+    _write_csv(files["spikes.csv"], ["date", "tag", "kind", "code", "share", "baseline_mean", "baseline_std", "z"], report.spikes())
+    _write_csv(files["cooccurrence.csv"], ["tag_a", "kind_a", "tag_b", "kind_b", "items", "jaccard", "lift"], report.cooccurrence())
+    _write_json(files["rising.json"], report.rising())
+    _write_json(files["summary.json"], {
+        "generated_at": datetime.datetime.now(TIMEZONE).isoformat(),
+        "first_date": _date(report.first),
+        "last_date": _date(report.first + report.day_count - 1),
+        "days": len(report.index.versions),
+        "items": report.index.item_count,
+        "terms": len(report.index.terms),
+        "dictionary": report.index.dictionary,
+        "settings": report.settings,
+        "files": sorted(files),
+    })
+    return files
+
+
+def update_trends(rebuild: bool = False, output_dir: str = None) -> Optional[Dict[str, Any]]:
+    """增量更新标签索引并重新计算全部统计。没有标签词典或归档为空时返回 None。"""
+    tagger = get_tagger()
+    if tagger is None:
+        return None
+    directory = output_dir or ANALYTICS_CONFIG["output_dir"] or ANALYTICS_DIR
+    index = TermIndex(directory)
+    if not rebuild:
+        index.load()
+    changes = index.update(news_archive, tagger)
+    if not index.item_count:
+        logger.info(">>> 归档中没有新闻，跳过趋势统计。")
+        return None
+    files = export_reports(TrendReport(index), directory)
+    logger.info(f">>> 趋势统计已更新: 新增/更新 {changes['updated']} 天，删除 {changes['removed']} 天，"
+                f"共 {len(index.versions)} 天 {index.item_count} 条新闻，报表位于 {directory}")
+    return {"changes": changes, "files": files}
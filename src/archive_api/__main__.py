@@ -0,0 +1,25 @@
+import argparse
+import asyncio
+
+from src.archive_api.server import ArchiveAPI, ArchiveAPIServer
+from src.config import ARCHIVE_API_CONFIG
+from src.utils.logger import set_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动历史归档的只读 HTTP API。")
+    parser.add_argument("--host", default=ARCHIVE_API_CONFIG["host"])
+    parser.add_argument("--port", type=int, default=ARCHIVE_API_CONFIG["port"])
+    parser.add_argument("--cache-entries", type=int, default=ARCHIVE_API_CONFIG["cache_entries"], help="内存中缓存的响应数量")
+    args = parser.parse_args()
+
+    set_logger()
+    server = ArchiveAPIServer(ArchiveAPI(cache_entries=args.cache_entries), args.host, args.port)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
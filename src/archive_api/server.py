@@ -0,0 +1,440 @@
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import http
+import json
+import logging
+import threading
+import urllib.parse
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import h11
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：未安装时只提供 gzip
+    brotli = None
+
+from src.config import ARCHIVE_API_CONFIG
+from src.utils.news_archive import NewsArchive, news_archive, normalize_date
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+SERVER_NAME = "news-archive-api"
+# 小于该字节数的响应不压缩，压缩收益抵不上开销
+MIN_COMPRESS_BYTES = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# 请求行与请求头的最大字节数
+MAX_HEADER_BYTES = 16 * 1024
+# 长连接空闲超过该秒数后关闭
+IDLE_TIMEOUT_SECONDS = 30
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# 搜索结果中匹配位置前后保留的字符数
+SNIPPET_RADIUS = 40
+
+JSON_TYPE = "application/json; charset=utf-8"
+MARKDOWN_TYPE = "text/markdown; charset=utf-8"
+HTML_TYPE = "text/html; charset=utf-8"
+
+
+class HTTPError(Exception):
+    """处理请求时的客户端错误，转换为 JSON 错误响应。"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json_body(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """把 "gzip;q=0.8, br" 解析为 {"gzip": 0.8, "br": 1.0}。"""
+    weights = {}
+    for part in value.split(","):
+        coding, *params = [piece.strip() for piece in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    return weights
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    按 Accept-Encoding 选择压缩方式：q 值最高者优先，相同时 br 优先于 gzip。
+    不压缩时返回 None。
+    """
+    if not accept_encoding:
+        return None
+    weights = parse_accept_encoding(accept_encoding)
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in available:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    identity_q = weights.get("identity", weights.get("*", 1.0))
+    # identity 的权重更高时 (如 "gzip;q=0.1, identity")，不压缩
+    if best is not None and identity_q > best_q:
+        return None
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀；"*" 匹配任何存在的表示。"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or (tag[2:] if tag.startswith("W/") else tag) == etag:
+            return True
+    return False
+
+
+class RenderedResponse:
+    """一个已渲染的响应体及其强 ETag；压缩后的版本在第一次被请求时生成并保留。"""
+
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self._variants: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # 同一内容的不同编码是不同的表示，强 ETag 必须不同
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        if encoding is None:
+            return self.body
+        with self._lock:
+            if encoding not in self._variants:
+                if encoding == "br":
+                    self._variants[encoding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+                else:
+                    # mtime=0 保证相同内容压缩出相同字节
+                    self._variants[encoding] = gzip.compress(self.body, compresslevel=GZIP_LEVEL, mtime=0)
+            return self._variants[encoding]
+
+
+class ResponseCache:
+    """
+    按 (路径, 查询串) 缓存已渲染响应的 LRU。每项记录渲染时归档的版本号
+    (文件修改时间与大小)，版本变化后视为失效，重新渲染。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, RenderedResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[str, str], version: Any) -> Optional[RenderedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: Tuple[str, str], version: Any, response: RenderedResponse) -> None:
+        with self._lock:
+            self._entries[key] = (version, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+
+class ArchiveAPI:
+    """
+    历史归档的只读 HTTP 接口 (与传输层无关，便于单独调用)：
+        GET /episodes                        所有已归档日期的摘要，按日期倒序
+        GET /episodes/{date}                 某一天的完整归档
+        GET /episodes/{date}/items           某一天的新闻条目
+        GET /episodes/{date}/analysis.md     AI 分析原文 (Markdown)
+        GET /episodes/{date}/analysis.html   AI 分析渲染后的 HTML 片段
+        GET /search?q=&from=&to=&limit=      在新闻标题与正文中搜索
+        GET /healthz                         健康检查与缓存统计
+    只读取 data/archive，不接触工作流正在使用的 news_data.json。
+    """
+
+    def __init__(self, archive: NewsArchive = news_archive, cache_entries: int = None, max_age: int = None):
+        self.archive = archive
+        self.cache = ResponseCache(cache_entries or ARCHIVE_API_CONFIG["cache_entries"])
+        self.max_age = ARCHIVE_API_CONFIG["max_age"] if max_age is None else max_age
+        # 已读取的归档 {日期: (版本号, 内容)}，列表与搜索不必每次重新解析所有文件
+        self._episodes: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        self._episodes_lock = threading.Lock()
+
+    # --- 路由 ---
+
+    def _route(self, path: str) -> Tuple[Callable[..., Tuple[bytes, str]], Tuple[str, ...], Callable[[], Any]]:
+        """返回 (渲染函数, 路径参数, 版本号函数)。"""
+        parts = [urllib.parse.unquote(part) for part in path.strip("/").split("/")]
+        if parts == ["episodes"]:
+            return self._render_episode_list, (), self.archive.archive_version
+        if parts == ["search"]:
+            return self._render_search, (), self.archive.archive_version
+        if len(parts) in (2, 3) and parts[0] == "episodes":
+            try:
+                news_date = normalize_date(parts[1])
+            except ValueError:
+                raise HTTPError(400, f"日期格式应为 YYYY-MM-DD: {parts[1]}")
+            renderers = {
+                None: self._render_episode,
+                "items": self._render_items,
+                "analysis.md": self._render_analysis_markdown,
+                "analysis.html": self._render_analysis_html,
+            }
+            resource = parts[2] if len(parts) == 3 else None
+            if resource in renderers:
+                return renderers[resource], (news_date,), lambda: self.archive.version(news_date)
+        raise HTTPError(404, f"未知的路径: {path}")
+
+    def respond(self, method: str, target: str, headers: Dict[str, str]) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """处理一个请求，返回 (状态码, 响应头, 响应体)。HEAD 请求的响应体由传输层丢弃。"""
+        url = urllib.parse.urlsplit(target)
+        try:
+            if method not in ("GET", "HEAD"):
+                raise HTTPError(405, f"不支持的请求方法: {method}")
+            if url.path == "/healthz":
+                body = _json_body({"status": "ok", "episodes": self.archive.archive_version()[0], "cache": self.cache.stats()})
+                return 200, [("content-type", JSON_TYPE), ("cache-control", "no-store")], body
+            render, args, get_version = self._route(url.path)
+            query = urllib.parse.parse_qs(url.query)
+            # 先取版本号再渲染：渲染期间文件被替换时，缓存中的旧版本号会让下一个请求重新渲染
+            version = get_version()
+            key = (url.path, url.query)
+            response = self.cache.get(key, version)
+            if response is None:
+                body, content_type = render(*args, query=query)
+                response = RenderedResponse(body, content_type)
+                self.cache.put(key, version, response)
+        except HTTPError as e:
+            extra = [("allow", "GET, HEAD")] if e.status == 405 else []
+            return e.status, [("content-type", JSON_TYPE), ("cache-control", "no-store")] + extra, \
+                _json_body({"error": e.message, "status": e.status})
+
+        encoding = choose_encoding(headers.get("accept-encoding", "")) if len(response.body) >= MIN_COMPRESS_BYTES else None
+        etag = response.etag(encoding)
+        response_headers = [
+            ("etag", etag),
+            ("cache-control", f"public, max-age={self.max_age}"),
+            ("vary", "Accept-Encoding"),
+        ]
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            return 304, response_headers, b""
+        if encoding:
+            response_headers.append(("content-encoding", encoding))
+        return 200, [("content-type", response.content_type)] + response_headers, response.encoded(encoding)
+
+    # --- 归档读取 ---
+
+    def _episode(self, news_date: str) -> Dict[str, Any]:
+        version = self.archive.version(news_date)
+        if version is None:
+            raise HTTPError(404, f"没有 {news_date} 的归档")
+        with self._episodes_lock:
+            cached = self._episodes.get(news_date)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        episode = self.archive.load(news_date)
+        if not episode:
+            raise HTTPError(404, f"没有 {news_date} 的归档")
+        with self._episodes_lock:
+            self._episodes[news_date] = (version, episode)
+        return episode
+
+    def _dates_in_range(self, query: Dict[str, List[str]]) -> List[str]:
+        bounds = []
+        for name in ("from", "to"):
+            value = query.get(name, [""])[0]
+            try:
+                bounds.append(normalize_date(value) if value else None)
+            except ValueError:
+                raise HTTPError(400, f"参数 {name} 的日期格式应为 YYYY-MM-DD: {value}")
+        start, end = bounds
+        return [news_date for news_date in self.archive.dates()
+                if (start is None or news_date >= start) and (end is None or news_date <= end)]
+
+    # --- 渲染 ---
+
+    def _render_episode_list(self, query) -> Tuple[bytes, str]:
+        episodes = []
+        for news_date in reversed(self._dates_in_range(query)):
+            try:
+                episode = self._episode(news_date)
+            except HTTPError:
+                continue  # 列出日期后文件被删除
+            episodes.append({
+                "news_date": news_date,
+                "item_count": len(episode.get("items", [])),
+                "has_analysis": bool(episode.get("analysis")),
+                "published": episode.get("published", {}),
+            })
+        return _json_body({"episodes": episodes}), JSON_TYPE
+
+    def _render_episode(self, news_date: str, query) -> Tuple[bytes, str]:
+        return _json_body(self._episode(news_date)), JSON_TYPE
+
+    def _render_items(self, news_date: str, query) -> Tuple[bytes, str]:
+        return _json_body({"news_date": news_date, "items": self._episode(news_date).get("items", [])}), JSON_TYPE
+
+    def _analysis(self, news_date: str) -> str:
+        analysis = self._episode(news_date).get("analysis")
+        if not analysis:
+            raise HTTPError(404, f"{news_date} 没有 AI 分析")
+        return analysis
+
+    def _render_analysis_markdown(self, news_date: str, query) -> Tuple[bytes, str]:
+        return self._analysis(news_date).encode("utf-8"), MARKDOWN_TYPE
+
+    def _render_analysis_html(self, news_date: str, query) -> Tuple[bytes, str]:
+        # markdown 只在第一次渲染 HTML 时导入
+        from src.utils.html_renderer import render_analysis_html
+        return render_analysis_html(self._analysis(news_date)).encode("utf-8"), HTML_TYPE
+
+    def _render_search(self, query) -> Tuple[bytes, str]:
+        keyword = query.get("q", [""])[0].strip()
+        if not keyword:
+            raise HTTPError(400, "缺少搜索关键词参数 q")
+        try:
+            limit = int(query.get("limit", [SEARCH_DEFAULT_LIMIT])[0])
+        except ValueError:
+            raise HTTPError(400, "参数 limit 应为整数")
+        limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+        needle = keyword.casefold()
+        results, total = [], 0
+        # 从最近的日期开始
+        for news_date in reversed(self._dates_in_range(query)):
+            try:
+                episode = self._episode(news_date)
+            except HTTPError:
+                continue
+            for item in episode.get("items", []):
+                title, content = item.get("title", ""), item.get("content", "")
+                position = content.casefold().find(needle)
+                if needle not in title.casefold() and position < 0:
+                    continue
+                total += 1
+                if len(results) < limit:
+                    start = max(0, position - SNIPPET_RADIUS) if position >= 0 else 0
+                    results.append({
+                        "news_date": news_date,
+                        "title": title,
+                        "url": item.get("url"),
+                        "snippet": content[start:start + 2 * SNIPPET_RADIUS + len(keyword)],
+                    })
+        return _json_body({"query": keyword, "total": total, "results": results}), JSON_TYPE
+
+
+class ArchiveAPIServer:
+    """
+    基于 asyncio + h11 的 HTTP/1.1 服务：支持长连接，归档读取与渲染在线程池中执行，
+    不阻塞事件循环上的其他连接。
+    """
+
+    def __init__(self, api: ArchiveAPI, host: str = None, port: int = None):
+        self.api = api
+        self.host = host or ARCHIVE_API_CONFIG["host"]
+        self.port = ARCHIVE_API_CONFIG["port"] if port is None else port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"--- 归档 API 已启动: http://{self.host}:{self.port} ---")
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _next_event(self, conn: h11.Connection, reader: asyncio.StreamReader):
+        while True:
+            event = conn.next_event()
+            if event is not h11.NEED_DATA:
+                return event
+            try:
+                data = await asyncio.wait_for(reader.read(65536), IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                return None
+            conn.receive_data(data)
+
+    async def _send(self, conn: h11.Connection, writer: asyncio.StreamWriter, method: str,
+                    status: int, headers: List[Tuple[str, str]], body: bytes) -> None:
+        headers = headers + [
+            ("date", email.utils.formatdate(usegmt=True)),
+            ("server", SERVER_NAME),
+        ]
+        if status != 304:
+            headers.append(("content-length", str(len(body))))
+        writer.write(conn.send(h11.Response(status_code=status, headers=headers, reason=http.HTTPStatus(status).phrase)))
+        if body and method != "HEAD" and status != 304:
+            writer.write(conn.send(h11.Data(data=body)))
+        writer.write(conn.send(h11.EndOfMessage()))
+        await writer.drain()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn = h11.Connection(h11.SERVER, max_incomplete_event_size=MAX_HEADER_BYTES)
+        try:
+            while True:
+                event = await self._next_event(conn, reader)
+                if event is None or isinstance(event, h11.ConnectionClosed):
+                    break
+                if not isinstance(event, h11.Request):
+                    continue
+                method, target = event.method.decode("ascii"), event.target.decode("ascii", "replace")
+                headers = {name.decode("ascii").lower(): value.decode("latin-1") for name, value in event.headers}
+                # 只读接口不需要请求体，读完后丢弃
+                while not isinstance(await self._next_event(conn, reader), (h11.EndOfMessage, h11.ConnectionClosed, type(None))):
+                    pass
+                if conn.their_state is not h11.DONE:
+                    break
+                status, response_headers, body = await asyncio.to_thread(self.api.respond, method, target, headers)
+                logger.debug(f"{method} {target} -> {status}")
+                await self._send(conn, writer, method, status, response_headers, body)
+                if conn.our_state is h11.MUST_CLOSE or conn.their_state is h11.MUST_CLOSE:
+                    break
+                conn.start_next_cycle()
+        except h11.RemoteProtocolError as e:
+            if conn.our_state in (h11.IDLE, h11.SEND_RESPONSE):
+                status = e.error_status_hint
+                try:
+                    await self._send(conn, writer, "GET", status, [("content-type", JSON_TYPE), ("connection", "close")],
+                                     _json_body({"error": f"无效的请求: {e}", "status": status}))
+                except (h11.LocalProtocolError, ConnectionError):
+                    pass
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"处理归档 API 请求时出错: {e}", exc_info=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import configparser
+import logging
 import os
+from urllib.parse import urlsplit
 
 
 class Config(object):
@@ -13,6 +15,21 @@ class Config(object):
         self._config = configparser.ConfigParser()
         self._config.read(self._path, encoding='utf-8')
 
+    @property
+    def mtime(self) -> float:
+        """配置文件的修改时间，常驻进程据此判断是否需要重新加载。"""
+        return os.path.getmtime(self._path)
+
+    def reload(self):
+        """
+        重新读取配置文件。先完整解析新文件，解析失败或文件不存在时抛出异常并保留原有配置。
+        ConfigParser.read 遇到不存在的文件只会返回空列表，编辑器原子保存的间隙读取会得到空配置，因此需检查返回值。
+        """
+        config = configparser.ConfigParser()
+        if not config.read(self._path, encoding='utf-8'):
+            raise FileNotFoundError(f"配置文件未找到: {self._path}")
+        self._config = config
+
     def get(self, section, name, strip_blank=True, strip_quote=True):
         """获取一个配置项的值。"""
         s = self._config.get(section, name)
@@ -70,7 +87,7 @@ def load_stage_config(config: Config) -> dict:
             cfg[key] = config.getboolean('DebugControl', key)
             
     except Exception as e:
-        print(f"加载 STAGE_CONFIG 失败，请检查 config.ini 文件: {e}")
+        logging.getLogger(__name__).error(f"加载 STAGE_CONFIG 失败，请检查 config.ini 文件: {e}")
         # 在失败时提供一个默认的安全配置
         return {
             "publish_wechat_work": False, "publish_wechat_mp": False, "publish_xueqiu": False, "publish_eastmoney": False,
@@ -84,3 +101,314 @@ def load_stage_config(config: Config) -> dict:
 
 # 加载并创建一个全局的工作流阶段配置字典
 STAGE_CONFIG = load_stage_config(global_config)
+
+
+# 各阶段的时间预算 (秒)，未配置时使用默认值
+DEFAULT_DEADLINES = {
+    "total": 1800,
+    "fetch": 300,
+    "analysis": 900,
+    "cover": 180,
+    "publish": 600,
+}
+
+
+def load_deadline_config(config: Config) -> dict:
+    """从配置文件的 [Deadlines] 段加载工作流总预算与各阶段预算。"""
+    cfg = {}
+    for key, default in DEFAULT_DEADLINES.items():
+        try:
+            cfg[key] = float(config.get('Deadlines', f"{key}_seconds"))
+        except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+            cfg[key] = default
+    return cfg
+
+# 加载并创建一个全局的时间预算字典
+DEADLINE_CONFIG = load_deadline_config(global_config)
+
+
+def load_fake_services_config(config: Config) -> dict:
+    """从配置文件的 [FakeServices] 段加载本地假服务配置，未配置时不启用。"""
+    try:
+        return {
+            "enable": config.getboolean('FakeServices', 'enable'),
+            "base_url": config.get('FakeServices', 'base_url').rstrip('/'),
+        }
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        return {"enable": False, "base_url": ""}
+
+# 加载并创建一个全局的假服务配置字典
+FAKE_SERVICES_CONFIG = load_fake_services_config(global_config)
+
+
+def load_metrics_config(config: Config) -> dict:
+    """从配置文件的 [Metrics] 段加载指标导出配置；路径留空时使用 data/metrics 下的默认位置。"""
+    cfg = {"enable": True, "report_dir": "", "textfile_path": ""}
+    try:
+        cfg["enable"] = config.getboolean('Metrics', 'enable')
+        cfg["report_dir"] = config.get('Metrics', 'report_dir')
+        cfg["textfile_path"] = config.get('Metrics', 'textfile_path')
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        pass
+    return cfg
+
+# 加载并创建一个全局的指标导出配置字典
+METRICS_CONFIG = load_metrics_config(global_config)
+
+def load_tracing_config(config: Config) -> dict:
+    """从配置文件的 [Tracing] 段加载追踪导出配置；目录留空时使用 data/traces。"""
+    cfg = {"enable": True, "trace_dir": ""}
+    try:
+        cfg["enable"] = config.getboolean('Tracing', 'enable')
+        cfg["trace_dir"] = config.get('Tracing', 'trace_dir')
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        pass
+    return cfg
+
+# 加载并创建一个全局的追踪配置字典
+TRACING_CONFIG = load_tracing_config(global_config)
+
+# 第三方库默认只输出警告，避免每个请求一行日志
+DEFAULT_MODULE_LOG_LEVELS = "httpx=WARNING, httpcore=WARNING, urllib3=WARNING, google=WARNING, PIL=WARNING"
+
+
+def parse_module_levels(value: str) -> dict:
+    """解析 "模块=级别, 模块=级别" 形式的配置，返回 {模块: 级别}。"""
+    levels = {}
+    for item in value.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def load_logging_config(config: Config) -> dict:
+    """从配置文件的 [Logging] 段加载日志级别、控制台格式与按模块的日志级别。"""
+    cfg = {"level": "INFO", "console_format": "text", "module_levels": parse_module_levels(DEFAULT_MODULE_LOG_LEVELS)}
+    for key in ("level", "console_format"):
+        try:
+            cfg[key] = config.get('Logging', key) or cfg[key]
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            pass
+    try:
+        cfg["module_levels"].update(parse_module_levels(config.get('Logging', 'module_levels')))
+    except (configparser.NoSectionError, configparser.NoOptionError):
+        pass
+    cfg["level"] = cfg["level"].upper()
+    return cfg
+
+# 加载并创建一个全局的日志配置字典
+LOGGING_CONFIG = load_logging_config(global_config)
+
+# 常驻模式的默认配置：每日运行时间、补跑窗口与各后台任务的间隔
+DEFAULT_DAEMON_CONFIG = {
+    "run_times": "20:10",
+    "retry_interval_minutes": 15,
+    "retry_until": "23:30",
+    "token_refresh_seconds": 240,
+    "outbox_poll_seconds": 60,
+    "config_poll_seconds": 5,
+    "control_host": "127.0.0.1",
+    "control_port": 8764,
+}
+
+
+def parse_clock_times(value: str) -> list:
+    """把 "20:10, 21:30" 解析为 [(20, 10), (21, 30)]，按时间排序。"""
+    times = []
+    for item in (value or "").split(","):
+        if item.strip():
+            hour, _, minute = item.strip().partition(":")
+            times.append((int(hour), int(minute or 0)))
+    return sorted(times)
+
+
+def load_daemon_config(config: Config) -> dict:
+    """从配置文件的 [Daemon] 段加载常驻模式配置，未配置的项使用默认值。"""
+    cfg = dict(DEFAULT_DAEMON_CONFIG)
+    for key, default in DEFAULT_DAEMON_CONFIG.items():
+        try:
+            value = config.get('Daemon', key)
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            continue
+        try:
+            cfg[key] = type(default)(value) if value else default
+        except ValueError:
+            logging.getLogger(__name__).error(f"[Daemon] {key} 的值无效: {value}，使用默认值 {default}")
+    try:
+        cfg["run_times"] = parse_clock_times(cfg["run_times"])
+        cfg["retry_until"] = parse_clock_times(cfg["retry_until"])[0]
+    except (ValueError, IndexError):
+        logging.getLogger(__name__).error("[Daemon] run_times / retry_until 格式应为 HH:MM，使用默认值")
+        cfg["run_times"] = parse_clock_times(DEFAULT_DAEMON_CONFIG["run_times"])
+        cfg["retry_until"] = parse_clock_times(DEFAULT_DAEMON_CONFIG["retry_until"])[0]
+    return cfg
+
+# 加载并创建一个全局的常驻模式配置字典
+DAEMON_CONFIG = load_daemon_config(global_config)
+
+# 归档 API 的默认配置
+DEFAULT_ARCHIVE_API_CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8766,
+    "cache_entries": 256,
+    "max_age": 60,
+}
+
+
+def load_archive_api_config(config: Config) -> dict:
+    """从配置文件的 [ArchiveAPI] 段加载归档 API 的监听地址、响应缓存大小与 Cache-Control 时长。"""
+    cfg = dict(DEFAULT_ARCHIVE_API_CONFIG)
+    for key, default in DEFAULT_ARCHIVE_API_CONFIG.items():
+        try:
+            value = config.get('ArchiveAPI', key)
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            continue
+        try:
+            cfg[key] = type(default)(value) if value else default
+        except ValueError:
+            logging.getLogger(__name__).error(f"[ArchiveAPI] {key} 的值无效: {value}，使用默认值 {default}")
+    return cfg
+
+# 加载并创建一个全局的归档 API 配置字典
+ARCHIVE_API_CONFIG = load_archive_api_config(global_config)
+
+# 静态站点与订阅源的默认配置
+DEFAULT_STATIC_SITE_CONFIG = {
+    "enable": False,
+    "output_dir": "",
+    "site_url": "",
+    "title": "新闻联播每日解读",
+    "index_entries": 30,
+    "feed_entries": 20,
+}
+
+
+def load_static_site_config(config: Config) -> dict:
+    """从配置文件的 [StaticSite] 段加载静态站点的输出目录、站点地址与首页/订阅源的条目数。"""
+    cfg = dict(DEFAULT_STATIC_SITE_CONFIG)
+    try:
+        cfg["enable"] = config.getboolean('StaticSite', 'enable')
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        pass
+    for key, default in DEFAULT_STATIC_SITE_CONFIG.items():
+        if key == "enable":
+            continue
+        try:
+            value = config.get('StaticSite', key)
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            continue
+        try:
+            cfg[key] = type(default)(value) if value else default
+        except ValueError:
+            logging.getLogger(__name__).error(f"[StaticSite] {key} 的值无效: {value}，使用默认值 {default}")
+    cfg["site_url"] = cfg["site_url"].rstrip("/")
+    return cfg
+
+# 加载并创建一个全局的静态站点配置字典
+STATIC_SITE_CONFIG = load_static_site_config(global_config)
+
+
+def load_tagging_config(config: Config) -> dict:
+    """从配置文件的 [Tagging] 段加载新闻标签配置；词典路径留空时使用 config/tag_dictionary.tsv。"""
+    cfg = {"enable": True, "dictionary_path": "", "prompt_hints": False, "max_prompt_tags": 8}
+    try:
+        cfg["enable"] = config.getboolean('Tagging', 'enable')
+        cfg["dictionary_path"] = config.get('Tagging', 'dictionary_path')
+        cfg["prompt_hints"] = config.getboolean('Tagging', 'prompt_hints')
+        cfg["max_prompt_tags"] = int(config.get('Tagging', 'max_prompt_tags'))
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        pass
+    return cfg
+
+# 加载并创建一个全局的新闻标签配置字典
+TAGGING_CONFIG = load_tagging_config(global_config)
+
+# 趋势统计的默认配置
+DEFAULT_ANALYTICS_CONFIG = {
+    "enable": False,
+    "output_dir": "",
+    "rolling_window": 7,
+    "rolling_days": 365,
+    "baseline_window": 28,
+    "z_threshold": 3.0,
+    "top_n": 50,
+}
+
+
+def load_analytics_config(config: Config) -> dict:
+    """从配置文件的 [Analytics] 段加载趋势统计的输出目录与各窗口参数，未配置的项使用默认值。"""
+    cfg = dict(DEFAULT_ANALYTICS_CONFIG)
+    try:
+        cfg["enable"] = config.getboolean('Analytics', 'enable')
+    except (configparser.NoSectionError, configparser.NoOptionError, ValueError):
+        pass
+    for key, default in DEFAULT_ANALYTICS_CONFIG.items():
+        if key == "enable":
+            continue
+        try:
+            value = config.get('Analytics', key)
+        except (configparser.NoSectionError, configparser.NoOptionError):
+            continue
+        try:
+            cfg[key] = type(default)(value) if value else default
+        except ValueError:
+            logging.getLogger(__name__).error(f"[Analytics] {key} 的值无效: {value}，使用默认值 {default}")
+    return cfg
+
+# 加载并创建一个全局的趋势统计配置字典
+ANALYTICS_CONFIG = load_analytics_config(global_config)
+
+
+# --- 配置热加载 ---
+# 重新读取 config.ini 后原地更新各配置字典：其他模块通过 from src.config import XXX_CONFIG 持有的是同一个字典，
+# 无需重新导入即可看到新值
+_RELOADABLE_CONFIGS = [
+    (STAGE_CONFIG, load_stage_config),
+    (DEADLINE_CONFIG, load_deadline_config),
+    (FAKE_SERVICES_CONFIG, load_fake_services_config),
+    (METRICS_CONFIG, load_metrics_config),
+    (TRACING_CONFIG, load_tracing_config),
+    (LOGGING_CONFIG, load_logging_config),
+    (DAEMON_CONFIG, load_daemon_config),
+    (ARCHIVE_API_CONFIG, load_archive_api_config),
+    (STATIC_SITE_CONFIG, load_static_site_config),
+    (TAGGING_CONFIG, load_tagging_config),
+    (ANALYTICS_CONFIG, load_analytics_config),
+]
+_reload_hooks = []
+
+
+def register_reload_hook(hook) -> None:
+    """注册配置重新加载后要执行的回调，例如丢弃按旧凭证创建的客户端。"""
+    if hook not in _reload_hooks:
+        _reload_hooks.append(hook)
+
+
+def reload_config() -> None:
+    """
+    重新读取 config.ini，原地更新所有配置字典并执行已注册的回调。
+    配置文件读取或解析失败时抛出异常 (FileNotFoundError / configparser.Error)，各配置字典保持不变。
+    """
+    global_config.reload()
+    for target, loader in _RELOADABLE_CONFIGS:
+        values = loader(global_config)
+        target.clear()
+        target.update(values)
+    for hook in list(_reload_hooks):
+        try:
+            hook()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"配置重新加载后的回调 {getattr(hook, '__qualname__', hook)} 执行失败: {e}")
+
+
+def resolve_url(url: str) -> str:
+    """
+    返回实际请求的地址。启用本地假服务时，把外部 API 的地址改写到假服务上，
+    原始主机名作为路径的第一段: https://api.weixin.qq.com/cgi-bin/token -> {base_url}/api.weixin.qq.com/cgi-bin/token
+    """
+    if not FAKE_SERVICES_CONFIG["enable"]:
+        return url
+    parts = urlsplit(url)
+    resolved = f"{FAKE_SERVICES_CONFIG['base_url']}/{parts.netloc}{parts.path}"
+    return f"{resolved}?{parts.query}" if parts.query else resolved
@@ -0,0 +1,464 @@
+import argparse
+import asyncio
+import configparser
+import datetime
+import json
+import logging
+import math
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Awaitable, Callable, Dict, Optional
+from zoneinfo import ZoneInfo
+
+from src.config import DAEMON_CONFIG, STAGE_CONFIG, global_config, reload_config
+from src.main import NEWS_DATA_CACHE_PATH, run_workflow
+from src.services.client_pool import client_pool
+from src.services.publishers import PUBLISH_TIMESTAMP_KEYS, PLATFORM_NAMES
+from src.services.publish_outbox import PublishOutbox, drain_outbox
+from src.services.registry import ANALYZERS, CLIENTS, FETCHERS, IMAGE_TOOLS, RENDERERS
+from src.utils.json_store import load_json
+from src.utils.logger import set_logger
+from src.utils.metrics import run_metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+# 控制接口与 /status 中保留的最近运行记录条数
+RUN_HISTORY_SIZE = 50
+# 调度循环最长的休眠时间，保证系统时间跳变后也能及时重新计算
+MAX_SLEEP_SECONDS = 60
+# 平台 -> [StageControl] 中的发布开关
+PUBLISH_SWITCHES = {
+    "wechat_work": "publish_wechat_work",
+    "wechat_mp": "publish_wechat_mp",
+    "xueqiu": "publish_xueqiu",
+    "eastmoney": "publish_eastmoney",
+}
+# 需要定期刷新 access_token 的平台
+TOKEN_PLATFORMS = ("wechat_mp", "wechat_work")
+
+# 任务函数可返回下次执行的时间戳，覆盖常规的调度 (用于补跑)
+JobFunc = Callable[[], Awaitable[Optional[float]]]
+Schedule = Callable[[float], float]
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None or math.isinf(timestamp):
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, TIMEZONE).isoformat(timespec="seconds")
+
+
+def every(key: str) -> Schedule:
+    """按 [Daemon] 中 key 配置的秒数间隔执行；每次计算时读取，修改配置后立即生效。"""
+    return lambda now: now + DAEMON_CONFIG[key]
+
+
+def next_daily_run(now: float) -> float:
+    """[Daemon] run_times 中下一个到来的时间点 (北京时间)；未配置运行时间时永不执行。"""
+    current = datetime.datetime.fromtimestamp(now, TIMEZONE)
+    for offset in (0, 1):
+        day = current.date() + datetime.timedelta(days=offset)
+        for hour, minute in DAEMON_CONFIG["run_times"]:
+            candidate = datetime.datetime.combine(day, datetime.time(hour, minute), TIMEZONE).timestamp()
+            if candidate > now:
+                return candidate
+    return math.inf
+
+
+def retry_window_end(now: float) -> float:
+    """当天补跑窗口的结束时间 ([Daemon] retry_until)。"""
+    hour, minute = DAEMON_CONFIG["retry_until"]
+    day = datetime.datetime.fromtimestamp(now, TIMEZONE).date()
+    return datetime.datetime.combine(day, datetime.time(hour, minute), TIMEZONE).timestamp()
+
+
+class ScheduledJob:
+    """调度器中的一个任务：schedule(now) 计算常规的下次执行时间。"""
+
+    def __init__(self, name: str, func: JobFunc, schedule: Schedule, run_now: bool = False):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.next_run = time.time() if run_now else schedule(time.time())
+        self.running = False
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "running": self.running,
+            "next_run": _isoformat(self.next_run),
+            "last_run": _isoformat(self.last_run),
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    进程内的 asyncio 调度器。到期的任务作为独立的 asyncio 任务执行，同一任务不会重叠执行；
+    任务抛出的异常只记录日志，不影响调度器与其他任务。
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._wakeup = asyncio.Event()
+        self._tasks: set = set()
+
+    def add(self, name: str, func: JobFunc, schedule: Schedule, run_now: bool = False) -> None:
+        self.jobs[name] = ScheduledJob(name, func, schedule, run_now=run_now)
+        self._wakeup.set()
+
+    def reschedule(self, name: str, when: float) -> None:
+        self.jobs[name].next_run = when
+        self._wakeup.set()
+
+    async def run_forever(self) -> None:
+        try:
+            while True:
+                now = time.time()
+                for job in self.jobs.values():
+                    if not job.running and job.next_run <= now:
+                        job.running = True
+                        task = asyncio.create_task(self._run(job), name=f"job-{job.name}")
+                        self._tasks.add(task)
+                        task.add_done_callback(self._tasks.discard)
+                pending = [job.next_run for job in self.jobs.values() if not job.running]
+                delay = min(min(pending, default=math.inf) - now, MAX_SLEEP_SECONDS)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, delay))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # 停止时取消仍在执行的任务 (包括正在进行的工作流)，并等待其清理完毕
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job: ScheduledJob) -> None:
+        started = time.time()
+        override = None
+        try:
+            override = await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = f"{type(e).__name__}: {e}"
+            logger.error(f">>> [错误] 后台任务 {job.name} 执行失败: {e}", exc_info=True)
+        finally:
+            job.running = False
+            job.last_run = started
+            job.last_duration = round(time.time() - started, 3)
+            job.next_run = override if override is not None else job.schedule(time.time())
+            self._wakeup.set()
+
+
+class NewsDaemon:
+    """
+    常驻模式：在同一进程内按计划执行工作流，替代 cron 的逐次冷启动。
+
+    - episode: 每天 run_times 运行工作流；新闻未更新或有平台未发布时，按 retry_interval_minutes 补跑直到 retry_until；
+    - outbox: 定期处理到期的发布重试任务 (取代单独运行的 outbox worker)；
+    - tokens: 定期确认微信 access_token 新鲜，发布时无需等待 /token 请求；
+    - config: config.ini 修改后自动重新加载 (工作流运行期间推迟到运行结束后)。
+
+    HTTP 会话与平台客户端保存在 client_pool 中跨运行复用，按需导入的依赖在启动时预先加载。
+    """
+
+    def __init__(self, outbox: PublishOutbox = None):
+        self.outbox = outbox or PublishOutbox()
+        self.scheduler = Scheduler()
+        self.history: deque = deque(maxlen=RUN_HISTORY_SIZE)
+        self.current_run: Optional[Dict[str, Any]] = None
+        self.started_at = time.time()
+        self.config_loaded_at = time.time()
+        self._config_mtime = global_config.mtime
+        self._run_lock = asyncio.Lock()
+        self._retrying = False
+        self._manual_task: Optional[asyncio.Task] = None
+
+    # --- 工作流 ---
+    async def run_once(self, trigger: str) -> Dict[str, Any]:
+        """执行一次工作流并记录到运行历史。同一时间只有一次工作流在运行。"""
+        async with self._run_lock:
+            started = time.time()
+            self.current_run = {"trigger": trigger, "started_at": _isoformat(started)}
+            try:
+                await run_workflow()
+            except Exception as e:
+                logger.error(f">>> [错误] 工作流异常结束: {e}", exc_info=True)
+            finally:
+                entry = {
+                    "run_id": tracer.run_id,
+                    "trigger": trigger,
+                    "started_at": _isoformat(started),
+                    "duration": round(time.time() - started, 3),
+                    "status": run_metrics.status,
+                }
+                self.history.appendleft(entry)
+                self.current_run = None
+            return entry
+
+    def episode_done(self) -> bool:
+        """今天的新闻是否已获取、分析，并发布到了所有已启用的平台。"""
+        news_data = load_json(NEWS_DATA_CACHE_PATH, default={}) or {}
+        today = datetime.datetime.now(TIMEZONE).date()
+        try:
+            news_date = datetime.datetime.strptime(news_data.get("news_date") or "", "%Y-%m-%d").date()
+        except ValueError:
+            return False
+        if news_date != today or not news_data.get("analysis"):
+            return False
+        return all(news_data.get(PUBLISH_TIMESTAMP_KEYS[platform])
+                   for platform, switch in PUBLISH_SWITCHES.items() if STAGE_CONFIG.get(switch))
+
+    async def _episode_job(self) -> Optional[float]:
+        await self.run_once("schedule")
+        if self.episode_done():
+            self._retrying = False
+            return None
+        retry_at = time.time() + DAEMON_CONFIG["retry_interval_minutes"] * 60
+        if retry_at <= retry_window_end(time.time()):
+            self._retrying = True
+            logger.info(f">>> 今日新闻尚未全部完成，将于 {_isoformat(retry_at)} 补跑。")
+            return retry_at
+        self._retrying = False
+        logger.warning(">>> [警告] 今日补跑窗口已结束，新闻仍未全部完成，等待下一个计划运行时间。")
+        return None
+
+    async def _start_manual_run(self) -> bool:
+        # 刚创建的任务可能还没拿到锁，同样视为正在运行
+        if self._run_lock.locked() or (self._manual_task and not self._manual_task.done()):
+            return False
+        self._manual_task = asyncio.create_task(self.run_once("manual"), name="manual-run")
+        return True
+
+    # --- 后台任务 ---
+    async def _outbox_job(self) -> None:
+        # 工作流运行时其发布阶段会处理 outbox，这里不再重复取任务
+        if self._run_lock.locked():
+            return None
+        results = await drain_outbox(self.outbox)
+        if results:
+            logger.info(f">>> 本轮处理了 {len(results)} 条发布任务，剩余待发送 {self.outbox.pending_count()} 条。")
+        return None
+
+    async def _token_job(self) -> None:
+        for platform in TOKEN_PLATFORMS:
+            if not STAGE_CONFIG.get(PUBLISH_SWITCHES[platform]):
+                continue
+            try:
+                client = await asyncio.to_thread(client_pool.client, platform, CLIENTS[platform])
+                await asyncio.to_thread(client.refresh_token)
+            except Exception as e:
+                logger.warning(f">>> [警告] 刷新{PLATFORM_NAMES[platform]} access_token 失败: {e}")
+        return None
+
+    async def _config_job(self) -> None:
+        try:
+            mtime = global_config.mtime
+        except OSError:
+            # 编辑器保存时文件可能短暂不存在
+            return None
+        if mtime == self._config_mtime:
+            return None
+        if self._run_lock.locked():
+            # 运行中途切换配置会让同一次运行的各阶段使用不同的配置，推迟到运行结束后
+            return None
+        try:
+            self.reload()
+        except (OSError, configparser.Error) as e:
+            # 保留原有配置；修改时间未更新，下次检查时会再次尝试
+            logger.warning(f">>> [警告] 重新加载配置失败，继续使用原有配置: {e}")
+        return None
+
+    def reload(self) -> None:
+        """重新加载 config.ini，并按新的运行时间与间隔重新排定后台任务。"""
+        reload_config()
+        self._config_mtime = global_config.mtime
+        self.config_loaded_at = time.time()
+        now = time.time()
+        for job in list(self.scheduler.jobs.values()):
+            if job.running or (job.name == "episode" and self._retrying):
+                continue
+            # 间隔缩短时立即按新间隔执行；运行时间变化时按新的时间点排定
+            regular = job.schedule(now)
+            self.scheduler.reschedule(job.name, regular if job.name == "episode" else min(job.next_run, regular))
+        logger.info(f">>> 配置已重新加载，下次计划运行: {_isoformat(self.scheduler.jobs['episode'].next_run)}")
+
+    def warm_up(self) -> None:
+        """预先导入各阶段的依赖，首次运行无需等待 Gemini SDK、Pillow 等的导入。"""
+        analyzer = "proxy" if STAGE_CONFIG.get("use_gemini_analyzer_proxy") else "default"
+        for registry, name in ((FETCHERS, "news_index"), (ANALYZERS, analyzer),
+                               (IMAGE_TOOLS, "create_cover_variants"), (RENDERERS, "render"), (RENDERERS, "optimize")):
+            try:
+                registry[name]
+            except Exception as e:
+                logger.warning(f">>> [警告] 预加载 {registry.kind} {name} 失败: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        last_run = self.history[0] if self.history else None
+        return {
+            "state": "running" if self.current_run else "idle",
+            "current_run": dict(self.current_run, run_id=tracer.run_id) if self.current_run else None,
+            "last_run": last_run,
+            "episode_done": self.episode_done(),
+            "retrying": self._retrying,
+            "started_at": _isoformat(self.started_at),
+            "config_loaded_at": _isoformat(self.config_loaded_at),
+            "outbox_pending": self.outbox.pending_count(),
+            "jobs": [job.to_dict() for job in self.scheduler.jobs.values()],
+        }
+
+    async def serve(self, run_now: bool = False) -> None:
+        """启动调度器与控制接口，直到收到 SIGINT / SIGTERM。"""
+        loop = asyncio.get_running_loop()
+        await asyncio.to_thread(self.warm_up)
+
+        self.scheduler.add("episode", self._episode_job, next_daily_run, run_now=run_now)
+        self.scheduler.add("outbox", self._outbox_job, every("outbox_poll_seconds"))
+        self.scheduler.add("tokens", self._token_job, every("token_refresh_seconds"), run_now=True)
+        self.scheduler.add("config", self._config_job, every("config_poll_seconds"))
+
+        server = ControlServer((DAEMON_CONFIG["control_host"], DAEMON_CONFIG["control_port"]), self, loop)
+        threading.Thread(target=server.serve_forever, name="daemon-control", daemon=True).start()
+
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        logger.info(f"--- 常驻模式已启动，控制接口: http://{server.server_address[0]}:{server.server_address[1]}，"
+                    f"下次计划运行: {_isoformat(self.scheduler.jobs['episode'].next_run)} ---")
+
+        scheduler_task = asyncio.create_task(self.scheduler.run_forever(), name="scheduler")
+        try:
+            await stop.wait()
+        finally:
+            logger.info("--- 常驻模式正在退出 ---")
+            scheduler_task.cancel()
+            if self._manual_task:
+                self._manual_task.cancel()
+            await asyncio.gather(scheduler_task, *(t for t in [self._manual_task] if t), return_exceptions=True)
+            server.shutdown()
+            server.server_close()
+            client_pool.close()
+
+
+class ControlServer(ThreadingHTTPServer):
+    """
+    本地控制接口 (默认只监听 127.0.0.1)：
+        GET  /status   守护进程状态、当前与上次运行、各后台任务的下次执行时间
+        GET  /runs     最近的运行记录
+        POST /run      立即运行一次工作流 (已有运行时返回 409)
+        POST /reload   立即重新加载 config.ini
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, news_daemon: NewsDaemon, loop: asyncio.AbstractEventLoop):
+        super().__init__(address, ControlHandler)
+        self.news_daemon = news_daemon
+        self.loop = loop
+
+    def call(self, func: Callable[[], Any], timeout: float = 10) -> Any:
+        """
+        在事件循环线程中执行 func (可以是协程函数) 并返回结果。
+        事件循环在 timeout 秒内没有响应时取消该调用并抛出 TimeoutError，由请求处理方返回 503。
+        """
+        lock = threading.Lock()
+        state = {"started": False, "abandoned": False}
+
+        async def runner():
+            with lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+            result = func()
+            return await result if asyncio.iscoroutine(result) else result
+        future = asyncio.run_coroutine_threadsafe(runner(), self.loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # 尚未开始执行的调用不再执行，避免请求已返回 503 后 /run 仍在稍后启动
+            with lock:
+                if not state["started"]:
+                    state["abandoned"] = True
+            raise
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    server: ControlServer
+
+    def log_message(self, format, *args):
+        logger.debug(f"控制接口: {self.address_string()} {format % args}")
+
+    def _send_json(self, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_busy(self) -> None:
+        self._send_json(503, {"error": "常驻进程暂时没有响应，请稍后重试"})
+
+    def do_GET(self):
+        try:
+            self._handle_get()
+        except TimeoutError:
+            self._send_busy()
+
+    def do_POST(self):
+        try:
+            self._handle_post()
+        except TimeoutError:
+            self._send_busy()
+
+    def _handle_get(self):
+        daemon = self.server.news_daemon
+        if self.path == "/status":
+            self._send_json(200, self.server.call(daemon.status))
+        elif self.path == "/runs":
+            self._send_json(200, self.server.call(lambda: list(daemon.history)))
+        else:
+            self._send_json(404, {"error": f"未知的路径: {self.path}"})
+
+    def _handle_post(self):
+        daemon = self.server.news_daemon
+        if self.path == "/run":
+            if self.server.call(daemon._start_manual_run):
+                self._send_json(202, {"accepted": True})
+            else:
+                self._send_json(409, {"accepted": False, "error": "已有工作流正在运行", "current_run": daemon.current_run})
+        elif self.path == "/reload":
+            if daemon.current_run:
+                self._send_json(409, {"reloaded": False, "error": "工作流正在运行，请在运行结束后重试"})
+                return
+            try:
+                self.server.call(daemon.reload)
+                self._send_json(200, {"reloaded": True, "config_loaded_at": _isoformat(daemon.config_loaded_at)})
+            except TimeoutError:
+                raise
+            except Exception as e:
+                self._send_json(500, {"reloaded": False, "error": str(e)})
+        else:
+            self._send_json(404, {"error": f"未知的路径: {self.path}"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以常驻模式运行新闻联播解读工作流。")
+    parser.add_argument("--run-now", action="store_true", help="启动后立即运行一次工作流，而不是等到下一个计划时间")
+    args = parser.parse_args()
+    set_logger()
+    asyncio.run(NewsDaemon().serve(run_now=args.run_now))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""
+外部 API 的本地替身 (央视网、抓取服务、Gemini、微信公众号、企业微信、雪球、东方财富)。
+
+回放 recordings/ 中录制的响应，可注入延迟、错误率与限流，用于离线运行、基准测试与压测。
+在 config.ini 的 [FakeServices] 中启用后，各服务模块的请求地址会通过 resolve_url 改写到这里。
+
+启动: python -m src.fake_services --port 8765 --latency-ms 200 --error-rate 0.05
+"""
+from src.fake_services.server import FakeServicesServer, ServiceBehavior, start_fake_services
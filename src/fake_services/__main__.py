@@ -0,0 +1,32 @@
+import argparse
+
+from src.fake_services.server import DEFAULT_HOST, DEFAULT_PORT, FakeServicesServer, ServiceBehavior
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动外部 API 的本地替身服务。")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的固定延迟 (毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的随机抖动范围 (毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的请求比例 (0~1)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="每个主机每秒允许的请求数，超出返回 429；0 表示不限流")
+    parser.add_argument("--seed", type=int, default=None, help="随机数种子，便于复现")
+    args = parser.parse_args()
+
+    behavior = ServiceBehavior(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit, args.seed)
+    server = FakeServicesServer((args.host, args.port), behavior=behavior)
+    print(f"--- 假服务已启动: {server.base_url} (延迟 {args.latency_ms}±{args.jitter_ms}ms, "
+          f"错误率 {args.error_rate}, 限流 {args.rate_limit or '无'}) ---")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(">>> 请求统计 (主机: {状态码: 次数}):")
+        print(server.format_stats())
+
+
+if __name__ == '__main__':
+    main()
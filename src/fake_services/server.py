@@ -0,0 +1,195 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# --- 配置项 ---
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+ROUTES_PATH = os.path.join(RECORDINGS_DIR, 'routes.json')
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class ServiceBehavior:
+    """
+    假服务的网络行为：固定延迟 + 随机抖动、按比例返回 503、按主机限流返回 429。
+    rate_limit 为每个主机每秒允许的请求数，0 表示不限流。
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 rate_limit: float = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # 按主机的令牌桶: host -> (剩余令牌, 上次补充时间)
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def delay_seconds(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def throttled(self, host: str) -> bool:
+        """令牌桶限流，桶容量等于每秒请求数。"""
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(host, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+            if tokens < 1:
+                self._buckets[host] = (tokens, now)
+                return True
+            self._buckets[host] = (tokens - 1, now)
+            return False
+
+
+class Route:
+    """routes.json 中的一条录制响应。"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.method = spec["method"].upper()
+        self.host = spec["host"]
+        self.pattern = re.compile(spec["path"])
+        self.kind = spec.get("kind", "json")
+        self.status = spec.get("status", 200)
+        self.content_type = spec.get("content_type")
+        self.file = spec.get("file")
+        self.json = spec.get("json")
+        self.latency_ms = spec.get("latency_ms")
+
+    def render(self, match: re.Match) -> Tuple[bytes, str]:
+        """返回 (响应体, Content-Type)。file 路径中的 {1} 等占位符替换为路径正则的分组。"""
+        if self.kind == "json":
+            return json.dumps(self.json, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+        path = os.path.join(RECORDINGS_DIR, self.file.format(None, *match.groups()))
+        with open(path, 'rb') as f:
+            data = f.read()
+        if self.kind == "gemini":
+            # Gemini generateContent 的响应结构，REST 接口与 SDK 共用
+            body = {
+                "candidates": [{"content": {"parts": [{"text": data.decode('utf-8')}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+            }
+            return json.dumps(body, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8"
+        return data, self.content_type or "application/octet-stream"
+
+
+def load_routes(path: str = ROUTES_PATH) -> List[Route]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return [Route(spec) for spec in json.load(f)]
+
+
+class FakeServicesServer(ThreadingHTTPServer):
+    """
+    外部 API 的本地替身。请求路径的第一段为原始主机名，例如
+    http://127.0.0.1:8765/api.weixin.qq.com/cgi-bin/token 对应 https://api.weixin.qq.com/cgi-bin/token。
+    """
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], behavior: ServiceBehavior = None, routes: List[Route] = None):
+        super().__init__(address, FakeServicesHandler)
+        self.behavior = behavior or ServiceBehavior()
+        self.routes = routes if routes is not None else load_routes()
+        self.stats: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def match(self, method: str, host: str, path: str) -> Tuple[Optional[Route], Optional[re.Match]]:
+        for route in self.routes:
+            if route.method == method and route.host == host:
+                match = route.pattern.match(path)
+                if match:
+                    return route, match
+        return None, None
+
+    def record(self, host: str, status: int) -> None:
+        with self._stats_lock:
+            self.stats[host][status] += 1
+
+    def format_stats(self) -> str:
+        with self._stats_lock:
+            return "\n".join(f"    {host}: {dict(codes)}" for host, codes in sorted(self.stats.items()))
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    server: FakeServicesServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # 压测时访问日志量很大，默认不输出
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Dict[str, str] = None) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'), "application/json; charset=utf-8", headers)
+
+    def _handle(self) -> None:
+        # 读完请求体，保持长连接可复用
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        host, _, path = self.path.lstrip("/").partition("/")
+        path = "/" + urlsplit(path).path
+        behavior = self.server.behavior
+
+        route, match = self.server.match(self.command, host, path)
+        delay = behavior.delay_seconds()
+        if route is not None and route.latency_ms is not None:
+            delay += route.latency_ms / 1000
+        if delay:
+            time.sleep(delay)
+
+        if behavior.throttled(host):
+            self.server.record(host, 429)
+            self._send_json(429, {"error": "fake throttled"}, {"Retry-After": "1"})
+            return
+        if behavior.should_fail():
+            self.server.record(host, 503)
+            self._send_json(503, {"error": "fake injected failure"})
+            return
+        if route is None:
+            self.server.record(host, 404)
+            self._send_json(404, {"error": f"no recording for {self.command} {host}{path}"})
+            return
+
+        body, content_type = route.render(match)
+        self.server.record(host, route.status)
+        self._send(route.status, body, content_type)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+def start_fake_services(host: str = DEFAULT_HOST, port: int = 0, behavior: ServiceBehavior = None) -> FakeServicesServer:
+    """在后台线程中启动假服务并返回服务器实例；port 为 0 时自动选择空闲端口。"""
+    server = FakeServicesServer((host, port), behavior=behavior)
+    thread = threading.Thread(target=server.serve_forever, name="fake-services", daemon=True)
+    thread.start()
+    return server
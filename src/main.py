@@ -1,13 +1,15 @@
 import asyncio
+import contextlib
+import logging
 import pprint
 
-import markdown
 import datetime
-import re
 from zoneinfo import ZoneInfo
 import os
 import sys
 import json
+import threading
+import time
 
 # --- 路径和配置 ---
 # 确保项目根目录在sys.path中
@@ -19,17 +21,92 @@ if project_root not in sys.path:
 # 模块导入
 from src.config import STAGE_CONFIG # 导入外部配置
 from src.config import global_config
-from src.services.cctv_fetcher import fetch_news_data, fetch_item_content
-from src.services.gemini_analyzer_proxy import analyze_news_with_gemini as analyze_with_proxy
-from src.services.gemini_analyzer import analyze_news_with_gemini as analyze_with_default_analyzer
-from src.services.wechat_clients import WeChatWorkClient, WeChatMPClient
-from src.services.xueqiu import XueqiuPublisher
-from src.utils.image_processor import download_selected_images, create_image_grid
-from src.services.eastmoney import EastmoneyPublisher
+from src.config import DEADLINE_CONFIG
+from src.config import METRICS_CONFIG
+from src.config import TRACING_CONFIG
+from src.config import STATIC_SITE_CONFIG
+from src.config import TAGGING_CONFIG
+from src.config import ANALYTICS_CONFIG
+# 抓取、分析、图片处理与渲染依赖较重，通过注册表在对应阶段真正执行时才导入
+from src.services.registry import FETCHERS, ANALYZERS, IMAGE_TOOLS, CLIENTS, RENDERERS, ANALYTICS
+from src.services.client_pool import client_pool
+from src.utils.collage_index import CollageIndex
+from src.services.publishers import PUBLISH_TIMESTAMP_KEYS, PLATFORM_NAMES
+from src.services.publish_orchestrator import format_publish_summary
+from src.services.publish_outbox import PublishOutbox, drain_outbox
+from src.services.cover_uploader import upload_cover_to_platforms
+from src.utils.retry_policy import run_retry_budget
+from src.utils.deadline import deadline_scope, run_with_deadline, DeadlineExceeded
+from src.utils.metrics import run_metrics, METRICS_DIR
+from src.utils.tracing import tracer, install_http_tracing, TRACES_DIR
+from src.utils.logger import set_logger
+from src.utils.json_store import dump_json_atomic
+from src.utils.news_archive import news_archive
+from src.utils.news_tagger import get_tagger
+
+# 以 python -m src.main 运行时 __name__ 为 "__main__"，这里固定名称，便于在 [Logging] 中按模块配置级别
+logger = logging.getLogger("src.main")
 
 # --- 全局常量 ---
 IMAGES_OUTPUT_DIR = os.path.join(project_root, 'images', 'collages')
 NEWS_DATA_CACHE_PATH = os.path.join(project_root, 'news_data.json')
+DEFAULT_COVER_PATH = os.path.join(project_root, 'images', 'default_cover.png')
+# 平台名称 -> 强制发布开关
+FORCE_PUBLISH_KEYS = {
+    "wechat_work": "force_publish_work",
+    "wechat_mp": "force_publish_mp",
+    "xueqiu": "force_publish_xueqiu",
+    "eastmoney": "force_publish_eastmoney",
+}
+
+
+_news_data_lock = threading.Lock()
+
+
+def save_news_data(news_data: dict):
+    """
+    将当前工作流状态原子地写入缓存文件。
+    超时后才完成的发布会在工作线程中回调并保存，因此加锁串行写入，并序列化浅拷贝以免遍历时字典被修改。
+    """
+    with _news_data_lock:
+        dump_json_atomic(NEWS_DATA_CACHE_PATH, dict(news_data))
+
+
+def archive_news_data(news_data: dict) -> bool:
+    """把当天的新闻与分析写入历史归档 (data/archive)。返回是否写入了归档，失败不影响工作流。"""
+    try:
+        path = news_archive.save(news_data)
+        if path:
+            logger.info(f">>> 已归档: {path}")
+        return bool(path)
+    except Exception as e:
+        logger.warning(f">>> [警告] 写入历史归档失败: {e}")
+        return False
+
+
+async def update_archive_outputs():
+    """
+    按配置增量更新由历史归档派生的静态站点与趋势统计。两者都与发布无关，在发布完成后各执行一次，
+    并放到工作线程中运行，不占用封面与发布阶段的时间，也不阻塞事件循环。失败不影响工作流。
+    """
+    if STATIC_SITE_CONFIG["enable"]:
+        try:
+            await asyncio.to_thread(RENDERERS["site"])
+        except Exception as e:
+            logger.warning(f">>> [警告] 更新静态站点失败: {e}")
+    if ANALYTICS_CONFIG["enable"]:
+        try:
+            await asyncio.to_thread(ANALYTICS["trends"])
+        except Exception as e:
+            logger.warning(f">>> [警告] 更新趋势统计失败: {e}")
+
+
+@contextlib.contextmanager
+def stage_scope(stage: str, title: str):
+    """一个工作流阶段：施加该阶段的时间预算，并记录阶段耗时指标与追踪 span。产出该阶段的 Deadline。"""
+    with deadline_scope(DEADLINE_CONFIG[stage], title) as deadline, \
+            run_metrics.span("stage", stage=stage), tracer.span(f"stage.{stage}", stage=stage):
+        yield deadline
 
 
 async def main_workflow():
@@ -37,23 +114,28 @@ async def main_workflow():
     执行从内容获取到多平台发布的完整自动化工作流。
     该工作流被设计为可恢复的，会根据news_data.json的当前状态决定从哪个阶段开始执行。
     """
-    print("--- 工作流启动 ---")
+    logger.info("--- 工作流启动 ---")
+    # 每次运行重新计算重试预算
+    run_retry_budget.reset()
 
     # --- [阶段 1/5] 数据加载与状态检查 ---
-    print("\n--- [1/5] 数据加载与状态检查 ---")
+    logger.info("--- [1/5] 数据加载与状态检查 ---")
+    load_started = time.perf_counter()
     news_data = None
+    # 本次运行是否写入过历史归档 (决定发布后是否需要更新静态站点与趋势统计)
+    archived = False
     # --- 缓存检查 ---
     use_cache = False
     # 除非强制获取，否则尝试从本地缓存加载数据
     if os.path.exists(NEWS_DATA_CACHE_PATH) and not STAGE_CONFIG.get("force_fetch_news", False):
-        print(f">>> 发现本地缓存: {NEWS_DATA_CACHE_PATH}，尝试加载...")
+        logger.info(f">>> 发现本地缓存: {NEWS_DATA_CACHE_PATH}，尝试加载...")
         try:
             with open(NEWS_DATA_CACHE_PATH, 'r', encoding='utf-8') as f:
                 news_data = json.load(f)
                 use_cache = True
             # 基本完整性检查：确保核心数据存在
             if not news_data.get("news_date") or not news_data.get("news_links"):
-                print(">>> [警告] 缓存数据不完整 (缺少日期或链接)，将触发全新获取。")
+                logger.warning(">>> [警告] 缓存数据不完整 (缺少日期或链接)，将触发全新获取。")
                 news_data = None
 
             # 本地数据，新闻时间判断
@@ -67,337 +149,436 @@ async def main_workflow():
                 now = datetime.datetime.now(ZoneInfo("Asia/Shanghai"))
                 # 修正逻辑：如果当前时间还没有到第二天新闻联播的时间，则认为缓存有效
                 if now < news_date_local + datetime.timedelta(days=1):
-                    print(f">>> 数据为 {fetch_time.strftime('%Y-%m-%d %H:%M:%S')} 获取，仍在有效期内，使用本地缓存。")
+                    logger.info(f">>> 数据为 {fetch_time.strftime('%Y-%m-%d %H:%M:%S')} 获取，仍在有效期内，使用本地缓存。")
                 else:
-                    print(f">>> 缓存数据过旧 ({fetch_time.strftime('%Y-%m-%d %H:%M:%S')})，将重新获取。")
+                    logger.info(f">>> 缓存数据过旧 ({fetch_time.strftime('%Y-%m-%d %H:%M:%S')})，将重新获取。")
                     news_data = None
             else:
-                print(">>> 缓存中缺少必要日期信息，将重新获取。")
+                logger.info(">>> 缓存中缺少必要日期信息，将重新获取。")
 
         except (json.JSONDecodeError, IOError) as e:
-            print(f">>> [错误] 读取或解析缓存文件失败: {e}，将触发全新获取。")
+            logger.error(f">>> [错误] 读取或解析缓存文件失败: {e}，将触发全新获取。")
             news_data = None
     
     if news_data:
-        print(">>> 缓存加载成功。")
+        logger.info(">>> 缓存加载成功。")
+        run_metrics.incr("cache_hits", cache="news_data")
     else:
+        run_metrics.incr("cache_misses", cache="news_data")
         if STAGE_CONFIG.get("force_fetch_news", False):
-            print(">>> `force_fetch_news` 已激活，将强制执行全新获取流程。")
+            logger.info(">>> `force_fetch_news` 已激活，将强制执行全新获取流程。")
         else:
-            print(">>> 未找到有效缓存，开始全新获取流程。")
+            logger.info(">>> 未找到有效缓存，开始全新获取流程。")
+    run_metrics.add_span("stage", time.perf_counter() - load_started, stage="load")
 
     # --- [阶段 2/5] 内容获取 ---
-    print("\n--- [2/5] 内容获取 ---")
-    # 2.1 获取新闻列表 (仅在数据完全缺失时运行)
-    if not news_data:
-        print(">>> [2.1] 正在获取新闻列表...")
-        try:
-            fetched_data =  fetch_news_data()
-            if fetched_data:
-                news_data = fetched_data
-                news_data['fetch_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
-                with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(news_data, f, ensure_ascii=False, indent=4)
-                print(f">>> 成功: 新闻列表已获取并存入缓存。")
-            else:
-                print(">>> [失败] 未能获取新闻列表，工作流终止。")
+    logger.info("--- [2/5] 内容获取 ---")
+    with stage_scope("fetch", "内容获取") as stage_deadline:
+        # 2.1 获取新闻列表 (仅在数据完全缺失时运行)
+        if not news_data:
+            logger.info(">>> [2.1] 正在获取新闻列表...")
+            try:
+                # 阻塞的抓取放到线程中执行，常驻模式下事件循环仍能响应控制接口与后台任务
+                fetched_data = await asyncio.to_thread(FETCHERS["news_index"])
+                if fetched_data:
+                    news_data = fetched_data
+                    news_data['fetch_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
+                    with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
+                        json.dump(news_data, f, ensure_ascii=False, indent=4)
+                    logger.info(f">>> 成功: 新闻列表已获取并存入缓存。")
+                else:
+                    logger.error(">>> [失败] 未能获取新闻列表，工作流终止。")
+                    run_metrics.incr("failures", stage="fetch")
+                    run_metrics.set_status("aborted")
+                    return
+            except Exception as e:
+                logger.error(f">>> [失败] 获取新闻列表时发生错误: {e}，工作流终止。")
+                run_metrics.incr("failures", stage="fetch")
+                run_metrics.set_status("aborted")
                 return
-        except Exception as e:
-            print(f">>> [失败] 获取新闻列表时发生错误: {e}，工作流终止。")
-            return
-    else:
-        print(">>> [2.1] 跳过获取新闻列表 (已存在)。")
-
-    # 2.2 获取新闻详细内容
-    if "contents" not in news_data or STAGE_CONFIG.get("force_fetch_contents", False):
-        print(">>> [2.2] 正在获取新闻详细内容...")
-        if STAGE_CONFIG.get("force_fetch_contents", False) and "contents" in news_data:
-            print("    `force_fetch_contents` 已激活，强制重新获取。")
-
-        news_links = news_data.get("news_list_detail", [])
-        items_to_fetch = news_links
-
-        news_contents = [fetch_item_content(item) for item in items_to_fetch]
-
-        # 处理结果，过滤掉None和异常
-        valid_contents = []
-        for item in news_contents:
-            if isinstance(item, Exception):
-                print(f"    [警告] 一个新闻详细内容抓取失败: {item}")
-            elif item:
-                valid_contents.append(item)
-
-        news_data['contents'] = valid_contents
-        with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(news_data, f, ensure_ascii=False, indent=4)
-        print(f">>> 成功: 获取了 {len(valid_contents)} 条新闻的详细内容并存入缓存。")
-    else:
-        print(">>> [2.2] 跳过获取新闻详细内容 (已存在)。")
-
-    # --- [阶段 3/5] AI分析 ---
-    print("\n--- [3/5] AI分析 ---")
-    valid_contents = news_data.get("contents", [])
-    analysis_text = news_data.get("analysis")
-
-    if ("analysis" not in news_data or STAGE_CONFIG.get("force_rerun_analysis", False)) and valid_contents:
-        print(">>> 正在进行AI分析...")
-        if STAGE_CONFIG.get("force_rerun_analysis", False) and "analysis" in news_data:
-            print("    `force_rerun_analysis` 已激活，强制重新分析。")
-        try:
-            if STAGE_CONFIG.get("use_gemini_analyzer_proxy", False):
-                print("    使用代理分析器 (gemini_analyzer_proxy)...")
-                generated_analysis = analyze_with_proxy(valid_contents)
-            else:
-                print("    使用默认分析器 (gemini_analyzer)...")
-                generated_analysis = await analyze_with_default_analyzer(valid_contents)
-
-            if generated_analysis:
-                analysis_text = generated_analysis
-                news_data['analysis'] = analysis_text
-                with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(news_data, f, ensure_ascii=False, indent=4)
-                print(">>> 成功: AI分析完成并存入缓存。")
+        else:
+            logger.info(">>> [2.1] 跳过获取新闻列表 (已存在)。")
+
+        # 2.2 获取新闻详细内容
+        # contents_partial 表示上次运行因截止时间只抓取了部分内容，需要重新抓取
+        if "contents" not in news_data or news_data.get("contents_partial") or STAGE_CONFIG.get("force_fetch_contents", False):
+            logger.info(">>> [2.2] 正在获取新闻详细内容...")
+            if STAGE_CONFIG.get("force_fetch_contents", False) and "contents" in news_data:
+                logger.info("    `force_fetch_contents` 已激活，强制重新获取。")
+
+            news_links = news_data.get("news_list_detail", [])
+            items_to_fetch = news_links
+
+            fetch_item_content = FETCHERS["item_content"]
+            news_contents = []
+            for item in items_to_fetch:
+                if stage_deadline.expired:
+                    logger.warning(f"    [警告] 内容获取阶段已到截止时间，剩余 {len(items_to_fetch) - len(news_contents)} 条新闻未抓取。")
+                    break
+                news_contents.append(await asyncio.to_thread(fetch_item_content, item))
+
+            # 处理结果，过滤掉None和异常
+            valid_contents = []
+            for item in news_contents:
+                if isinstance(item, Exception):
+                    logger.warning(f"    [警告] 一个新闻详细内容抓取失败: {item}")
+                    run_metrics.incr("failures", stage="fetch")
+                elif item:
+                    valid_contents.append(item)
+
+            news_data['contents'] = valid_contents
+            if len(news_contents) < len(items_to_fetch):
+                news_data['contents_partial'] = True
             else:
-                print(">>> [失败] AI分析未能生成有效内容。")
-        except Exception as e:
-            print(f">>> [失败] AI分析阶段发生错误: {e}")
-    else:
-        if not valid_contents:
-            print(">>> 跳过AI分析 (缺少新闻内容)。")
+                news_data.pop('contents_partial', None)
+            with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
+                json.dump(news_data, f, ensure_ascii=False, indent=4)
+            logger.info(f">>> 成功: 获取了 {len(valid_contents)} 条新闻的详细内容并存入缓存。")
         else:
-            print(">>> 跳过AI分析 (已存在)。")
+            logger.info(">>> [2.2] 跳过获取新闻详细内容 (已存在)。")
+            run_metrics.incr("cache_hits", cache="contents")
 
-    # --- [阶段 4/5] 封面图生成与上传 ---
-    print("\n--- [4/5] 封面图生成与上传 ---")
-    news_date = news_data.get("news_date")
-    img_urls = news_data.get("img_urls", [])
-    mp_thumb_media_id = news_data.get("mp_thumb_media_id")
-    work_thumb_media_id = news_data.get("work_thumb_media_id")
-
-    if ("mp_thumb_media_id" not in news_data or "work_thumb_media_id" not in news_data or STAGE_CONFIG.get("force_regenerate_cover", False)) and img_urls:
-        if STAGE_CONFIG.get("force_regenerate_cover", False):
-            print(">>> `force_regenerate_cover` 已激活，强制重新生成和上传封面。")
-
-        # 4.1 查找或生成封面图
-        print(">>> [4.1] 正在查找或生成封面图...")
-        collage_path = None
-        if news_date and use_cache:
-            date_prefix = "collage_" + news_date.replace("-", "")
+        # 2.3 为新闻打上板块、公司与政策标签 (词典修改后重新打标签)
+        if TAGGING_CONFIG["enable"] and news_data.get("contents"):
             try:
-                if os.path.exists(IMAGES_OUTPUT_DIR):
-                    matching_collages = sorted([f for f in os.listdir(IMAGES_OUTPUT_DIR) if f.startswith(date_prefix) and f.endswith(".jpg")])
-                    if matching_collages:
-                        collage_path = os.path.join(IMAGES_OUTPUT_DIR, matching_collages[-1])
-                        print(f"    从本地找到匹配的封面图: {matching_collages[-1]}")
+                tagger = get_tagger()
+                if tagger and news_data.get("tags_dictionary") != tagger.digest:
+                    logger.info(">>> [2.3] 正在为新闻打标签...")
+                    with run_metrics.span("call", operation="tagging"):
+                        tagger.tag_contents(news_data["contents"])
+                    news_data["tags_dictionary"] = tagger.digest
+                    save_news_data(news_data)
+                    tagged = sum(1 for item in news_data["contents"] if item.get("tags"))
+                    logger.info(f">>> 成功: {tagged}/{len(news_data['contents'])} 条新闻命中标签。")
+                elif tagger:
+                    logger.info(">>> [2.3] 跳过新闻标签 (已存在)。")
             except Exception as e:
-                print(f"    [错误] 查找缓存封面图时出错: {e}")
+                logger.warning(f">>> [警告] 新闻打标签失败: {e}")
 
-        if not collage_path:
-            print("    未找到本地封面，开始创建新封面...")
+    # --- [阶段 3/5] AI分析 ---
+    logger.info("--- [3/5] AI分析 ---")
+    with stage_scope("analysis", "AI分析"):
+        valid_contents = news_data.get("contents", [])
+        analysis_text = news_data.get("analysis")
+
+        # 内容不完整时不做分析，避免基于部分新闻生成的解读被缓存和发布
+        if ("analysis" not in news_data or STAGE_CONFIG.get("force_rerun_analysis", False)) and valid_contents and not news_data.get("contents_partial"):
+            logger.info(">>> 正在进行AI分析...")
+            if STAGE_CONFIG.get("force_rerun_analysis", False) and "analysis" in news_data:
+                logger.info("    `force_rerun_analysis` 已激活，强制重新分析。")
             try:
-                os.makedirs(IMAGES_OUTPUT_DIR, exist_ok=True)
-                downloaded_images = await download_selected_images(img_urls)
-                if len(downloaded_images) >= 6:
-                    timestamp = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).strftime("%Y%m%d_%H%M%S")
-                    collage_filename = f"collage_{timestamp}.jpg"
-                    collage_path = os.path.join(IMAGES_OUTPUT_DIR, collage_filename)
-                    create_image_grid(downloaded_images, output_path=collage_path)
-                    print(f"    成功: 新封面图已生成: {collage_filename}")
+                if STAGE_CONFIG.get("use_gemini_analyzer_proxy", False):
+                    logger.info("    使用代理分析器 (gemini_analyzer_proxy)...")
+                    generated_analysis = await asyncio.to_thread(ANALYZERS["proxy"], valid_contents)
                 else:
-                    print("    可用图片不足6张，使用默认封面。")
-                    collage_path = os.path.join(project_root, 'images', 'default_cover.png')
+                    logger.info("    使用默认分析器 (gemini_analyzer)...")
+                    generated_analysis = await run_with_deadline(ANALYZERS["default"](valid_contents))
+
+                if generated_analysis:
+                    analysis_text = generated_analysis
+                    news_data['analysis'] = analysis_text
+                    with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
+                        json.dump(news_data, f, ensure_ascii=False, indent=4)
+                    logger.info(">>> 成功: AI分析完成并存入缓存。")
+                    archived = archive_news_data(news_data) or archived
+                else:
+                    logger.error(">>> [失败] AI分析未能生成有效内容。")
+                    run_metrics.incr("failures", stage="analysis")
             except Exception as e:
-                print(f"    [错误] 生成封面图过程中出错: {e}")
-
-        # 4.2 上传封面图
-        if collage_path and os.path.exists(collage_path):
-            print(">>> [4.2] 正在上传封面图...")
-            media_ids_updated = False
-            # --- 微信公众号封面上传 ---
-            if "mp_thumb_media_id" not in news_data or STAGE_CONFIG.get("force_regenerate_cover", False):
+                logger.error(f">>> [失败] AI分析阶段发生错误: {e}")
+                run_metrics.incr("failures", stage="analysis")
+        else:
+            if not valid_contents:
+                logger.info(">>> 跳过AI分析 (缺少新闻内容)。")
+            elif news_data.get("contents_partial"):
+                logger.info(">>> 跳过AI分析 (新闻内容不完整，下次运行时补全后再分析)。")
+            else:
+                logger.info(">>> 跳过AI分析 (已存在)。")
+                run_metrics.incr("cache_hits", cache="analysis")
+
+    # --- [阶段 4/5] 封面图生成与上传 ---
+    logger.info("--- [4/5] 封面图生成与上传 ---")
+    with stage_scope("cover", "封面图生成与上传"):
+        news_date = news_data.get("news_date")
+        img_urls = news_data.get("img_urls", [])
+        mp_thumb_media_id = news_data.get("mp_thumb_media_id")
+        work_thumb_media_id = news_data.get("work_thumb_media_id")
+
+        if ("mp_thumb_media_id" not in news_data or "work_thumb_media_id" not in news_data or STAGE_CONFIG.get("force_regenerate_cover", False)) and img_urls:
+            if STAGE_CONFIG.get("force_regenerate_cover", False):
+                logger.info(">>> `force_regenerate_cover` 已激活，强制重新生成和上传封面。")
+
+            # 4.1 查找或生成封面图
+            logger.info(">>> [4.1] 正在查找或生成封面图...")
+            cover_media = {}
+            persist_task = None
+            collage_index = CollageIndex(IMAGES_OUTPUT_DIR)
+            if news_date and use_cache and not STAGE_CONFIG.get("force_regenerate_cover", False):
                 try:
-                    print("    正在为公众号上传封面图...")
-                    mp_client = WeChatMPClient()
-                    mp_thumb_media_id = mp_client.upload_image(collage_path)
-                    news_data['mp_thumb_media_id'] = mp_thumb_media_id
-                    print(f"    成功: 公众号封面图上传成功，Media ID: {mp_thumb_media_id}")
-                    media_ids_updated = True
+                    cover_paths = collage_index.lookup(news_date)
+                    if cover_paths:
+                        cover_media = IMAGE_TOOLS["read_cover_files"](cover_paths)
+                        logger.info(f"    从封面索引找到匹配的封面图: {os.path.basename(cover_paths['default'])}")
+                        run_metrics.incr("cache_hits", cache="cover_collage")
                 except Exception as e:
-                    print(f"    [错误] 上传封面图至公众号时出错: {e}")
-            else:
-                print("    公众号封面图Media ID已存在，跳过上传。")
+                    logger.error(f"    [错误] 查找缓存封面图时出错: {e}")
 
-            # --- 企业微信封面上传 ---
-            if "work_thumb_media_id" not in news_data or STAGE_CONFIG.get("force_regenerate_cover", False):
+            if not cover_media:
+                logger.info("    未找到本地封面，开始创建新封面...")
                 try:
-                    print("    正在为企业微信上传封面图...")
-                    work_client = WeChatWorkClient()
-                    work_thumb_media_id = work_client.upload_temp_image(collage_path)
-                    news_data['work_thumb_media_id'] = work_thumb_media_id
-                    print(f"    成功: 企业微信封面图上传成功，Media ID: {work_thumb_media_id}")
-                    media_ids_updated = True
+                    downloaded_images = await run_with_deadline(IMAGE_TOOLS["download_selected_images"](img_urls))
+                    if len(downloaded_images) >= 6:
+                        timestamp = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).strftime("%Y%m%d_%H%M%S")
+                        base_name = f"collage_{timestamp}"
+                        # 一次解码，同时渲染所有平台的封面变体，并直接在内存中编码
+                        variants = IMAGE_TOOLS["create_cover_variants"](downloaded_images)
+                        cover_media, cover_encodings = IMAGE_TOOLS["encode_cover_variants"](variants)
+                        news_data['cover_encoding'] = cover_encodings
+                        # 归档写盘在后台进行，上传直接使用内存中的数据
+                        persist_task = asyncio.create_task(
+                            IMAGE_TOOLS["persist_cover_variants"](cover_media, cover_encodings, IMAGES_OUTPUT_DIR, base_name))
+                        logger.info(f"    成功: 新封面图已生成: {base_name}")
+                    else:
+                        logger.warning("    可用图片不足6张，使用默认封面。")
+                        with open(DEFAULT_COVER_PATH, 'rb') as f:
+                            cover_media = {"default": f.read()}
                 except Exception as e:
-                    print(f"    [错误] 上传封面图至企业微信时出错: {e}")
+                    logger.error(f"    [错误] 生成封面图过程中出错: {e}")
+                    run_metrics.incr("failures", stage="cover")
+
+            # 4.2 上传封面图
+            if cover_media:
+                logger.info(">>> [4.2] 正在上传封面图...")
+                cover_filename = "cover.png" if "wechat_mp" not in cover_media else "cover.jpg"
+                force_cover = STAGE_CONFIG.get("force_regenerate_cover", False)
+                mp_cover = memoryview(cover_media.get("wechat_mp", cover_media["default"]))
+                work_cover = memoryview(cover_media.get("wechat_work", cover_media["default"]))
+
+                # 各平台的上传函数：构建客户端 (获取 token) 与上传都在各自的线程中并发执行
+                cover_uploads = {}
+                if "mp_thumb_media_id" not in news_data or force_cover:
+                    cover_uploads["mp_thumb_media_id"] = lambda: client_pool.client("wechat_mp", CLIENTS["wechat_mp"]).upload_image(mp_cover, filename=cover_filename)
+                else:
+                    logger.info("    公众号封面图Media ID已存在，跳过上传。")
+                if "work_thumb_media_id" not in news_data or force_cover:
+                    cover_uploads["work_thumb_media_id"] = lambda: client_pool.client("wechat_work", CLIENTS["wechat_work"]).upload_temp_image(work_cover, filename=cover_filename)
+                else:
+                    logger.info("    企业微信封面图Media ID已存在，跳过上传。")
+
+                def on_cover_uploaded(media_key: str, media_id: str):
+                    # 每个平台完成后立即记录并写入缓存，不等待其他平台
+                    news_data[media_key] = media_id
+                    save_news_data(news_data)
+                    logger.info(f"    成功: {media_key} 上传成功，Media ID: {media_id}")
+
+                if cover_uploads:
+                    logger.info(f"    正在并发上传封面图至 {len(cover_uploads)} 个平台...")
+                    try:
+                        await run_with_deadline(upload_cover_to_platforms(cover_uploads, on_uploaded=on_cover_uploaded))
+                    except DeadlineExceeded as e:
+                        # 已上传成功的平台已在回调中写入缓存，未完成的平台下次运行时继续
+                        logger.warning(f"    [超时] 封面上传未全部完成: {e}")
+                        run_metrics.incr("failures", stage="cover")
+                mp_thumb_media_id = news_data.get("mp_thumb_media_id")
+                work_thumb_media_id = news_data.get("work_thumb_media_id")
+
+                # 等待后台归档完成后，再把封面登记到按日期的索引中
+                if persist_task:
+                    try:
+                        cover_paths = await persist_task
+                        if news_date:
+                            collage_index.record(news_date, base_name, cover_paths, news_data.get('cover_encoding'))
+                    except Exception as e:
+                        logger.error(f"    [错误] 归档封面图时出错: {e}")
             else:
-                print("    企业微信封面图Media ID已存在，跳过上传。")
-
-            if media_ids_updated:
-                with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(news_data, f, ensure_ascii=False, indent=4)
-                print(">>> 成功: Media IDs已更新并存入缓存。")
-        else:
-            print(">>> [失败] 无可用封面图，跳过上传。")
-    else:
-        if not img_urls:
-            print(">>> 跳过封面图生成与上传 (无图片链接)。")
+                logger.error(">>> [失败] 无可用封面图，跳过上传。")
         else:
-            print(">>> 跳过封面图生成与上传 (Media IDs已存在)。")
+            if not img_urls:
+                logger.info(">>> 跳过封面图生成与上传 (无图片链接)。")
+            else:
+                logger.info(">>> 跳过封面图生成与上传 (Media IDs已存在)。")
+                run_metrics.incr("cache_hits", cache="cover_media_id")
 
     # --- [阶段 5/5] 多平台发布 ---
-    print("\n--- [5/5] 多平台发布 ---")
-    msg_title = f"{news_date} 新闻联播解读" if news_date else "新闻联播解读 (默认标题)"
+    logger.info("--- [5/5] 多平台发布 ---")
+    with stage_scope("publish", "多平台发布"):
+        msg_title = f"{news_date} 新闻联播解读" if news_date else "新闻联播解读 (默认标题)"
     
-    if not analysis_text:
-        print(">>> [失败] 无AI分析内容，无法发布。工作流终止。")
-        return
-
-    is_eligible_for_auto_publish = False
-    if news_data.get("fetch_timestamp"):
-        fetch_time = datetime.datetime.fromisoformat(news_data["fetch_timestamp"])
-        now = datetime.datetime.now(ZoneInfo("Asia/Shanghai"))
-        if now - fetch_time < datetime.timedelta(hours=24):
-            is_eligible_for_auto_publish = True
-
-    should_publish_work = (is_eligible_for_auto_publish and not news_data.get("work_publish_timestamp")) or STAGE_CONFIG.get("force_publish_work", False)
-    should_publish_mp = (is_eligible_for_auto_publish and not news_data.get("mp_publish_timestamp")) or STAGE_CONFIG.get("force_publish_mp", False)
-    should_publish_xueqiu = (is_eligible_for_auto_publish and not news_data.get("xueqiu_publish_timestamp")) or STAGE_CONFIG.get("force_publish_xueqiu", False)
-    should_publish_eastmoney = (is_eligible_for_auto_publish and not news_data.get("eastmoney_publish_timestamp")) or STAGE_CONFIG.get("force_publish_eastmoney", False)
-
-    # 准备HTML内容 (用于微信)
-    html_content = markdown.markdown(analysis_text)
-    # 移除换行符
-    clean_html_content_base = html_content.replace("\n", "").replace("\r", "").strip()
-    # 在<h3><strong>...</strong></h3> 标签后添加一个空行以改善间距
-    clean_html_content = re.sub(r'(<h3><strong>.*?</strong></h3>)', r'<p><br></p>\1<p><br></p>', clean_html_content_base)
-    qr_code_url = "https://mmbiz.qpic.cn/sz_mmbiz_png/oJkJlLSQ7U2ibmnVgKW2PzL3oicrSta2njI9ghvUiaghV3p1g9oHKTagyqN3iacwswMRDOjJibnKsbK1Z0AzfMcoUDQ/640?wx_fmt=png&amp"
-    br_html = "<p><br></p>"
-    html_qrcode = f'<div><img src="{qr_code_url}"></div>'
-    gongzhonghao_text = f'<div><strong>公众号 Cloudify 每日更新, 欢迎关注转发:  </strong></div>'
-
-    final_html_content = gongzhonghao_text  + clean_html_content + br_html + gongzhonghao_text + html_qrcode
-    # 东方财富发布格式
-    dongfang_html_content = gongzhonghao_text  + clean_html_content_base + gongzhonghao_text
-    # pprint.pp(final_html_content)
-    print(">>> HTML内容已为微信平台生成。")
-
-    publish_state_updated = False
-    # a. 企业微信发布
-    if STAGE_CONFIG.get("publish_wechat_work", False):
-        print(">>> [5.1] 企业微信发布...")
-        if should_publish_work:
-            if work_thumb_media_id:
-                try:
-                    print("    正在发送到企业微信...")
-                    work_client = WeChatWorkClient()
-                    work_client.send_mpnews(title=msg_title, content=final_html_content, thumb_media_id=work_thumb_media_id)
-                    print("    >>> 成功: 已发送到企业微信。")
-                    news_data['work_publish_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
-                    publish_state_updated = True
-                except Exception as e:
-                    print(f"    >>> [失败] 发送到企业微信时出错: {e}")
+        if not analysis_text:
+            logger.error(">>> [失败] 无AI分析内容，无法发布。工作流终止。")
+            run_metrics.set_status("aborted")
+            return
+
+        is_eligible_for_auto_publish = False
+        if news_data.get("fetch_timestamp"):
+            fetch_time = datetime.datetime.fromisoformat(news_data["fetch_timestamp"])
+            now = datetime.datetime.now(ZoneInfo("Asia/Shanghai"))
+            if now - fetch_time < datetime.timedelta(hours=24):
+                is_eligible_for_auto_publish = True
+
+        # 同步 outbox 中已完成的发布 (例如由后台 worker 重试成功的任务)
+        publish_outbox = PublishOutbox()
+        for platform, done_at in publish_outbox.completed_platforms(news_date).items():
+            timestamp_key = PUBLISH_TIMESTAMP_KEYS[platform]
+            if not news_data.get(timestamp_key):
+                news_data[timestamp_key] = datetime.datetime.fromtimestamp(done_at, ZoneInfo("Asia/Shanghai")).isoformat()
+                logger.info(f">>> {PLATFORM_NAMES[platform]} 已由 outbox 发布完成，同步发布时间戳。")
+
+        should_publish_work = (is_eligible_for_auto_publish and not news_data.get("work_publish_timestamp")) or STAGE_CONFIG.get("force_publish_work", False)
+        should_publish_mp = (is_eligible_for_auto_publish and not news_data.get("mp_publish_timestamp")) or STAGE_CONFIG.get("force_publish_mp", False)
+        should_publish_xueqiu = (is_eligible_for_auto_publish and not news_data.get("xueqiu_publish_timestamp")) or STAGE_CONFIG.get("force_publish_xueqiu", False)
+        should_publish_eastmoney = (is_eligible_for_auto_publish and not news_data.get("eastmoney_publish_timestamp")) or STAGE_CONFIG.get("force_publish_eastmoney", False)
+
+        # 准备各平台的HTML内容：Markdown 只解析一次，按平台模板渲染。没有平台需要发布时不渲染，也不导入渲染依赖
+        platform_html = {}
+        if should_publish_work or should_publish_mp or should_publish_xueqiu or should_publish_eastmoney:
+            platform_html = RENDERERS["render"](analysis_text)
+            logger.info(">>> HTML内容已为各平台生成。")
+            # 精简 HTML：清理不支持的标签、合并空节点、内联最小 CSS
+            platform_html, optimize_reports = RENDERERS["optimize"](platform_html)
+            news_data['html_optimization'] = optimize_reports
+            for platform, report in optimize_reports.items():
+                logger.info(f"    {PLATFORM_NAMES[platform]} HTML: {report['original_bytes']} -> {report['optimized_bytes']} 字节 "
+                      f"(节省 {report['saved_bytes']} 字节, {report['saved_percent']}%)")
+
+        # 收集需要发布的平台及其 payload，随后并发发布
+        publish_jobs = {}
+        # a. 企业微信发布
+        if STAGE_CONFIG.get("publish_wechat_work", False):
+            logger.info(">>> [5.1] 企业微信发布...")
+            if should_publish_work:
+                if work_thumb_media_id:
+                    publish_jobs["wechat_work"] = {"title": msg_title, "content": platform_html["wechat_work"], "thumb_media_id": work_thumb_media_id}
+                else:
+                    logger.info("    >>> 跳过发送，缺少封面 Media ID。")
             else:
-                print("    >>> 跳过发送，缺少封面 Media ID。")
+                logger.info("    >>> 跳过发送，数据不是新生成或未被强制发布。")
         else:
-            print("    >>> 跳过发送，数据不是新生成或未被强制发布。")
-    else:
-        print(">>> [5.1] 跳过企业微信发布 (配置已禁用)。")
-
-    # b. 微信公众号发布
-    if STAGE_CONFIG.get("publish_wechat_mp", False):
-        print(">>> [5.2] 微信公众号发布...")
-        if should_publish_mp:
-            if mp_thumb_media_id:
-                try:
-                    print("    \n正在创建微信公众号草稿...")
-                    mp_client = WeChatMPClient()
-                    mp_client.create_draft(title=msg_title, content=final_html_content, thumb_media_id=mp_thumb_media_id)
-                    print("    >>> 成功: 微信公众号草稿已创建。")
-                    news_data['mp_publish_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
-                    publish_state_updated = True
-                except Exception as e:
-                    print(f"    >>> [失败] 创建微信公众号草稿时出错: {e}")
+            logger.info(">>> [5.1] 跳过企业微信发布 (配置已禁用)。")
+
+        # b. 微信公众号发布
+        if STAGE_CONFIG.get("publish_wechat_mp", False):
+            logger.info(">>> [5.2] 微信公众号发布...")
+            if should_publish_mp:
+                if mp_thumb_media_id:
+                    publish_jobs["wechat_mp"] = {"title": msg_title, "content": platform_html["wechat_mp"], "thumb_media_id": mp_thumb_media_id}
+                else:
+                    logger.info("    >>> 跳过创建草稿，缺少封面 Media ID。")
             else:
-                print("    >>> 跳过创建草稿，缺少封面 Media ID。")
+                logger.info("    >>> 跳过创建草稿，数据不是新生成或未被强制发布。")
         else:
-            print("    >>> 跳过创建草稿，数据不是新生成或未被强制发布。")
-    else:
-        print(">>> [5.2] 跳过微信公众号发布 (配置已禁用)。")
-
-    # c. 雪球发布
-
-
-    if STAGE_CONFIG.get("publish_xueqiu", False):
-        print(">>> [5.3] 雪球发布...")
-        if should_publish_xueqiu:
-            xueqiu_cookie = STAGE_CONFIG.get("XUEQIU_COOKIE")
-            if xueqiu_cookie:
-                try:
-                    print("    正在发布到雪球...")
-                    publisher = XueqiuPublisher(
-                        cookie=xueqiu_cookie,
-                        title=msg_title,
-                        content=final_html_content)
-                    publisher.publish()
-                    print("    >>> 成功: 已发布到雪球。")
-                    news_data['xueqiu_publish_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
-                    publish_state_updated = True
-                except Exception as e:
-                    print(f"    >>> [失败] 发布到雪球时出错: {e}")
+            logger.info(">>> [5.2] 跳过微信公众号发布 (配置已禁用)。")
+
+        # c. 雪球发布
+        if STAGE_CONFIG.get("publish_xueqiu", False):
+            logger.info(">>> [5.3] 雪球发布...")
+            if should_publish_xueqiu:
+                if STAGE_CONFIG.get("XUEQIU_COOKIE"):
+                    publish_jobs["xueqiu"] = {"title": msg_title, "content": platform_html["xueqiu"]}
+                else:
+                    logger.info("    >>> 跳过发布，缺少雪球 Cookie 配置。")
             else:
-                print("    >>> 跳过发布，缺少雪球 Cookie 配置。")
+                logger.info("    >>> 跳过发布，数据不是新生成或未被强制发布。")
         else:
-            print("    >>> 跳过发布，数据不是新生成或未被强制发布。")
-    else:
-        print(">>> [5.3] 跳过雪球发布 (配置已禁用)。")
-
-    # d. 东方财富发布
-    if STAGE_CONFIG.get("publish_eastmoney", False):
-        print(">>> [5.4] 东方财富发布...")
-        if should_publish_eastmoney:
-            ctoken = STAGE_CONFIG.get("EASTMONEY_CTOKEN")
-            utoken = STAGE_CONFIG.get("EASTMONEY_UTOKEN")
-            if ctoken and utoken:
-                try:
-                    publisher = EastmoneyPublisher(
-                        ctoken=ctoken,
-                        utoken=utoken,
-                        title=msg_title,
-                        # content=final_html_content,
-                        # content=clean_html_content,
-                        # content=clean_html_content_base,
-                        content=dongfang_html_content,
-                    )
-                    res_status = publisher.publish()
-                    if res_status:
-                        news_data['eastmoney_publish_timestamp'] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
-                        publish_state_updated = True
-                        print("    >>> 成功: 已发布到东方财富。")
-                except Exception as e:
-                    print(f"    >>> [失败] 发布到东方财富时出错: {e}")
+            logger.info(">>> [5.3] 跳过雪球发布 (配置已禁用)。")
+
+        # d. 东方财富发布
+        if STAGE_CONFIG.get("publish_eastmoney", False):
+            logger.info(">>> [5.4] 东方财富发布...")
+            if should_publish_eastmoney:
+                if STAGE_CONFIG.get("EASTMONEY_CTOKEN") and STAGE_CONFIG.get("EASTMONEY_UTOKEN"):
+                    publish_jobs["eastmoney"] = {"title": msg_title, "content": platform_html["eastmoney"]}
+                else:
+                    logger.info("    >>> 跳过发布，缺少东方财富 ctoken 或 utoken 配置。")
             else:
-                print("    >>> 跳过发布，缺少东方财富 ctoken 或 utoken 配置。")
+                logger.info("    >>> 跳过发布，数据不是新生成或未被强制发布。")
         else:
-            print("    >>> 跳过发布，数据不是新生成或未被强制发布。")
-    else:
-        print(">>> [5.4] 跳过东方财富发布 (配置已禁用)。")
-
-    if publish_state_updated:
-        with open(NEWS_DATA_CACHE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(news_data, f, ensure_ascii=False, indent=4)
-        print(f"\n>>> 成功: 发布状态已更新并存入缓存。")
-
-    print("\n--- 工作流结束 ---")
-
+            logger.info(">>> [5.4] 跳过东方财富发布 (配置已禁用)。")
+
+        # 所有发布都先写入持久化的 outbox：失败的任务会按退避策略由 worker 重试，幂等键保证不会重复发布
+        job_ids = []
+        for platform, payload in publish_jobs.items():
+            force = STAGE_CONFIG.get(FORCE_PUBLISH_KEYS[platform], False)
+            job = publish_outbox.enqueue(platform, payload, news_date, force=force)
+            if job["status"] == "done":
+                logger.info(f"    >>> {PLATFORM_NAMES[platform]} 相同内容已发布过 (任务 #{job['id']})，跳过。")
+            elif job["status"] == "dead":
+                logger.warning(f"    >>> {PLATFORM_NAMES[platform]} 任务 #{job['id']} 已放弃: {job['last_error']}")
+            elif job["status"] == "in_doubt":
+                logger.warning(f"    >>> {PLATFORM_NAMES[platform]} 任务 #{job['id']} 发送结果未知，等待人工确认 "
+                               f"(python -m src.services.publish_outbox --confirm/--resend {job['id']}): {job['last_error']}")
+            else:
+                job_ids.append(job["id"])
+
+        def on_job_published(job: dict, result):
+            # 每个平台一成功就立即记录时间戳并写入缓存，不等待其他平台；
+            # 超时后才完成的发布也会 (在工作线程中) 回调到这里，避免下次运行重复发布
+            if job["news_date"] == news_date:
+                news_data[PUBLISH_TIMESTAMP_KEYS[job["platform"]]] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
+                save_news_data(news_data)
+
+        # 顺带处理 outbox 中其他已到期的重试任务
+        if job_ids:
+            logger.info(f">>> 正在并发发布到 {len(job_ids)} 个平台...")
+        drain_results = await drain_outbox(publish_outbox, on_success=on_job_published)
+        if drain_results:
+            publish_results = {}
+            for job_id, outcome in drain_results.items():
+                publish_results[f"{PLATFORM_NAMES[outcome['platform']]} #{job_id}"] = outcome
+            news_data['publish_results'] = publish_results
+            save_news_data(news_data)
+            logger.info(">>> 发布结果汇总:")
+            logger.info(format_publish_summary(publish_results))
+        waiting = [job_id for job_id in job_ids if job_id not in drain_results]
+        if waiting:
+            logger.info(f">>> {len(waiting)} 个发布任务正在等待退避重试，将由 outbox worker 处理。")
+        # 归档中记录各平台的发布时间
+        archived = archive_news_data(news_data) or archived
+
+    # 本次运行更新了归档时，在发布之后统一更新一次静态站点与趋势统计
+    if archived:
+        await update_archive_outputs()
+
+    logger.info("--- 工作流结束 ---")
+
+
+async def run_workflow():
+    """
+    在总时间预算内执行工作流。超过总预算时取消剩余的工作；
+    每个阶段的结果都在完成时写入了缓存，下次运行会从中断处继续。
+    结束后 (无论成功与否) 导出本次运行的指标报告与追踪文件。
+    """
+    run_id = tracer.start_run()
+    run_metrics.reset(run_id)
+    if TRACING_CONFIG["enable"]:
+        install_http_tracing()
+    logger.info(f"--- 运行 ID: {run_id} ---")
+    try:
+        with deadline_scope(DEADLINE_CONFIG["total"], "工作流"), tracer.span("workflow"):
+            try:
+                await run_with_deadline(main_workflow())
+                if run_metrics.status == "running":
+                    run_metrics.set_status("completed")
+            except DeadlineExceeded as e:
+                run_metrics.set_status("deadline_exceeded")
+                logger.error(f"--- 工作流超过总时间预算 ({DEADLINE_CONFIG['total']:.0f} 秒)，已终止: {e} ---")
+            except BaseException:
+                run_metrics.set_status("error")
+                raise
+    finally:
+        # 根 span 结束后再导出，保证追踪文件完整
+        if METRICS_CONFIG["enable"]:
+            try:
+                report_path = run_metrics.export(METRICS_CONFIG["report_dir"] or METRICS_DIR, METRICS_CONFIG["textfile_path"] or None)
+                logger.info(f">>> 运行指标已写入: {report_path}")
+            except Exception as e:
+                logger.warning(f">>> [警告] 写入运行指标失败: {e}")
+        if TRACING_CONFIG["enable"]:
+            try:
+                logger.info(f">>> 追踪文件已写入: {tracer.export(TRACING_CONFIG['trace_dir'] or TRACES_DIR)}")
+            except Exception as e:
+                logger.warning(f">>> [警告] 写入追踪文件失败: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(main_workflow())
+    set_logger()
+    asyncio.run(run_workflow())
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from src.config import TAGGING_CONFIG
+from src.utils.news_tagger import format_tag_hints
+
 ANALYSIS_PROMPT = """
 # 角色设定
 你是一位具备宏观、产业与公司研究能力的顶级首席证券分析师。
@@ -47,3 +50,22 @@ ANALYSIS_PROMPT = """
 本简报基于公开新闻信息整理与分析，仅供参考，不构成任何投资建议。市场有风险，投资需谨慎，投资者应独立判断并自行承担风险；
 你有任何意见建议，请留言以便我进行改进。
 """
+
+
+def _format_news_item(item, tag_hints: bool) -> str:
+    block = f"标题: {item['title']}\n内容: {item['content']}\n"
+    if tag_hints and item.get("tags"):
+        block += f"相关标签 (自动识别，仅供参考): {format_tag_hints(item['tags'])}\n"
+    return block + "---"
+
+
+def build_analysis_prompt(news_data, tag_hints: bool = None) -> str:
+    """
+    将新闻列表 (每项含 'title' 和 'content') 格式化后填入分析提示词。两个分析器共用。
+    tag_hints 为 True 时 (默认取 [Tagging] prompt_hints)，在每条新闻后附上自动识别的板块、公司与政策标签。
+    """
+    if tag_hints is None:
+        tag_hints = TAGGING_CONFIG["prompt_hints"]
+    # 逐条文本的列表在 join 后立即释放，不与完整提示词同时驻留内存
+    formatted_news = "\n".join([_format_news_item(item, tag_hints) for item in news_data])
+    return ANALYSIS_PROMPT.format(formatted_news=formatted_news)
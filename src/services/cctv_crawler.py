@@ -1,21 +1,22 @@
 import httpx
 import datetime
+import logging
 from zoneinfo import ZoneInfo
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from httpx import ConnectTimeout, ReadTimeout, RemoteProtocolError
 import re # 导入re模块
 from typing import List, Dict, Any, Optional
 
+from src.utils.retry_policy import CRAWL_SERVICE_POLICY
+from src.utils.metrics import run_metrics
+from src.utils.deadline import httpx_timeout
+from src.config import resolve_url
+
+logger = logging.getLogger(__name__)
+
 # --- 配置项 ---
 CRAWL_SERVICE_URL = "http://228229.xyz:11235/crawl"
 CCTV_INDEX_URL = "https://tv.cctv.com/lm/xwlb/index.shtml"
 REQUEST_TIMEOUT = httpx.Timeout(60.0, connect=60.0, read=60.0, write=60.0)
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type((ConnectTimeout, ReadTimeout))
-)
 def get_date_formats(dt_obj: datetime.datetime) -> List[str]:
     """Generates two date string formats: YYYY/MM/DD and YYYY/M/D."""
     format1 = dt_obj.strftime("%Y/%m/%d")
@@ -24,9 +25,10 @@ def get_date_formats(dt_obj: datetime.datetime) -> List[str]:
 
 async def fetch_news_data() -> Optional[Dict[str, Any]]:
     """从远程服务抓取新闻链接、图片链接和新闻日期，并以字典形式返回。"""
-    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
+    async with httpx.AsyncClient(timeout=httpx_timeout(REQUEST_TIMEOUT)) as client:
         try:
-            response = await client.post(CRAWL_SERVICE_URL, json={"urls": [CCTV_INDEX_URL]})
+            response = await CRAWL_SERVICE_POLICY.run_async(client.post, resolve_url(CRAWL_SERVICE_URL), json={"urls": [CCTV_INDEX_URL]})
+            run_metrics.record_transfer("crawl_service", response)
             response.raise_for_status()
             data = response.json().get("results")[0]
 
@@ -38,7 +40,7 @@ async def fetch_news_data() -> Optional[Dict[str, Any]]:
             } for item in news_links_raw if "视频" in item.get("title", "")]
 
             if not news_links:
-                print("未能获取到任何新闻链接。")
+                logger.info("未能获取到任何新闻链接。")
                 return None
 
             # 从第一个链接中解析新闻日期
@@ -48,9 +50,9 @@ async def fetch_news_data() -> Optional[Dict[str, Any]]:
             if match:
                 year, month, day = match.groups()
                 news_date = f"{year}-{month}-{day}"
-                print(f"解析出的新闻日期为: {news_date}")
+                logger.info(f"解析出的新闻日期为: {news_date}")
             else:
-                print("无法从链接中解析出日期，将使用当前日期。")
+                logger.info("无法从链接中解析出日期，将使用当前日期。")
                 news_date = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).strftime("%Y-%m-%d")
 
 
@@ -67,7 +69,7 @@ async def fetch_news_data() -> Optional[Dict[str, Any]]:
                     if any(date_fmt in src for date_fmt in news_date_formats):
                         img_urls.append("https:" + src)
             
-            print(f"抓取到 {len(news_links)} 条新闻链接和 {len(img_urls)} 个图片链接。")
+            logger.info(f"抓取到 {len(news_links)} 条新闻链接和 {len(img_urls)} 个图片链接。")
             
             return {
                 "news_date": news_date,
@@ -75,18 +77,15 @@ async def fetch_news_data() -> Optional[Dict[str, Any]]:
                 "img_urls": img_urls
             }
         except Exception as e:
-            print(f"抓取新闻数据时发生错误: {e}")
+            logger.error(f"抓取新闻数据时发生错误: {e}")
             return None
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=5, max=10),
-    retry=retry_if_exception_type((ConnectTimeout, ReadTimeout, RemoteProtocolError))
-)
+@CRAWL_SERVICE_POLICY
 async def fetch_item_content(url: str):
     """抓取单条新闻的详细内容。"""
-    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-        response = await client.post(CRAWL_SERVICE_URL, json={"urls": [url]})
+    async with httpx.AsyncClient(timeout=httpx_timeout(REQUEST_TIMEOUT)) as client:
+        response = await client.post(resolve_url(CRAWL_SERVICE_URL), json={"urls": [url]})
+        run_metrics.record_transfer("crawl_service", response)
         response.raise_for_status()
         res = response.json().get("results")[0]
         if res.get("success"):
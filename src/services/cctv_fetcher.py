@@ -3,18 +3,20 @@ import random
 import datetime
 import logging
 from zoneinfo import ZoneInfo
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from httpx import ConnectTimeout, ReadTimeout, RemoteProtocolError
 import re
 from typing import Dict, Any
 from bs4 import BeautifulSoup
 import pprint
 from markdownify import markdownify as md
 
-# --- 日志配置 ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-# 设置 httpx 日志级别为 WARNING，以减少不必要的日志输出
-logging.getLogger("httpx").setLevel(logging.WARNING)
+from src.services.client_pool import client_pool
+from src.utils.retry_policy import CCTV_PAGE_POLICY
+from src.utils.metrics import run_metrics
+from src.utils.deadline import httpx_timeout
+from src.config import resolve_url
+
+# httpx 等第三方库的日志级别在 [Logging] module_levels 中配置
+logger = logging.getLogger(__name__)
 
 # --- 常量定义 ---
 CCTV_INDEX_URL = "https://tv.cctv.com/lm/xwlb/index.shtml"
@@ -62,17 +64,76 @@ def _parse_date_from_title(title: str) -> str:
             date_obj = datetime.datetime.strptime(date_str, "%Y%m%d")
             return f"{date_obj.year}-{date_obj.month}-{date_obj.day}"
         except ValueError:
-            logging.debug("日期字符串格式无效，将使用当前日期。")
+            logger.debug("日期字符串格式无效，将使用当前日期。")
     
-    logging.debug("无法从标题中解析出日期，将使用当前日期。")
+    logger.debug("无法从标题中解析出日期，将使用当前日期。")
     return datetime.datetime.now(ZoneInfo("Asia/Shanghai")).strftime("%Y-%m-%d")
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type((ConnectTimeout, ReadTimeout))
-)
+@CCTV_PAGE_POLICY
+def _get_page(url: str) -> str:
+    """按重试策略获取页面 HTML。"""
+    # 复用连接池；每次请求随机选择 UA，因此请求头按请求传入
+    client = client_pool.httpx_client("cctv")
+    resp = client.get(resolve_url(url), headers=_get_headers(), timeout=httpx_timeout(REQUEST_TIMEOUT))
+    run_metrics.record_transfer("cctv", resp)
+    resp.raise_for_status()
+    # resp.encoding = resp.apparent_encoding
+    return resp.text
+
+
+def parse_news_index(page_html: str) -> Dict[str, Any] | None:
+    """
+    解析新闻联播索引页，提取新闻日期、链接、详细信息和图片 URL。
+
+    Args:
+        page_html: 索引页 HTML。
+
+    Returns:
+        解析结果字典，页面中没有新闻条目时返回 None。
+    """
+    soup = BeautifulSoup(page_html, 'lxml')
+    content_list = soup.find('ul', id='content')
+    if not content_list:
+        logger.debug("在页面中找不到 id='content' 的列表。")
+        return None
+
+    news_data_list = []
+    list_items = content_list.find_all('li')
+
+    for item in list_items:
+        image_tag = item.find('img')
+        image_url = f"https:{image_tag['src']}" if image_tag and 'src' in image_tag.attrs else 'N/A'
+        title_link = item.find('a', target='_blank', href=True)
+
+        if title_link:
+            news_data_list.append({
+                "title": title_link['title'],
+                "news_links": title_link['href'],
+                "img_urls": image_url
+            })
+
+    if not news_data_list:
+        logger.debug("未找到任何新闻条目。")
+        return None
+
+    news_date = _parse_date_from_title(news_data_list[0]['title'])
+
+    news_items = news_data_list[1:]
+
+    return {
+        "news_date": news_date,
+        "news_links": [item.get("news_links", "") for item in news_items],
+        "news_list_detail": [
+            {
+                "url": item.get("news_links", ""),
+                "title": item.get("title", "")
+            } for item in news_items
+        ],
+        "img_urls": [item.get("img_urls", "") for item in news_items]
+    }
+
+
 def fetch_news_data(url: str = CCTV_INDEX_URL) -> Dict[str, Any] | None:
     """
     从新闻联播索引页抓取新闻列表和日期。
@@ -84,67 +145,48 @@ def fetch_news_data(url: str = CCTV_INDEX_URL) -> Dict[str, Any] | None:
         包含新闻日期、链接、详细信息和图片 URL 的字典，或在失败时返回 None。
     """
     try:
-        headers = _get_headers()
-        with httpx.Client(headers=headers, timeout=REQUEST_TIMEOUT) as client:
-            resp = client.get(url)
-            resp.raise_for_status()
-            # resp.encoding = resp.apparent_encoding
-
-        soup = BeautifulSoup(resp.text, 'lxml')
-        content_list = soup.find('ul', id='content')
-        if not content_list:
-            logging.debug("在页面中找不到 id='content' 的列表。")
+        page_html = _get_page(url)
+        res = parse_news_index(page_html)
+        if not res:
             return None
 
-        news_data_list = []
-        list_items = content_list.find_all('li')
-
-        for item in list_items:
-            image_tag = item.find('img')
-            image_url = f"https:{image_tag['src']}" if image_tag and 'src' in image_tag.attrs else 'N/A'
-            title_link = item.find('a', target='_blank', href=True)
-
-            if title_link:
-                news_data_list.append({
-                    "title": title_link['title'],
-                    "news_links": title_link['href'],
-                    "img_urls": image_url
-                })
-        
-        if not news_data_list:
-            logging.debug("未找到任何新闻条目。")
-            return None
-
-        news_date = _parse_date_from_title(news_data_list[0]['title'])
-        
-        news_items = news_data_list[1:]
-
-        res = {
-            "news_date": news_date,
-            "news_links": [item.get("news_links", "") for item in news_items],
-            "news_list_detail": [
-                {
-                    "url": item.get("news_links", ""),
-                    "title": item.get("title", "")
-                } for item in news_items
-            ],
-            "img_urls": [item.get("img_urls", "") for item in news_items]
-        }
-        logging.debug(f"新闻日期: {news_date} ; 共抓取到 {len(res.get('news_links'))} 条新闻, 共{len(res.get('img_urls'))}图片链接")
-        print(f"新闻日期: {news_date} ; 共抓取到 {len(res.get('news_links'))} 条新闻, 共{len(res.get('img_urls'))}图片链接")
+        news_date = res["news_date"]
+        logger.debug(f"新闻日期: {news_date} ; 共抓取到 {len(res.get('news_links'))} 条新闻, 共{len(res.get('img_urls'))}图片链接")
+        logger.info(f"新闻日期: {news_date} ; 共抓取到 {len(res.get('news_links'))} 条新闻, 共{len(res.get('img_urls'))}图片链接")
 
         return res
 
     except Exception as e:
-        logging.error(f"抓取新闻数据时发生错误: {e}", exc_info=True)
+        logger.error(f"抓取新闻数据时发生错误: {e}", exc_info=True)
         return None
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=5, max=10),
-    retry=retry_if_exception_type((ConnectTimeout, ReadTimeout, RemoteProtocolError))
-)
+def parse_item_content(page_html: str, title: str) -> Dict[str, str] | None:
+    """
+    从单条新闻页面中提取正文并转换为 Markdown。
+
+    Args:
+        page_html: 新闻页面 HTML。
+        title: 新闻标题。
+
+    Returns:
+        包含清理后的标题和内容的字典，页面中没有正文时返回 None。
+    """
+    match = CONTENT_PATTERN.search(page_html)
+    if not match:
+        return None
+    html_doc = match.group(1).strip()
+    markdown_text = md(html_doc, heading_style="ATX")
+
+    cleaned_text = markdown_text.replace(TEXT_TO_REMOVE, '', 1)
+    cleaned_title = title.replace(TITLE_TO_REMOVE, '', 1)
+
+    return {
+        "title": cleaned_title,
+        "content": cleaned_text
+    }
+
+
 def fetch_item_content(news_item: Dict[str, str]) -> Dict[str, str] | None:
     """
     获取单个新闻条目的详细内容。
@@ -161,41 +203,29 @@ def fetch_item_content(news_item: Dict[str, str]) -> Dict[str, str] | None:
         return None
 
     try:
-        headers = _get_headers()
-        with httpx.Client(headers=headers, timeout=REQUEST_TIMEOUT) as client:
-            response = client.get(url)
-            response.raise_for_status()
-            # response.encoding = response.apparent_encoding
-
-        if response.text:
-            match = CONTENT_PATTERN.search(response.text)
-            if match:
-                html_doc = match.group(1).strip()
-                markdown_text = md(html_doc, heading_style="ATX")
-                
-                cleaned_text = markdown_text.replace(TEXT_TO_REMOVE, '', 1)
-                cleaned_title = title.replace(TITLE_TO_REMOVE, '', 1)
-                
-                res = {
-                    "title": cleaned_title,
-                    "content": cleaned_text
-                }
-                logging.debug(f"抓取新闻: {res.get('title')}, 共{len(res.get('content'))}个文字")
-                print(f"抓取新闻: {res.get('title')}, 共{len(res.get('content'))}个文字")
+        page_html = _get_page(url)
+
+        if page_html:
+            res = parse_item_content(page_html, title)
+            if res:
+                logger.debug(f"抓取新闻: {res.get('title')}, 共{len(res.get('content'))}个文字")
+                logger.info(f"抓取新闻: {res.get('title')}, 共{len(res.get('content'))}个文字")
 
                 return res
 
     except Exception as e:
-        logging.error(f"抓取新闻内容时发生错误 (URL: {url}): {e}", exc_info=True)
+        logger.error(f"抓取新闻内容时发生错误 (URL: {url}): {e}", exc_info=True)
     
     return None
 
 
 if __name__ == '__main__':
+    from src.utils.logger import set_logger
+    set_logger()
     data = fetch_news_data()
     if data and "news_list_detail" in data:
         for item in data["news_list_detail"][:2]:
             content = fetch_item_content(item)
             if content:
-                # logging.info(pprint.pformat(content))
+                # logger.info(pprint.pformat(content))
                 pass
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from src.utils.json_store import STATE_DIR, load_json, dump_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+BREAKER_STATE_PATH = os.path.join(STATE_DIR, 'circuit_breakers.json')
+# 连续失败达到该次数后熔断
+FAILURE_THRESHOLD = 3
+# 熔断后等待多久再放行一次探测请求 (秒)
+OPEN_SECONDS = 30 * 60
+# 鉴权失败 (cookie/token 失效) 通常需要人工更新凭证，熔断时间更长
+AUTH_OPEN_SECONDS = 6 * 60 * 60
+
+# 熔断器状态:
+#   closed     正常放行
+#   open       熔断中，直接跳过该平台
+#   half_open  熔断时间已过，放行一次探测请求，成功则恢复，失败则重新熔断
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreakers:
+    """
+    按平台区分的熔断器，状态持久化到磁盘，跨运行生效。
+
+    平台连续失败或鉴权失败时熔断，熔断期间该平台的发布被立即跳过，不再经历完整的请求与重试；
+    熔断时间过后放行一次探测，探测成功即恢复正常。
+    """
+
+    def __init__(self, path: str = BREAKER_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict[str, Any]] = {}
+
+    def _state(self, platform: str) -> Dict[str, Any]:
+        # 每次都从磁盘读取，主流程与后台 worker 看到的是同一份状态
+        self._states = load_json(self.path, default={})
+        return self._states.setdefault(platform, {"state": CLOSED, "failures": 0, "open_until": 0, "last_error": None})
+
+    def _save(self) -> None:
+        dump_json_atomic(self.path, self._states)
+
+    def allow(self, platform: str) -> bool:
+        """判断是否放行该平台的一次请求。熔断时间已过时转为 half_open 并放行一次探测。"""
+        with self._lock:
+            entry = self._state(platform)
+            if entry["state"] == CLOSED:
+                return True
+            now = time.time()
+            if entry["state"] == OPEN and now >= entry["open_until"]:
+                entry.update(state=HALF_OPEN, probe_started=now)
+                self._save()
+                return True
+            if entry["state"] == HALF_OPEN and now - entry.get("probe_started", 0) > OPEN_SECONDS:
+                # 上一次探测没有返回结果 (例如进程中途退出)，重新放行一次探测
+                entry["probe_started"] = now
+                self._save()
+                return True
+            # open 未到期，或 half_open 的探测尚未返回结果
+            return False
+
+    def retry_at(self, platform: str) -> Optional[float]:
+        """熔断中的平台下一次允许探测的时间 (Unix 时间戳)；未熔断时返回 None。"""
+        with self._lock:
+            entry = self._state(platform)
+        if entry["state"] == CLOSED:
+            return None
+        if entry["state"] == HALF_OPEN:
+            return entry.get("probe_started", 0) + OPEN_SECONDS
+        return entry["open_until"]
+
+    def describe(self, platform: str) -> str:
+        """返回熔断原因，便于在日志中说明跳过的原因。"""
+        with self._lock:
+            entry = self._state(platform)
+        until = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.retry_at(platform) or time.time()))
+        return f"熔断中，{until} 后再试 (最近错误: {entry.get('last_error')})"
+
+    def record_success(self, platform: str) -> None:
+        with self._lock:
+            entry = self._state(platform)
+            if entry["state"] != CLOSED:
+                logger.info(f"    [熔断器] {platform} 探测成功，恢复正常。")
+            entry.update(state=CLOSED, failures=0, open_until=0, last_error=None)
+            entry.pop("probe_started", None)
+            self._save()
+
+    def record_failure(self, platform: str, error: str, is_auth_error: bool = False) -> None:
+        """记录一次失败。鉴权失败、探测失败或连续失败达到阈值时熔断。"""
+        with self._lock:
+            entry = self._state(platform)
+            entry["failures"] += 1
+            entry["last_error"] = error
+            if is_auth_error or entry["state"] == HALF_OPEN or entry["failures"] >= FAILURE_THRESHOLD:
+                open_seconds = AUTH_OPEN_SECONDS if is_auth_error else OPEN_SECONDS
+                entry["state"] = OPEN
+                entry["open_until"] = time.time() + open_seconds
+                logger.warning(f"    [熔断器] {platform} 已熔断 {open_seconds // 60} 分钟: {error}")
+            self._save()
+
+    def reset(self, platform: str) -> None:
+        """手动恢复某个平台 (例如更新了 cookie 之后)。"""
+        with self._lock:
+            self._state(platform)
+            self._states.pop(platform, None)
+            self._save()
+
+
+# 全局单例，供发布流程与 outbox worker 共享
+circuit_breakers = CircuitBreakers()
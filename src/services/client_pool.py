@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Any, Callable, Dict
+
+import httpx
+import requests
+
+from src.config import register_reload_hook
+
+logger = logging.getLogger(__name__)
+
+
+class ClientPool:
+    """
+    进程内复用的 HTTP 会话与平台客户端。
+
+    按服务名各保留一个 requests.Session / httpx.Client，连接 (含 TLS 握手) 在多次请求、
+    多次运行之间复用；平台客户端 (如 WeChatMPClient) 也只创建一次，封面上传与发布共用。
+    单次运行 (cron) 时效果等同于每次运行内复用，常驻模式下则跨运行保持连接。
+    配置重新加载后全部关闭，下次取用时按新配置重新创建。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        self._httpx_clients: Dict[str, httpx.Client] = {}
+        self._clients: Dict[str, Any] = {}
+
+    def session(self, service: str) -> requests.Session:
+        """返回服务对应的 requests.Session。"""
+        with self._lock:
+            if service not in self._sessions:
+                self._sessions[service] = requests.Session()
+            return self._sessions[service]
+
+    def httpx_client(self, service: str) -> httpx.Client:
+        """返回服务对应的 httpx.Client。超时与请求头由调用方按请求传入。"""
+        with self._lock:
+            if service not in self._httpx_clients:
+                self._httpx_clients[service] = httpx.Client()
+            return self._httpx_clients[service]
+
+    def client(self, name: str, factory: Callable[[], Any]) -> Any:
+        """
+        返回名为 name 的平台客户端，不存在时调用 factory 创建。
+        创建失败 (如获取 token 失败) 时不缓存，下次取用会重新创建。
+        """
+        with self._lock:
+            if name in self._clients:
+                return self._clients[name]
+        client = factory()
+        with self._lock:
+            # 并发创建时保留先完成的实例
+            return self._clients.setdefault(name, client)
+
+    def close(self) -> None:
+        """关闭并丢弃所有会话与客户端。"""
+        with self._lock:
+            sessions = list(self._sessions.values()) + list(self._httpx_clients.values())
+            self._sessions.clear()
+            self._httpx_clients.clear()
+            self._clients.clear()
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as e:
+                logger.debug(f"关闭 HTTP 会话时出错: {e}")
+
+
+# 全局单例
+client_pool = ClientPool()
+# 凭证或假服务地址可能已变更，按新配置重新创建客户端
+register_reload_hook(client_pool.close)
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+async def _run_upload(platform: str, upload: Callable[[], str]):
+    """在线程池中执行一次阻塞的上传，返回 (平台, media_id 或异常)。"""
+    try:
+        return platform, await asyncio.to_thread(upload)
+    except Exception as e:
+        return platform, e
+
+
+async def upload_cover_to_platforms(uploads: Dict[str, Callable[[], str]],
+                                    on_uploaded: Callable[[str, str], None] = None) -> Dict[str, object]:
+    """
+    将同一张封面并发上传到所有平台。
+
+    每个上传函数负责构建自己的客户端 (含获取 token) 并返回 media_id，因此各平台的
+    token 请求与上传都是并行进行的，整体耗时取决于最慢的那个平台。
+    每个平台一完成就会调用 on_uploaded(平台, media_id)，便于立即记录结果。
+    每个平台只调用一次上传函数：重试由客户端内的 RetryPolicy 负责 (计入全局重试预算，
+    公众号永久素材这类非幂等上传只在请求确定未发出时重试)，这里不再叠加一层重试。
+
+    :param uploads: 以平台名称为键、无参上传函数为值的字典。
+    :param on_uploaded: 单个平台上传成功时的回调。
+    :return: 以平台名称为键的结果字典，值为 media_id 或异常。
+    """
+    results = {}
+    tasks = [_run_upload(platform, upload) for platform, upload in uploads.items()]
+    for next_done in asyncio.as_completed(tasks):
+        platform, result = await next_done
+        results[platform] = result
+        if isinstance(result, Exception):
+            logger.error(f"    [错误] {platform} 封面上传失败: {result}")
+            continue
+        if on_uploaded:
+            on_uploaded(platform, result)
+    return results
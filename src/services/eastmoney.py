@@ -2,18 +2,36 @@ import json
 import logging
 from urllib.parse import quote
 import requests
-from src.config import global_config
+from src.config import global_config, resolve_url
+from src.services.client_pool import client_pool
+from src.utils.retry_policy import EASTMONEY_PUBLISH_POLICY
+from src.utils.metrics import run_metrics
+from src.utils.deadline import request_timeout
 
 
-# --- 日志配置 ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
+# --- 配置项 ---
+# 表示 ctoken/utoken 被拒绝的 HTTP 状态码
+AUTH_STATUS_CODES = {401, 403}
+# 返回信息中包含这些关键字时视为登录态失效 (接口对过期 token 不返回固定错误码)
+AUTH_ERROR_KEYWORDS = ("登录", "token", "身份验证")
+
+
+class EastmoneyAuthError(ValueError):
+    """东方财富 ctoken/utoken 缺失、过期或被服务端拒绝。"""
+
+
+def _is_auth_message(message) -> bool:
+    text = str(message or "").lower()
+    return any(keyword in text for keyword in AUTH_ERROR_KEYWORDS)
 
 
 class EastmoneyPublisher:
     """用于发布文章到东方财富的类。"""
     
     API_URL = "https://emstockdiag.eastmoney.com/apistock/Tran/GetData?platform="
+    REQUEST_TIMEOUT = 30
 
     def __init__(self,
                  ctoken: str, utoken: str,
@@ -28,7 +46,7 @@ class EastmoneyPublisher:
             content (str): 文章内容 (HTML format).
         """
         if not ctoken or not utoken:
-            raise ValueError("ctoken 和 utoken 不能为空。")
+            raise EastmoneyAuthError("ctoken 和 utoken 不能为空。")
         
         self.ctoken = ctoken
         self.utoken = utoken
@@ -73,11 +91,14 @@ class EastmoneyPublisher:
         }
 
     def publish(self):
-        """执行发布流程。"""
+        """执行发布流程。成功返回 True，其他失败记录日志后返回 None；ctoken/utoken 被拒绝时抛出 EastmoneyAuthError。"""
         payload = self._prepare_payload()
         
         try:
-            response = requests.post(url=self.API_URL, data=payload)
+            response = EASTMONEY_PUBLISH_POLICY.run(client_pool.session("eastmoney").post, url=resolve_url(self.API_URL), data=payload, timeout=request_timeout(self.REQUEST_TIMEOUT))
+            run_metrics.record_transfer("eastmoney", response)
+            if response.status_code in AUTH_STATUS_CODES:
+                raise EastmoneyAuthError(f"东方财富鉴权失败 (HTTP {response.status_code})，ctoken/utoken 可能已失效。")
             response.raise_for_status()
             res = response.json()
 
@@ -86,20 +107,26 @@ class EastmoneyPublisher:
                 r_data = json.loads(r_data_str)
                 error_code = r_data.get("error_code")
                 res_msg = r_data.get("me")
+                if error_code and _is_auth_message(res_msg):
+                    raise EastmoneyAuthError(f"东方财富拒绝了 ctoken/utoken (错误码: {error_code})，返回信息: {res_msg}")
                 if error_code:
-                    logging.error(f"东方财富发布失败，错误码：{error_code}，返回信息: {res_msg}")
+                    logger.error(f"东方财富发布失败，错误码：{error_code}，返回信息: {res_msg}")
                 else:
-                    logging.debug(f"东方财富发布成功，返回信息: {res_msg}")
+                    logger.debug(f"东方财富发布成功，返回信息: {res_msg}")
                     return True
+            elif str(res.get("RCode")) in {str(code) for code in AUTH_STATUS_CODES}:
+                raise EastmoneyAuthError(f"东方财富拒绝了 ctoken/utoken: {res}")
             else:
-                logging.error(f"东方财富发布请求失败: {res}")
+                logger.error(f"东方财富发布请求失败: {res}")
 
         except requests.RequestException as e:
-            logging.error(f"发布到东方财富时发生网络错误: {e}")
+            logger.error(f"发布到东方财富时发生网络错误: {e}")
         except json.JSONDecodeError as e:
-            logging.error(f"解析东方财富返回的 JSON 时出错: {e}")
+            logger.error(f"解析东方财富返回的 JSON 时出错: {e}")
 
 if __name__ == '__main__':
+    from src.utils.logger import set_logger
+    set_logger()
     # --- 使用示例 ---
     # 在实际使用中，这些值应从安全的配置文件中加载
 
@@ -112,7 +139,7 @@ if __name__ == '__main__':
     TEST_CONTENT = "<p>这是文章的 <b>HTML</b> 内容。</p>"
 
     if TEST_CTOKEN == "your_ctoken_here":
-        logging.warning("请在 if __name__ == '__main__': 代码块中设置真实的 ctoken 和 utoken 进行测试。")
+        logger.warning("请在 if __name__ == '__main__': 代码块中设置真实的 ctoken 和 utoken 进行测试。")
     else:
         publisher = EastmoneyPublisher(
             ctoken=TEST_CTOKEN,
@@ -1,12 +1,42 @@
-import google.generativeai as genai
+import asyncio
+import functools
+import logging
 from typing import List, Dict
 
 # 从 src 包的 config 模块导入全局配置实例
-from src.config import global_config
-from src.prompt_template import ANALYSIS_PROMPT
+from src.config import global_config, FAKE_SERVICES_CONFIG, resolve_url, register_reload_hook
+from src.prompt_template import build_analysis_prompt
+from src.utils.deadline import request_timeout
+from src.utils.metrics import run_metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 单次生成请求的超时 (秒)
+GENERATE_TIMEOUT = 600
+
+GEMINI_API_ENDPOINT = "https://generativelanguage.googleapis.com"
+
+
+@functools.lru_cache(maxsize=None)
+def _configured_genai():
+    """
+    导入并初始化 Gemini SDK，只执行一次。
+    SDK 的导入耗时约半秒，放到第一次分析时进行，缓存命中的运行无需付出这部分开销。
+    """
+    import google.generativeai as genai
+
+    if FAKE_SERVICES_CONFIG["enable"]:
+        # 本地假服务只提供 REST 接口
+        genai.configure(api_key=global_config.get("gemini", "api_key") or "fake", transport="rest",
+                        client_options={"api_endpoint": resolve_url(GEMINI_API_ENDPOINT)})
+    else:
+        genai.configure(api_key=global_config.get("gemini", "api_key"))
+    return genai
+
+# API key 或假服务配置变更后，下次分析时重新初始化
+register_reload_hook(_configured_genai.cache_clear)
 
-# 初始化 Gemini API
-genai.configure(api_key=global_config.get("gemini", "api_key"))
 
 async def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
     """
@@ -15,17 +45,24 @@ async def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
     :param news_data: 包含新闻字典的列表，每个字典含 'title' 和 'content'。
     :return: AI生成的Markdown格式分析报告。
     """
-    model = genai.GenerativeModel('gemini-2.5-pro')
-
-    # 将新闻列表格式化为字符串
-    formatted_news = "\n".join([f"标题: {item['title']}\n内容: {item['content']}\n---" for item in news_data])
+    model = _configured_genai().GenerativeModel('gemini-2.5-pro')
 
-    prompt = ANALYSIS_PROMPT.format(formatted_news=formatted_news)
+    # 将新闻列表格式化并填入提示词
+    prompt = build_analysis_prompt(news_data)
 
 
     try:
-        response = await model.generate_content_async(prompt)
+        request_options = {"timeout": request_timeout(GENERATE_TIMEOUT)}
+        with run_metrics.span("call", operation="gemini.generate"), tracer.span("gemini.generate"):
+            if FAKE_SERVICES_CONFIG["enable"]:
+                # REST 传输没有异步客户端，改为在线程中调用同步接口
+                response = await asyncio.to_thread(model.generate_content, prompt, request_options=request_options)
+            else:
+                response = await model.generate_content_async(prompt, request_options=request_options)
+        usage = response.usage_metadata
+        run_metrics.incr("gemini_tokens", usage.prompt_token_count or 0, kind="prompt")
+        run_metrics.incr("gemini_tokens", usage.candidates_token_count or 0, kind="completion")
         return response.text
     except Exception as e:
-        print(f"Gemini分析失败: {e}")
+        logger.error(f"Gemini分析失败: {e}")
         return f"**AI分析失败**\n原因: {e}"
@@ -1,8 +1,27 @@
 from typing import List, Dict
+import logging
 import requests
 import json
-from src.config import global_config
-from src.prompt_template import ANALYSIS_PROMPT
+from src.config import global_config, resolve_url
+from src.prompt_template import build_analysis_prompt
+from src.services.client_pool import client_pool
+from src.utils.retry_policy import GEMINI_PROXY_POLICY
+from src.utils.metrics import run_metrics
+from src.utils.deadline import request_timeout
+
+logger = logging.getLogger(__name__)
+
+# 生成长文分析较慢，单次请求的超时 (秒)
+PROXY_REQUEST_TIMEOUT = 300
+
+
+@GEMINI_PROXY_POLICY
+def _post_generate(url: str, **kwargs) -> requests.Response:
+    """发送一次生成请求并检查 HTTP 状态码。"""
+    response = client_pool.session("gemini_proxy").post(resolve_url(url), timeout=request_timeout(PROXY_REQUEST_TIMEOUT), **kwargs)
+    run_metrics.record_transfer("gemini_proxy", response)
+    response.raise_for_status()
+    return response
 
 
 # ==========================================================
@@ -35,10 +54,8 @@ def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
 
     # 你的提示词
 
-    # 将新闻列表格式化为字符串
-    formatted_news = "\n".join([f"标题: {item['title']}\n内容: {item['content']}\n---" for item in news_data])
-
-    prompt = ANALYSIS_PROMPT.format(formatted_news=formatted_news)
+    # 将新闻列表格式化并填入提示词
+    prompt = build_analysis_prompt(news_data)
 
     # (关键) 构造请求体 (Payload)
     # 官方 API 要求一个特定的 JSON 结构
@@ -71,7 +88,7 @@ def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
         'key': API_KEY
     }
 
-    print(f"--- 正在向 {API_URL} 发送 POST 请求 ---")
+    logger.info(f"--- 正在向 {API_URL} 发送 POST 请求 ---")
     # print(f"请求体 (Body): \n{json.dumps(payload, indent=2, ensure_ascii=False)}\n")
 
     # ==========================================================
@@ -79,19 +96,19 @@ def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
     # ==========================================================
 
     try:
-        # 发送 POST 请求
-        response = requests.post(
+        # 发送 POST 请求；状态码不是 200-299 时会引发异常，并按重试策略决定是否重试
+        response = _post_generate(
             API_URL,
             headers=headers,
             params=params,  # API Key 在这里
             json=payload  # 你的提示词在这里
         )
 
-        # 检查 HTTP 状态码
-        response.raise_for_status()  # 如果状态码不是 200-299，会引发异常
-
         # 将响应解析为 JSON
         response_data = response.json()
+        usage = response_data.get('usageMetadata', {})
+        run_metrics.incr("gemini_tokens", usage.get('promptTokenCount', 0), kind="prompt")
+        run_metrics.incr("gemini_tokens", usage.get('candidatesTokenCount', 0), kind="completion")
 
         #print("--- 收到响应 (原始 JSON) ---")
         #print(json.dumps(response_data, indent=2, ensure_ascii=False))
@@ -104,24 +121,24 @@ def analyze_news_with_gemini(news_data: List[Dict[str, str]]) -> str:
         # 路径是: candidates[0] -> content -> parts[0] -> text
         try:
             text_content = response_data['candidates'][0]['content']['parts'][0]['text']
-            print("\n--- 提取到的回答 ---")
-            print(text_content)
+            logger.debug("--- 提取到的回答 ---")
+            logger.debug(text_content)
 
             return text_content
 
         except (KeyError, IndexError) as e:
-            print(f"\n错误：无法从响应中解析出文本。错误: {e}")
-            print("可能是因为安全设置阻止了回答，请检查 'promptFeedback' 字段。")
+            logger.error(f"错误：无法从响应中解析出文本。错误: {e}")
+            logger.warning("可能是因为安全设置阻止了回答，请检查 'promptFeedback' 字段。")
             if 'promptFeedback' in response_data:
-                print(f"安全反馈: {response_data['promptFeedback']}")
+                logger.warning(f"安全反馈: {response_data['promptFeedback']}")
 
     except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP 错误: {http_err}")
-        print(f"响应内容: {http_err.response.text}")
+        logger.error(f"HTTP 错误: {http_err}")
+        logger.error(f"响应内容: {http_err.response.text}")
     except requests.exceptions.RequestException as req_err:
-        print(f"请求发生错误: {req_err}")
+        logger.error(f"请求发生错误: {req_err}")
     except Exception as e:
-        print(f"发生未知错误: {e}")
+        logger.error(f"发生未知错误: {e}")
 
 
 # if __name__ == '__main__':
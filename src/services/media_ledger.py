@@ -0,0 +1,96 @@
+import datetime
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保留进程内的锁
+    fcntl = None
+
+from src.utils.json_store import STATE_DIR, load_json, dump_json_atomic
+
+# --- 配置项 ---
+LEDGER_PATH = os.path.join(STATE_DIR, 'media_ledger.json')
+# 企业微信临时素材有效期为 3 天
+WORK_TEMP_MEDIA_TTL = datetime.timedelta(days=3)
+# 临时素材剩余有效期不足该值时不再复用，避免消息发出时素材恰好过期
+REUSE_SAFETY_MARGIN = datetime.timedelta(hours=6)
+
+
+def content_hash(data: bytes) -> str:
+    """计算图片内容的 SHA-256 摘要，作为账本的去重键。"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class MediaLedger:
+    """
+    Media ID 账本：按 (平台, 内容哈希) 记录已上传素材的 media_id、上传时间与过期时间。
+
+    同一张图片 (例如默认封面) 在同一平台只需上传一次，之后直接复用仍在有效期内的 media_id。
+    永久素材的 expires_at 为 None。
+
+    账本每次都从磁盘读取；写入时持有线程锁与文件锁，在锁内重新读取后合并，
+    cron 任务与常驻进程同时上传时不会互相覆盖对方的记录。写入时顺带清理已过期的条目。
+    """
+
+    def __init__(self, path: str = LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的写入锁 (与 token_manager 相同的做法)。"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _prune(entries: Dict[str, dict], now: datetime.datetime) -> Dict[str, dict]:
+        """去掉已过期的临时素材条目。"""
+        return {
+            key: entry for key, entry in entries.items()
+            if not entry.get("expires_at") or datetime.datetime.fromisoformat(entry["expires_at"]) > now
+        }
+
+    @staticmethod
+    def _key(platform: str, digest: str) -> str:
+        return f"{platform}:{digest}"
+
+    def get(self, platform: str, digest: str) -> Optional[str]:
+        """返回仍在有效期内的 media_id；不存在或即将过期时返回 None。"""
+        entry = load_json(self.path, default={}).get(self._key(platform, digest))
+        if not entry:
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at:
+            now = datetime.datetime.now(ZoneInfo("Asia/Shanghai"))
+            if datetime.datetime.fromisoformat(expires_at) - now < REUSE_SAFETY_MARGIN:
+                return None
+        return entry["media_id"]
+
+    def record(self, platform: str, digest: str, media_id: str, ttl: datetime.timedelta = None) -> None:
+        """记录一次成功的上传；ttl 为 None 表示永久素材。"""
+        uploaded_at = datetime.datetime.now(ZoneInfo("Asia/Shanghai"))
+        with self._lock, self._file_lock():
+            entries = self._prune(load_json(self.path, default={}), uploaded_at)
+            entries[self._key(platform, digest)] = {
+                "media_id": media_id,
+                "uploaded_at": uploaded_at.isoformat(),
+                "expires_at": (uploaded_at + ttl).isoformat() if ttl else None,
+            }
+            dump_json_atomic(self.path, entries)
+
+
+# 全局单例，供各上传客户端共享
+media_ledger = MediaLedger()
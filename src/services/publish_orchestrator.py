@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from src.services.publishers import PUBLISHERS, PLATFORM_NAMES
+from src.utils.deadline import remaining_time
+from src.utils.metrics import run_metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+# 各平台发布的截止时间 (秒)，超时的平台会被标记为 in_doubt，不再阻塞其他平台
+PUBLISH_DEADLINES = {
+    "wechat_work": 60,
+    "wechat_mp": 60,
+    "xueqiu": 90,
+    "eastmoney": 60,
+}
+DEFAULT_PUBLISH_DEADLINE = 60
+# 发布结果 -> 指标中 span 的状态
+SPAN_STATUS = {"success": "ok", "failed": "error", "in_doubt": "timeout"}
+
+
+def _default_executor(platform: str, payload: Dict[str, Any]) -> Any:
+    return PUBLISHERS[platform](payload)
+
+
+class _PublishCall:
+    """
+    在工作线程中执行一次发布，并在超时后接管结果的上报。
+
+    超时后线程中的请求无法被强制中断，发布可能仍会成功。此时由线程在完成后自行调用
+    on_success，调用方照常记录发布时间戳，下次运行不会重复发布。
+    用锁保证结果只由等待方或线程中的一方上报。
+    """
+
+    def __init__(self, platform: str, payload: Dict[str, Any], executor: Callable[[str, Any], Any],
+                 on_success: Callable[[str, Any], None] = None):
+        self.platform = platform
+        self.payload = payload
+        self.executor = executor
+        self.on_success = on_success
+        self._lock = threading.Lock()
+        self._finished = False
+        self._abandoned = False
+        self.result = None
+
+    def run(self) -> Any:
+        result = self.executor(self.platform, self.payload)
+        with self._lock:
+            self._finished, self.result = True, result
+            late = self._abandoned
+        if late:
+            logger.warning(f"    >>> {PLATFORM_NAMES.get(self.platform, self.platform)} 在超时后发布成功，补记发布结果。")
+            if self.on_success:
+                self.on_success(self.platform, result)
+        return result
+
+    def abandon(self) -> bool:
+        """等待方放弃等待。返回 False 表示线程恰好已完成，结果仍由等待方上报。"""
+        with self._lock:
+            if self._finished:
+                return False
+            self._abandoned = True
+            return True
+
+
+async def _publish_one(platform: str, payload: Dict[str, Any], deadline: float,
+                       on_success: Callable[[str, Any], None] = None,
+                       executor: Callable[[str, Any], Any] = _default_executor) -> Dict[str, Any]:
+    """
+    在线程池中执行单个平台的阻塞发布，并施加截止时间。
+    超时的平台标记为 in_doubt (结果未知) 而不是失败：线程仍在运行，成功后会补调 on_success。
+    """
+    started = time.monotonic()
+    # 平台截止时间不超过当前阶段的剩余时间
+    remaining = remaining_time()
+    if remaining is not None:
+        deadline = round(min(deadline, remaining), 1)
+    call = _PublishCall(platform, payload, executor, on_success)
+    # 发布线程继承该 span，平台内的各个 HTTP 请求在追踪中挂在它之下
+    with tracer.span(f"publish.{platform}", platform=platform) as span:
+        try:
+            result = await asyncio.wait_for(asyncio.to_thread(call.run), timeout=deadline)
+        except asyncio.TimeoutError:
+            if call.abandon():
+                logger.warning(f"    >>> [超时] {PLATFORM_NAMES.get(platform, platform)} 发布超过 {deadline} 秒未完成，"
+                               f"结果未知，完成后会补记。")
+                span.set_error(f"超过 {deadline} 秒")
+                return {"status": "in_doubt", "elapsed": round(time.monotonic() - started, 3),
+                        "error": f"超过 {deadline} 秒未完成，发布可能仍在进行"}
+            result = call.result
+        except Exception as e:
+            logger.error(f"    >>> [失败] 发布到{PLATFORM_NAMES.get(platform, platform)}时出错: {e}")
+            span.set_error(str(e))
+            return {"status": "failed", "elapsed": round(time.monotonic() - started, 3), "error": str(e)}
+
+    elapsed = round(time.monotonic() - started, 3)
+    logger.info(f"    >>> 成功: 已发布到{PLATFORM_NAMES.get(platform, platform)} ({elapsed}s)。")
+    if on_success:
+        on_success(platform, result)
+    return {"status": "success", "elapsed": elapsed, "result": result if isinstance(result, (str, int, bool)) else None}
+
+
+async def publish_concurrently(jobs: Dict[str, Dict[str, Any]],
+                               on_success: Callable[[str, Any], None] = None,
+                               deadlines: Dict[str, float] = None,
+                               executor: Callable[[str, Any], Any] = _default_executor) -> Dict[str, Dict[str, Any]]:
+    """
+    并发地向所有平台发布，整体耗时取决于最慢的平台而不是各平台耗时之和。
+
+    单个平台的失败或超时不会影响其他平台；每个平台一成功就会调用 on_success(平台, 结果)，
+    调用方可借此立即持久化该平台的发布时间戳。超时的平台在发布线程完成后仍会补调 on_success
+    (此时在工作线程中调用)。
+
+    :param jobs: 以平台名称为键、发布 payload 为值的字典。
+    :param on_success: 单个平台发布成功时的回调。
+    :param deadlines: 覆盖默认的各平台截止时间。
+    :param executor: 执行单个平台发布的函数 executor(平台, payload)，默认直接调用 PUBLISHERS 中的发布函数。
+    :return: 以平台名称为键的结果摘要 (status / elapsed / error 或 result)。
+    """
+    deadlines = {**PUBLISH_DEADLINES, **(deadlines or {})}
+    platforms = list(jobs)
+    outcomes = await asyncio.gather(*[
+        _publish_one(platform, jobs[platform], deadlines.get(platform, DEFAULT_PUBLISH_DEADLINE), on_success, executor)
+        for platform in platforms
+    ])
+    for platform, outcome in zip(platforms, outcomes):
+        run_metrics.add_span("publish", outcome["elapsed"], SPAN_STATUS.get(outcome["status"], outcome["status"]), platform=platform)
+        if outcome["status"] == "failed":
+            run_metrics.incr("failures", stage="publish", platform=platform)
+        elif outcome["status"] == "in_doubt":
+            run_metrics.incr("in_doubt", stage="publish", platform=platform)
+    return dict(zip(platforms, outcomes))
+
+
+def format_publish_summary(results: Dict[str, Dict[str, Any]]) -> str:
+    """将发布结果整理为便于阅读的多行摘要。"""
+    lines = []
+    for platform, outcome in results.items():
+        line = f"    - {PLATFORM_NAMES.get(platform, platform)}: {outcome['status']} ({outcome['elapsed']}s)"
+        if outcome.get("error"):
+            line += f" - {outcome['error']}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,368 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List
+
+from src.utils.json_store import STATE_DIR
+from src.services.publishers import PUBLISHERS, PLATFORM_NAMES, is_auth_error, is_unsent_error
+from src.services.circuit_breaker import circuit_breakers
+from src.utils.deadline import caused_by_deadline, current_deadline
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+OUTBOX_DB_PATH = os.path.join(STATE_DIR, 'publish_outbox.db')
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 60
+BACKOFF_MAX_SECONDS = 2 * 60 * 60
+# 超过该时长仍未发出的任务不再重试 (隔天的解读已无发布意义)
+MAX_JOB_AGE_SECONDS = 24 * 60 * 60
+# 处于 sending 状态超过该时长，说明进程在发送途中退出，结果未知 (转为 in_doubt)
+SENDING_LEASE_SECONDS = 30 * 60
+WORKER_POLL_SECONDS = 60
+
+# 任务状态:
+#   pending  等待发送 (包括等待重试)
+#   sending  正在发送
+#   done     发送成功
+#   in_doubt 结果未知：请求可能已被平台处理 (读取超时、5xx、发送中断等)，不再自动重试，需人工确认
+#   dead     放弃：超过最大次数或已过期
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS publish_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    platform TEXT NOT NULL,
+    news_date TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_retry_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_publish_jobs_due ON publish_jobs (status, next_retry_at);
+"""
+
+
+def make_idempotency_key(platform: str, news_date: str) -> str:
+    """
+    每个平台每天只生成一个任务，保证不会重复发布。
+    内容不参与计算：重新分析或渲染器变化后生成的 HTML 不同，也不会为同一天再发一篇。
+    """
+    return f"{platform}:{news_date}"
+
+
+class PublishOutbox:
+    """
+    基于 SQLite 的持久化发布队列 (outbox)。
+
+    每个平台的一次发布都是一条带有渲染好的 payload、尝试次数和下次重试时间的任务。
+    发送失败的任务按指数退避重新排期，由 drain() 在主流程或后台 worker 中取出执行；
+    幂等键保证同一内容在同一平台只会成功发送一次。
+    """
+
+    def __init__(self, path: str = OUTBOX_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每次操作使用独立连接，可安全地在多个线程中调用
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def enqueue(self, platform: str, payload: Dict[str, Any], news_date: str, force: bool = False) -> Dict[str, Any]:
+        """
+        加入一条发布任务并返回它。同一平台同一天已有任务时直接返回已有任务；
+        已有任务仍在等待发送 (pending) 时用新的 payload 替换旧内容，发出的总是最新的一版。
+        force=True (对应 force_publish_* 开关) 时使用带时间戳的新幂等键，允许再次发布。
+        """
+        key = make_idempotency_key(platform, news_date)
+        if force:
+            key = f"{key}:force:{time.time()}"
+        now = time.time()
+        payload_json = json.dumps(payload, ensure_ascii=False)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = None
+            if not force:
+                # 旧版本的幂等键包含内容哈希，按平台与日期查找才能匹配到升级前创建的任务
+                row = conn.execute(
+                    "SELECT * FROM publish_jobs WHERE platform = ? AND news_date = ? AND idempotency_key NOT LIKE '%:force:%' "
+                    "ORDER BY id DESC LIMIT 1",
+                    (platform, news_date)).fetchone()
+            if row is None:
+                job_id = conn.execute(
+                    "INSERT INTO publish_jobs "
+                    "(idempotency_key, platform, news_date, payload, next_retry_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, platform, news_date, payload_json, now, now, now)).lastrowid
+            else:
+                job_id = row["id"]
+                if row["status"] == "pending" and row["payload"] != payload_json:
+                    conn.execute("UPDATE publish_jobs SET payload = ?, updated_at = ? WHERE id = ?", (payload_json, now, job_id))
+                    logger.info(f"    {PLATFORM_NAMES.get(platform, platform)} 任务 #{job_id} 尚未发出，已替换为最新内容。")
+            row = conn.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row)
+
+    def _expire_stale_jobs(self, conn: sqlite3.Connection, now: float) -> None:
+        """将过期任务与发送中断的任务标记为 dead，避免重复发布。"""
+        conn.execute(
+            "UPDATE publish_jobs SET status = 'dead', last_error = '任务已过期，不再重试', updated_at = ? "
+            "WHERE status = 'pending' AND created_at < ?",
+            (now, now - MAX_JOB_AGE_SECONDS))
+        conn.execute(
+            "UPDATE publish_jobs SET status = 'in_doubt', last_error = '发送过程中断，结果未知，请人工确认', updated_at = ? "
+            "WHERE status = 'sending' AND updated_at < ?",
+            (now, now - SENDING_LEASE_SECONDS))
+
+    def claim_due_jobs(self, job_ids: List[int] = None) -> List[Dict[str, Any]]:
+        """
+        取出所有到期的 pending 任务并原子地标记为 sending。
+        传入 job_ids 时只领取其中到期的任务。
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire_stale_jobs(conn, now)
+            rows = conn.execute(
+                "SELECT * FROM publish_jobs WHERE status = 'pending' AND next_retry_at <= ? ORDER BY id",
+                (now,)).fetchall()
+            if job_ids is not None:
+                rows = [row for row in rows if row["id"] in job_ids]
+            conn.executemany(
+                "UPDATE publish_jobs SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows])
+        return [self._to_job(row) for row in rows]
+
+    def release(self, job_ids: List[int]) -> None:
+        """把已领取但尚未开始发送的任务放回队列，不计入尝试次数。"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE publish_jobs SET status = 'pending', attempts = attempts - 1, updated_at = ? "
+                "WHERE id = ? AND status = 'sending'",
+                [(now, job_id) for job_id in job_ids])
+
+    def defer(self, job_id: int, until: float, reason: str) -> None:
+        """把已领取的任务推迟到指定时间 (例如平台熔断中)，不计入尝试次数。"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE publish_jobs SET status = 'pending', attempts = attempts - 1, next_retry_at = ?, last_error = ?, "
+                "updated_at = ? WHERE id = ? AND status = 'sending'",
+                (until, reason, time.time(), job_id))
+
+    def mark_done(self, job_id: int, result: Any = None) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE publish_jobs SET status = 'done', result = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False, default=str), time.time(), job_id))
+
+    def mark_failed(self, job_id: int, error: str) -> Dict[str, Any]:
+        """记录一次失败，并按指数退避 (带抖动) 安排下次重试；超过最大次数则放弃。"""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT attempts FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+            attempts = row["attempts"]
+            if attempts >= MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE publish_jobs SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                    (error, now, job_id))
+            else:
+                delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+                delay = delay * random.uniform(0.8, 1.2)
+                conn.execute(
+                    "UPDATE publish_jobs SET status = 'pending', last_error = ?, next_retry_at = ?, updated_at = ? WHERE id = ?",
+                    (error, now + delay, now, job_id))
+            row = conn.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row)
+
+    def mark_in_doubt(self, job_id: int, error: str, count_attempt: bool = True) -> None:
+        """
+        请求可能已被平台处理，结果未知：不再自动重试，等待人工确认。
+        count_attempt=False 时 (本次运行的截止时间到期) 不计入尝试次数。
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE publish_jobs SET status = 'in_doubt', attempts = attempts - ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (0 if count_attempt else 1, error, time.time(), job_id))
+
+    def resolve(self, job_id: int, published: bool) -> Dict[str, Any]:
+        """
+        人工确认一条 in_doubt 任务：published=True 表示平台上已经能看到这篇内容，标记为 done；
+        否则放回队列重新发送 (不计入尝试次数)。
+        """
+        with closing(self._connect()) as conn, conn:
+            if published:
+                conn.execute(
+                    "UPDATE publish_jobs SET status = 'done', last_error = NULL, updated_at = ? "
+                    "WHERE id = ? AND status = 'in_doubt'",
+                    (time.time(), job_id))
+            else:
+                conn.execute(
+                    "UPDATE publish_jobs SET status = 'pending', next_retry_at = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'in_doubt'",
+                    (time.time(), time.time(), job_id))
+            row = conn.execute("SELECT * FROM publish_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"任务 #{job_id} 不存在")
+        return self._to_job(row)
+
+    def in_doubt_jobs(self) -> List[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM publish_jobs WHERE status = 'in_doubt' ORDER BY id").fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def execute(self, job: Dict[str, Any]) -> Any:
+        """
+        执行一条已领取的任务，并把结果写回 outbox。
+        在工作线程中运行：即使调用方因截止时间放弃等待，发送完成后仍会正确记录结果。
+        只有确定未发出的失败 (见 is_unsent_error) 才按退避重试，其余失败标记为 in_doubt。
+        因本次运行自身的截止时间到期 (包括截止时间用尽时的请求超时) 或被取消而中止时，不计为平台故障，
+        也不消耗尝试次数：请求未发出则放回队列，可能已发出则同样标记为 in_doubt。
+        """
+        platform_name = PLATFORM_NAMES.get(job['platform'], job['platform'])
+        try:
+            result = PUBLISHERS[job["platform"]](job["payload"])
+        except asyncio.CancelledError:
+            self.defer(job["id"], time.time(), "发送被取消，任务放回队列")
+            logger.info(f"    {platform_name} 任务 #{job['id']} 被取消，已放回队列。")
+            raise
+        except Exception as e:
+            if caused_by_deadline(e):
+                # 本次运行自身的截止时间到期，不是平台故障：不计入熔断器，也不消耗尝试次数
+                if is_unsent_error(e):
+                    self.defer(job["id"], time.time(), f"本次运行截止时间已到，任务放回队列: {e}")
+                    logger.info(f"    {platform_name} 任务 #{job['id']} 因截止时间中止，已放回队列。")
+                else:
+                    self.mark_in_doubt(job["id"], f"截止时间到期时请求可能已发出: {e}", count_attempt=False)
+                    logger.error(f"    {platform_name} 任务 #{job['id']} 因截止时间中止，请求可能已发出，请确认平台上是否已发布: {e}")
+                raise
+            circuit_breakers.record_failure(job["platform"], str(e), is_auth_error=is_auth_error(e))
+            if not is_unsent_error(e):
+                # 与 RetryPolicy 对非幂等请求的处理一致：请求可能已被处理时不重发，避免重复发布
+                self.mark_in_doubt(job["id"], str(e))
+                logger.error(f"    {platform_name} 任务 #{job['id']} 发送结果未知，不再自动重试，请确认平台上是否已发布: {e}")
+                raise
+            updated = self.mark_failed(job["id"], str(e))
+            if updated["status"] == "pending":
+                logger.warning(f"    {platform_name} 任务 #{job['id']} 第 {updated['attempts']} 次发送失败，"
+                      f"将在 {max(0, int(updated['next_retry_at'] - time.time()))} 秒后重试。")
+            else:
+                logger.warning(f"    {platform_name} 任务 #{job['id']} 已放弃: {e}")
+            raise
+        circuit_breakers.record_success(job["platform"])
+        self.mark_done(job["id"], result)
+        return result
+
+    def completed_platforms(self, news_date: str) -> Dict[str, float]:
+        """返回某个新闻日期已成功发布的平台及其完成时间 (Unix 时间戳)。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT platform, MAX(updated_at) AS done_at FROM publish_jobs "
+                "WHERE news_date = ? AND status = 'done' GROUP BY platform",
+                (news_date,)).fetchall()
+        return {row["platform"]: row["done_at"] for row in rows}
+
+    def pending_count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM publish_jobs WHERE status IN ('pending', 'sending')").fetchone()[0]
+
+
+async def drain_outbox(outbox: PublishOutbox, job_ids: List[int] = None, deadlines: Dict[str, float] = None,
+                       on_success=None) -> Dict[int, Dict[str, Any]]:
+    """
+    取出到期任务并发执行。不同平台并发，同一平台的多条任务依次执行。
+    on_success(任务, 结果) 在每条任务成功后调用。
+
+    :return: 以任务 id 为键的结果摘要。
+    """
+    # 延迟导入，避免与 publish_orchestrator 循环依赖
+    from src.services.publish_orchestrator import publish_concurrently
+
+    jobs = outbox.claim_due_jobs(job_ids)
+    results = {}
+    while jobs:
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            # 截止时间已到：尚未开始的任务放回队列，由下次运行或 worker 继续
+            outbox.release([job["id"] for job in jobs])
+            logger.info(f"    >>> 截止时间已到，{len(jobs)} 条发布任务放回队列。")
+            break
+        # 每一轮每个平台最多取一条任务；熔断中的平台直接跳过，任务推迟到允许探测的时间
+        batch = {}
+        remaining = []
+        for job in jobs:
+            if job["platform"] in batch:
+                remaining.append(job)
+            elif not circuit_breakers.allow(job["platform"]):
+                reason = circuit_breakers.describe(job["platform"])
+                outbox.defer(job["id"], circuit_breakers.retry_at(job["platform"]) or time.time(), reason)
+                logger.warning(f"    >>> {PLATFORM_NAMES.get(job['platform'], job['platform'])} {reason}，跳过任务 #{job['id']}。")
+                results[job["id"]] = {"platform": job["platform"], "status": "skipped", "elapsed": 0, "error": reason}
+            else:
+                batch[job["platform"]] = job
+        if not batch:
+            jobs = remaining
+            continue
+        outcomes = await publish_concurrently(
+            batch, deadlines=deadlines,
+            on_success=(lambda platform, result, batch=batch: on_success(batch[platform], result)) if on_success else None,
+            executor=lambda platform, job: outbox.execute(job))
+        for platform, outcome in outcomes.items():
+            results[batch[platform]["id"]] = {"platform": platform, **outcome}
+        jobs = remaining
+    return results
+
+
+async def run_worker(outbox: PublishOutbox = None, poll_interval: float = WORKER_POLL_SECONDS) -> None:
+    """后台 worker：周期性地取出到期任务重试，直到进程被终止。"""
+    outbox = outbox or PublishOutbox()
+    logger.info(f"--- 发布 outbox worker 启动，每 {poll_interval} 秒检查一次到期任务 ---")
+    while True:
+        try:
+            results = await drain_outbox(outbox)
+            if results:
+                logger.info(f">>> 本轮处理了 {len(results)} 条发布任务，剩余待发送 {outbox.pending_count()} 条。")
+        except Exception as e:
+            logger.error(f">>> [错误] outbox worker 处理任务时出错: {e}")
+        await asyncio.sleep(poll_interval)
+
+
+if __name__ == '__main__':
+    import argparse
+    from src.utils.logger import set_logger
+
+    parser = argparse.ArgumentParser(description="发布 outbox：默认运行重试 worker，也可人工确认结果未知的任务。")
+    parser.add_argument("--list-in-doubt", action="store_true", help="列出结果未知 (in_doubt) 的任务")
+    parser.add_argument("--confirm", type=int, metavar="ID", help="确认该任务已在平台上发布，标记为 done")
+    parser.add_argument("--resend", type=int, metavar="ID", help="确认该任务未发布，放回队列重新发送")
+    args = parser.parse_args()
+    set_logger()
+    if args.list_in_doubt:
+        for job in PublishOutbox().in_doubt_jobs():
+            print(f"#{job['id']}\t{PLATFORM_NAMES.get(job['platform'], job['platform'])}\t{job['news_date']}\t"
+                  f"{job['payload'].get('title', '')}\t{job['last_error']}")
+    elif args.confirm is not None or args.resend is not None:
+        job_id = args.confirm if args.confirm is not None else args.resend
+        job = PublishOutbox().resolve(job_id, published=args.confirm is not None)
+        print(f"任务 #{job['id']} 当前状态: {job['status']}")
+    else:
+        asyncio.run(run_worker())
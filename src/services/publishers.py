@@ -0,0 +1,122 @@
+import asyncio
+import sys
+from typing import Any, Callable, Dict
+
+from src.config import STAGE_CONFIG
+from src.services.client_pool import client_pool
+from src.utils.deadline import DeadlineExceeded
+from src.utils.retry_policy import NOT_SENT_ERRORS
+
+# 每个平台的发布函数都接收同一种结构的 payload：
+#   {"title": 标题, "content": 已渲染的HTML, "thumb_media_id": 封面 Media ID (仅微信平台需要)}
+# payload 只包含可序列化的发布内容，平台凭证在发布时从配置中读取。
+# 各平台的客户端在发布时才导入，没有需要发布的平台时不为其付出导入开销。
+
+
+def publish_wechat_work(payload: Dict[str, Any]):
+    """发送企业微信图文消息。"""
+    from src.services.wechat_clients import WeChatWorkClient
+    work_client = client_pool.client("wechat_work", WeChatWorkClient)
+    work_client.send_mpnews(title=payload["title"], content=payload["content"], thumb_media_id=payload["thumb_media_id"])
+
+
+def publish_wechat_mp(payload: Dict[str, Any]) -> str:
+    """创建微信公众号草稿，返回草稿的 media_id。"""
+    from src.services.wechat_clients import WeChatMPClient
+    mp_client = client_pool.client("wechat_mp", WeChatMPClient)
+    return mp_client.create_draft(title=payload["title"], content=payload["content"], thumb_media_id=payload["thumb_media_id"])
+
+
+def publish_xueqiu(payload: Dict[str, Any]) -> str:
+    """发布文章到雪球，返回 Post ID。在工作线程中运行，使用异步发布器并发执行互不依赖的步骤。"""
+    from src.services.xueqiu import AsyncXueqiuPublisher
+    publisher = AsyncXueqiuPublisher(
+        cookie=STAGE_CONFIG.get("XUEQIU_COOKIE"),
+        title=payload["title"],
+        content=payload["content"])
+    return asyncio.run(publisher.publish())
+
+
+def publish_eastmoney(payload: Dict[str, Any]):
+    """发布文章到东方财富。发布接口返回失败时抛出异常 (凭证被拒绝时为 EastmoneyAuthError)，以便调用方统一处理。"""
+    from src.services.eastmoney import EastmoneyPublisher
+    publisher = EastmoneyPublisher(
+        ctoken=STAGE_CONFIG.get("EASTMONEY_CTOKEN"),
+        utoken=STAGE_CONFIG.get("EASTMONEY_UTOKEN"),
+        title=payload["title"],
+        content=payload["content"],
+    )
+    if not publisher.publish():
+        raise RuntimeError("东方财富发布接口返回失败，详见日志。")
+    return True
+
+
+# 平台名称 -> 发布函数
+PUBLISHERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "wechat_work": publish_wechat_work,
+    "wechat_mp": publish_wechat_mp,
+    "xueqiu": publish_xueqiu,
+    "eastmoney": publish_eastmoney,
+}
+
+# 表示凭证失效的异常 ("模块:类名")：重试无意义，熔断器会立即熔断对应平台
+AUTH_ERRORS = (
+    "src.services.xueqiu:XueqiuAuthError",
+    "src.services.eastmoney:EastmoneyAuthError",
+    "src.services.wechat_clients:WeChatAuthError",
+)
+
+
+def is_auth_error(error: BaseException) -> bool:
+    """判断异常是否表示凭证失效。尚未导入的模块不可能抛出其中的异常，因此无需为判断而导入。"""
+    for target in AUTH_ERRORS:
+        module_name, _, class_name = target.partition(":")
+        error_class = getattr(sys.modules.get(module_name), class_name, None)
+        if error_class is not None and isinstance(error, error_class):
+            return True
+    return False
+
+
+def _error_chain(error: BaseException):
+    """依次产出异常本身及其 __cause__ (各客户端用 raise ... from 包装底层的网络异常)。"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__
+
+
+def is_unsent_error(error: BaseException) -> bool:
+    """
+    判断发布失败时内容是否确定没有发出，可以安全地重新发送：
+    连接阶段失败、截止时间已到而未发起请求 (DeadlineExceeded)、服务端明确限流 (429)、凭证被拒绝，
+    或雪球在最终发布步骤之前失败 (草稿不会公开)。
+    读取超时、5xx 等请求可能已被处理的失败返回 False，重新发送可能造成重复发布。
+    """
+    if is_auth_error(error):
+        return True
+    xueqiu_error = getattr(sys.modules.get("src.services.xueqiu"), "XueqiuPublishError", None)
+    if xueqiu_error is not None and isinstance(error, xueqiu_error) and error.step != "publish":
+        return True
+    for cause in _error_chain(error):
+        if isinstance(cause, NOT_SENT_ERRORS + (DeadlineExceeded,)):
+            return True
+        if getattr(getattr(cause, "response", None), "status_code", None) == 429:
+            return True
+    return False
+
+# 平台名称 -> news_data 中记录发布时间的字段
+PUBLISH_TIMESTAMP_KEYS = {
+    "wechat_work": "work_publish_timestamp",
+    "wechat_mp": "mp_publish_timestamp",
+    "xueqiu": "xueqiu_publish_timestamp",
+    "eastmoney": "eastmoney_publish_timestamp",
+}
+
+# 平台名称 -> 展示名称
+PLATFORM_NAMES = {
+    "wechat_work": "企业微信",
+    "wechat_mp": "微信公众号",
+    "xueqiu": "雪球",
+    "eastmoney": "东方财富",
+}
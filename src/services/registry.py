@@ -0,0 +1,116 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator
+
+from src.utils.metrics import run_metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class LazyRegistry:
+    """
+    名称 -> "模块:属性" 的注册表，模块在第一次取用时才导入。
+
+    Gemini SDK、Pillow、BeautifulSoup 等依赖的导入开销远大于缓存命中时的实际工作量，
+    通过注册表取用后，只有真正执行的阶段才会导入对应的模块。首次导入的耗时记入运行指标
+    (span "import") 与追踪文件，便于确认哪些依赖拖慢了启动。
+    新的分析器或工具只需 register("名称", "模块:属性")，无需修改调用方。
+    """
+
+    def __init__(self, kind: str, entries: Dict[str, str] = None):
+        self.kind = kind
+        self._targets: Dict[str, str] = {}
+        self._loaded: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        for name, target in (entries or {}).items():
+            self.register(name, target)
+
+    def register(self, name: str, target: str) -> None:
+        """注册一个条目，target 形如 "src.services.cctv_fetcher:fetch_news_data"。"""
+        if ":" not in target:
+            raise ValueError(f"{self.kind} 注册表的条目 {name} 格式应为 '模块:属性'，实际为 {target!r}")
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """返回条目对应的对象，必要时先导入其模块。"""
+        if name in self._loaded:
+            return self._loaded[name]
+        try:
+            target = self._targets[name]
+        except KeyError:
+            raise KeyError(f"未注册的{self.kind}: {name}，可选: {list(self._targets)}") from None
+        module_name, _, attribute = target.partition(":")
+        with self._lock:
+            if name not in self._loaded:
+                self._loaded[name] = getattr(_import_module(module_name), attribute)
+        return self._loaded[name]
+
+    __getitem__ = get
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._targets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._targets))
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+
+def _import_module(module_name: str):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    started = time.perf_counter()
+    with tracer.span("import", module=module_name):
+        module = importlib.import_module(module_name)
+    duration = time.perf_counter() - started
+    run_metrics.add_span("import", duration, module=module_name)
+    logger.debug(f"按需导入 {module_name}，耗时 {duration * 1000:.1f} ms")
+    return module
+
+
+# --- 工作流各阶段用到的服务 ---
+# 内容获取：新闻列表与新闻正文
+FETCHERS = LazyRegistry("抓取器", {
+    "news_index": "src.services.cctv_fetcher:fetch_news_data",
+    "item_content": "src.services.cctv_fetcher:fetch_item_content",
+})
+
+# AI 分析：与 [StageControl] use_gemini_analyzer_proxy 对应
+ANALYZERS = LazyRegistry("分析器", {
+    "default": "src.services.gemini_analyzer:analyze_news_with_gemini",
+    "proxy": "src.services.gemini_analyzer_proxy:analyze_news_with_gemini",
+})
+
+# 封面图的下载、拼接、编码与归档
+IMAGE_TOOLS = LazyRegistry("图片工具", {
+    "download_selected_images": "src.utils.image_processor:download_selected_images",
+    "create_cover_variants": "src.utils.image_processor:create_cover_variants",
+    "encode_cover_variants": "src.utils.image_processor:encode_cover_variants",
+    "persist_cover_variants": "src.utils.image_processor:persist_cover_variants",
+    "read_cover_files": "src.utils.image_processor:read_cover_files",
+})
+
+# 上传封面图用到的平台客户端
+CLIENTS = LazyRegistry("客户端", {
+    "wechat_work": "src.services.wechat_clients:WeChatWorkClient",
+    "wechat_mp": "src.services.wechat_clients:WeChatMPClient",
+})
+
+# 发布前的 HTML 渲染与优化
+RENDERERS = LazyRegistry("渲染器", {
+    "render": "src.utils.html_renderer:render_platform_html",
+    "optimize": "src.utils.html_optimizer:optimize_platform_html",
+    "site": "src.static_site.generator:build_site",
+})
+
+# 归档后的趋势统计 (依赖 NumPy / SciPy)
+ANALYTICS = LazyRegistry("统计分析", {
+    "trends": "src.analytics.trends:update_trends",
+})
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 下没有 fcntl，只保留进程内的锁
+    fcntl = None
+
+from src.utils.json_store import STATE_DIR, load_json, dump_json_atomic
+from src.utils.metrics import run_metrics
+
+# --- 配置项 ---
+TOKEN_CACHE_PATH = os.path.join(STATE_DIR, 'wechat_tokens.json')
+# 距离过期不足该秒数时主动刷新，避免请求发出时 token 恰好失效
+REFRESH_MARGIN_SECONDS = 300
+# 微信返回的 token 失效错误码: 40001 无效凭证, 40014 不合法的 access_token, 42001 access_token 超时
+TOKEN_INVALID_ERRCODES = {40001, 40014, 42001}
+
+# fetcher 返回 (access_token, expires_in 秒数)
+TokenFetcher = Callable[[], Tuple[str, int]]
+
+
+class TokenManager:
+    """
+    微信公众号与企业微信共享的 access_token 缓存。
+
+    token 连同过期时间持久化到磁盘，跨进程、跨运行复用，只在即将过期或被判定失效时才刷新。
+    刷新时持有按 key 区分的线程锁以及文件锁，并发调用者只会触发一次 /token 请求，
+    其余调用者在锁释放后直接读取刷新后的结果。
+    """
+
+    def __init__(self, path: str = TOKEN_CACHE_PATH):
+        self.path = path
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的刷新锁，防止 cron 任务与常驻进程同时刷新同一个 token。"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _cached(self, key: str) -> str | None:
+        """返回磁盘缓存中仍然新鲜的 token。"""
+        entry = load_json(self.path, default={}).get(key)
+        if entry and entry.get("expires_at", 0) - time.time() > REFRESH_MARGIN_SECONDS:
+            return entry["access_token"]
+        return None
+
+    def get_token(self, key: str, fetcher: TokenFetcher, force_refresh: bool = False) -> str:
+        """
+        获取 key 对应的 access_token。缓存有效时直接返回，否则调用 fetcher 刷新并写回缓存。
+
+        :param key: token 的缓存键，例如 "wechat_mp:<appid>"。
+        :param fetcher: 真正请求 /token 接口的函数。
+        :param force_refresh: 为 True 时忽略缓存强制刷新。
+        """
+        if not force_refresh:
+            token = self._cached(key)
+            if token:
+                run_metrics.incr("cache_hits", cache="access_token")
+                return token
+
+        with self._key_lock(key), self._file_lock():
+            # 双重检查：等待锁期间，其他调用者可能已经完成了刷新
+            if not force_refresh:
+                token = self._cached(key)
+                if token:
+                    run_metrics.incr("cache_hits", cache="access_token")
+                    return token
+            run_metrics.incr("cache_misses", cache="access_token")
+            access_token, expires_in = fetcher()
+            entries = load_json(self.path, default={})
+            entries[key] = {
+                "access_token": access_token,
+                "expires_at": time.time() + int(expires_in),
+                "refreshed_at": time.time(),
+            }
+            dump_json_atomic(self.path, entries)
+            return access_token
+
+    def invalidate(self, key: str, stale_token: str) -> None:
+        """
+        将被接口判定失效的 token 从缓存中移除。
+        只有缓存中仍是这个失效 token 时才移除，避免误删其他调用者刚刷新的新 token。
+        """
+        with self._key_lock(key), self._file_lock():
+            entries = load_json(self.path, default={})
+            if entries.get(key, {}).get("access_token") == stale_token:
+                entries.pop(key)
+                dump_json_atomic(self.path, entries)
+
+
+# 全局单例，供所有微信客户端共享
+token_manager = TokenManager()
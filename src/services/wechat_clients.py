@@ -1,46 +1,154 @@
 import requests
 import json
+import logging
+import abc
 import datetime
+import io
+import mimetypes
+import os
 import re # 用于企业微信的_media_upload方法
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from typing import Union
 
 # 从 src 包的 config 模块导入全局配置实例
-from src.config import global_config
-from src.utils.logger import logger # 导入日志模块
+from src.config import global_config, resolve_url
+from src.services.client_pool import client_pool
+from src.services.media_ledger import media_ledger, content_hash, WORK_TEMP_MEDIA_TTL
+from src.services.token_manager import token_manager, TOKEN_INVALID_ERRCODES
+from src.utils.deadline import request_timeout
+from src.utils.metrics import run_metrics
+from src.utils.retry_policy import (
+    WECHAT_TOKEN_POLICY, WECHAT_MP_UPLOAD_POLICY, WECHAT_MP_DRAFT_POLICY,
+    WECHAT_WORK_MEDIA_POLICY, WECHAT_WORK_SEND_POLICY,
+)
 
-import logging
-logging.basicConfig(level=logging.info, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 单次请求的超时 (秒)，上传素材可能较慢
+REQUEST_TIMEOUT = 30
+TOKEN_REQUEST_TIMEOUT = 10
+
+# 表示凭证本身有误、刷新 token 也无法恢复的错误码:
+# 40013 不合法的 AppID/CorpID, 40125 不合法的 AppSecret, 40091 不合法的 Secret (企业微信),
+# 40164 / 60020 调用方 IP 不在白名单, 41002 / 41004 缺少 AppID / Secret
+CREDENTIAL_ERRCODES = {40013, 40125, 40091, 40164, 60020, 41002, 41004}
+
+# 上传接口接受的图片来源：文件路径，或已在内存中的图片数据
+ImageSource = Union[str, bytes, bytearray, memoryview]
+
+
+class WeChatAuthError(ValueError):
+    """微信凭证被拒绝：AppID/Secret 有误、IP 不在白名单，或刷新 token 后接口仍判定 token 失效。"""
+
+    def __init__(self, message: str, errcode: int = None):
+        super().__init__(message)
+        self.errcode = errcode
+
+
+def _api_error(message: str, data: dict) -> ValueError:
+    """根据接口返回的 errcode 构造异常：凭证类错误为 WeChatAuthError，其余为 ValueError。"""
+    errcode = data.get('errcode')
+    if errcode in CREDENTIAL_ERRCODES or errcode in TOKEN_INVALID_ERRCODES:
+        return WeChatAuthError(message, errcode)
+    return ValueError(message)
+
+
+def _read_media(image: ImageSource, filename: str = None):
+    """
+    将图片来源统一转换为 (文件名, 图片数据, MIME类型)。
+    内存数据直接使用，无需先落盘再读回；图片数据同时用于计算 media ID 账本的内容哈希。
+    """
+    if isinstance(image, str):
+        filename = filename or os.path.basename(image)
+        with open(image, 'rb') as f:
+            data = f.read()
+    else:
+        filename = filename or "cover.jpg"
+        data = image
+    content_type = mimetypes.guess_type(filename)[0] or 'image/jpeg'
+    return filename, data, content_type
 
 
+class _TokenSessionMixin(abc.ABC):
+    """
+    微信公众号与企业微信客户端共用的 access_token 处理逻辑。
+
+    token 由全局 token_manager 缓存与刷新；子类需提供 SERVICE (指标中的服务名)、_token_key 与 _fetch_access_token()。
+    每次请求前都会确认 token 新鲜，若接口返回 token 失效错误码，则刷新一次后重试该请求；
+    刷新后仍返回失效错误码时，由各接口的响应处理抛出 WeChatAuthError。
+    """
+    SERVICE: str
+    session: requests.Session
+    _token_key: str
+
+    @abc.abstractmethod
+    def _fetch_access_token(self):
+        """请求 token 接口，返回 (access_token, expires_in)。由 token_manager 在需要刷新时调用。"""
+
+    def _ensure_token(self, force_refresh: bool = False) -> str:
+        token = token_manager.get_token(self._token_key, self._fetch_access_token, force_refresh=force_refresh)
+        self.session.params['access_token'] = token
+        return token
+
+    def refresh_token(self) -> None:
+        """确认 token 新鲜，即将过期时提前刷新。常驻模式定期调用，发布时无需等待 /token 请求。"""
+        self._ensure_token()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送带 access_token 的请求；遇到 40001/42001 等 token 失效错误时刷新 token 并重试一次。"""
+        token = self._ensure_token()
+        kwargs.setdefault('timeout', request_timeout(REQUEST_TIMEOUT))
+        response = self.session.request(method, resolve_url(url), **kwargs)
+        run_metrics.record_transfer(self.SERVICE, response)
+        try:
+            errcode = response.json().get('errcode', 0)
+        except (ValueError, AttributeError):
+            return response
+        if errcode not in TOKEN_INVALID_ERRCODES:
+            return response
+
+        logger.warning(f"access_token 已失效 (errcode: {errcode})，刷新后重试一次。")
+        token_manager.invalidate(self._token_key, token)
+        self._ensure_token()
+        kwargs['timeout'] = request_timeout(REQUEST_TIMEOUT)
+        # multipart 上传的文件对象已被读完，重试前需要回到开头
+        for file_spec in (kwargs.get('files') or {}).values():
+            file_obj = file_spec[1] if isinstance(file_spec, tuple) else file_spec
+            if hasattr(file_obj, 'seek'):
+                file_obj.seek(0)
+        response = self.session.request(method, resolve_url(url), **kwargs)
+        run_metrics.record_transfer(self.SERVICE, response)
+        return response
 
-class WeChatMPClient:
+
+class WeChatMPClient(_TokenSessionMixin):
     """
     一个用于与微信公众号API交互的客户端类。
     封装了获取access_token、上传素材、创建和发布草稿等常用功能。
     """
     BASE_URL = "https://api.weixin.qq.com/cgi-bin"
+    SERVICE = "wechat_mp"
 
     def __init__(self):
         appid = global_config.get("wechat_mp", "appid")
         secret = global_config.get("wechat_mp", "appsecret")
-        self.session = requests.Session()
-        self._refresh_access_token(appid, secret)
-
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
-    def _refresh_access_token(self, appid: str, secret: str):
-        """获取或刷新 access_token。"""
+        self._appid = appid
+        self._secret = secret
+        self._token_key = f"wechat_mp:{appid}"
+        # 连接池按服务复用；token 记在会话的默认参数上，同一服务的客户端共用
+        self.session = client_pool.session(self.SERVICE)
+        self._ensure_token()
+
+    @WECHAT_TOKEN_POLICY
+    def _fetch_access_token(self):
+        """请求 access_token 接口，返回 (access_token, expires_in)。由 token_manager 在需要刷新时调用。"""
         url = f"{self.BASE_URL}/token"
-        params = {'grant_type': 'client_credential', 'appid': appid, 'secret': secret}
+        params = {'grant_type': 'client_credential', 'appid': self._appid, 'secret': self._secret}
         try:
-            response = self.session.get(url, params=params)
+            response = requests.get(resolve_url(url), params=params, timeout=request_timeout(TOKEN_REQUEST_TIMEOUT))
+            run_metrics.record_transfer(self.SERVICE, response)
             data = self._handle_response(response)
-            self.session.params['access_token'] = data['access_token']
             logger.debug("公众号 access_token 获取成功。")
+            return data['access_token'], data.get('expires_in', 7200)
         except Exception as e:
             logger.error(f"公众号 access_token 获取失败: {e}")
             raise
@@ -53,7 +161,7 @@ class WeChatMPClient:
             if data.get('errcode', 0) != 0:
                 error_msg = f"[公众号API错误] {data.get('errmsg', '未知错误')} (errcode: {data.get('errcode')})"
                 logger.error(error_msg)
-                raise ValueError(error_msg)
+                raise _api_error(error_msg, data)
             return data
         except requests.exceptions.RequestException as e:
             logger.error(f"公众号API请求失败: {e}")
@@ -61,20 +169,14 @@ class WeChatMPClient:
         except json.JSONDecodeError as e:
             logger.error(f"公众号API响应JSON解析失败: {e}, 响应内容: {response.text}")
             raise
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
-    def upload_image(self, image_file_path: str) -> str:
-        """上传永久图片素材。"""
+    @WECHAT_MP_UPLOAD_POLICY
+    def _upload_material(self, filename: str, image_data: ImageSource, content_type: str) -> str:
+        """上传永久图片素材到素材库。"""
         url = f"{self.BASE_URL}/material/add_material"
         try:
-            with open(image_file_path, 'rb') as file:
-                files = {'media': file}
-                params = {'type': 'image'}
-                response = self.session.post(url, params=params, files=files)
+            files = {'media': (filename, io.BytesIO(image_data), content_type)}
+            params = {'type': 'image'}
+            response = self._request('POST', url, params=params, files=files)
             data = self._handle_response(response)
             logger.debug(f"公众号图片上传成功: {json.dumps(data, ensure_ascii=False, indent=2)}")
             return data['media_id']
@@ -82,12 +184,24 @@ class WeChatMPClient:
             logger.error(f"公众号图片上传失败: {e}")
             raise
 
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
+    def upload_image(self, image: ImageSource, filename: str = None, use_ledger: bool = True) -> str:
+        """
+        上传永久图片素材。image 可以是文件路径，也可以是内存中的图片数据。
+        相同内容的图片已上传过时，直接复用 media ID 账本中的 media_id，不再重复上传。
+        """
+        filename, data, content_type = _read_media(image, filename)
+        digest = content_hash(data)
+        ledger_platform = f"wechat_mp:{self._appid}"
+        if use_ledger:
+            media_id = media_ledger.get(ledger_platform, digest)
+            if media_id:
+                logger.info(f"公众号图片已上传过，复用 media_id: {media_id}")
+                return media_id
+        media_id = self._upload_material(filename, data, content_type)
+        media_ledger.record(ledger_platform, digest, media_id)
+        return media_id
+
+    @WECHAT_MP_DRAFT_POLICY
     def create_draft(self, title: str, content: str, thumb_media_id: str, **kwargs) -> str:
         """创建草稿。"""
         url = f"{self.BASE_URL}/draft/add"
@@ -107,7 +221,7 @@ class WeChatMPClient:
             # 此段代码是处理中文编码,请务删除
             payload = json.dumps(draft_data, ensure_ascii=False).encode('utf-8')
             headers = {'Content-Type': 'application/json'}
-            response = self.session.post(url, data=payload, headers=headers)
+            response = self._request('POST', url, data=payload, headers=headers)
 
             data = self._handle_response(response)
             logger.debug(f"公众号草稿创建成功: {json.dumps(data, ensure_ascii=False, indent=2)}")
@@ -117,41 +231,39 @@ class WeChatMPClient:
             raise
 
 
-class WeChatWorkClient:
+class WeChatWorkClient(_TokenSessionMixin):
     """
     企业微信机器人消息发送客户端。
     """
     BASE_URL = "https://qyapi.weixin.qq.com/cgi-bin"
+    SERVICE = "wechat_work"
 
     def __init__(self):
         self._id = global_config.get('work_wx', 'id')
         self._secret = global_config.get('work_wx', 'secret')
         self._agentid = global_config.get('work_wx', 'agentid')
         self.touser = global_config.get('work_wx', 'touser', strip_quote=False) # Keep quotes for @all
-        self.session = requests.Session()
-        self._refresh_access_token()
-
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
-    def _refresh_access_token(self):
-        """获取或刷新 access_token。"""
+        self._token_key = f"wechat_work:{self._id}:{self._agentid}"
+        # 连接池按服务复用；token 记在会话的默认参数上，同一服务的客户端共用
+        self.session = client_pool.session(self.SERVICE)
+        self._ensure_token()
+
+    @WECHAT_TOKEN_POLICY
+    def _fetch_access_token(self):
+        """请求 access_token 接口，返回 (access_token, expires_in)。由 token_manager 在需要刷新时调用。"""
         url = f"{self.BASE_URL}/gettoken"
         params = {'corpid': self._id, 'corpsecret': self._secret}
         try:
-            # 增加超时时间，例如10秒
-            response = self.session.get(url, params=params, timeout=10)
+            response = requests.get(resolve_url(url), params=params, timeout=request_timeout(TOKEN_REQUEST_TIMEOUT))
+            run_metrics.record_transfer(self.SERVICE, response)
             response.raise_for_status()
             data = response.json()
             if data.get('errcode', 0) != 0:
-                error_msg = f"[企业微信API错误] {data.get('errmsg', '未知错误')}"
+                error_msg = f"[企业微信API错误] {data.get('errmsg', '未知错误')} (errcode: {data.get('errcode')})"
                 logger.error(error_msg)
-                raise ValueError(error_msg)
-            self.session.params['access_token'] = data['access_token']
+                raise _api_error(error_msg, data)
             logger.debug("企业微信 access_token 获取成功。")
+            return data['access_token'], data.get('expires_in', 7200)
         except requests.exceptions.RequestException as e:
             logger.error(f"企业微信 access_token 获取失败: {e}")
             raise
@@ -159,47 +271,44 @@ class WeChatWorkClient:
             logger.error(f"企业微信 access_token 响应JSON解析失败: {e}, 响应内容: {response.text}")
             raise
     
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
-    def _media_upload(self, image_path: str, media_type: str = 'image') -> str:
-        """上传文件到企业微信临时文件。"""
+    @WECHAT_WORK_MEDIA_POLICY
+    def _media_upload(self, image: ImageSource, media_type: str = 'image', filename: str = None) -> str:
+        """上传文件到企业微信临时文件。image 可以是文件路径，也可以是内存中的图片数据。"""
         url = f"{self.BASE_URL}/media/upload"
         try:
-            with open(image_path, 'rb') as f:
-                files = {'media': (image_path, f, f'{media_type}/jpeg')}
-                response = self.session.post(url, params={'type': media_type}, files=files)
+            filename, data, content_type = _read_media(image, filename)
+            files = {'media': (filename, io.BytesIO(data), content_type)}
+            response = self._request('POST', url, params={'type': media_type}, files=files)
             response.raise_for_status()
             data = response.json()
             if data.get('errcode', 0) != 0:
-                error_msg = f"[企业微信媒体上传错误] {data.get('errmsg', '未知错误')}"
+                error_msg = f"[企业微信媒体上传错误] {data.get('errmsg', '未知错误')} (errcode: {data.get('errcode')})"
                 logger.error(error_msg)
-                raise ValueError(error_msg)
+                raise _api_error(error_msg, data)
             logger.debug(f"企业微信媒体上传成功，media_id: {data['media_id']}")
             return data['media_id']
         except Exception as e:
             logger.error(f"企业微信媒体上传失败: {e}")
             raise
     
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
-    def upload_temp_image(self, image_file_path: str) -> str:
-        """上传临时图片素材，用于图文消息的封面。"""
-        return self._media_upload(image_file_path, media_type='image')
-
-    @retry(
-        stop=stop_after_attempt(3),  # 最多重试3次
-        wait=wait_exponential(multiplier=1, min=2, max=10),  # 指数退避等待策略
-        retry=retry_if_exception_type(requests.exceptions.RequestException),  # 仅在网络连接等错误时重试
-        reraise=True  # 重试失败后，重新抛出最后的异常
-    )
+    def upload_temp_image(self, image: ImageSource, filename: str = None, use_ledger: bool = True) -> str:
+        """
+        上传临时图片素材，用于图文消息的封面。image 可以是文件路径，也可以是内存中的图片数据。
+        临时素材有效期为 3 天，有效期内的相同图片直接复用 media ID 账本中的 media_id。
+        """
+        filename, data, content_type = _read_media(image, filename)
+        digest = content_hash(data)
+        ledger_platform = f"wechat_work:{self._id}"
+        if use_ledger:
+            media_id = media_ledger.get(ledger_platform, digest)
+            if media_id:
+                logger.info(f"企业微信图片在有效期内已上传过，复用 media_id: {media_id}")
+                return media_id
+        media_id = self._media_upload(data, media_type='image', filename=filename)
+        media_ledger.record(ledger_platform, digest, media_id, ttl=WORK_TEMP_MEDIA_TTL)
+        return media_id
+
+    @WECHAT_WORK_SEND_POLICY
     def send_mpnews(self, title: str, content: str, thumb_media_id: str, **kwargs):
         """发送图文消息。"""
         url = f"{self.BASE_URL}/message/send"
@@ -217,13 +326,13 @@ class WeChatWorkClient:
             "safe": 0
         }
         try:
-            response = self.session.post(url, json=payload)
+            response = self._request('POST', url, json=payload)
             response.raise_for_status()
             data = response.json()
             if data.get('errcode', 0) != 0:
-                error_msg = f"[企业微信发送错误] {data.get('errmsg', '未知错误')}"
+                error_msg = f"[企业微信发送错误] {data.get('errmsg', '未知错误')} (errcode: {data.get('errcode')})"
                 logger.error(error_msg)
-                raise ValueError(error_msg)
+                raise _api_error(error_msg, data)
             logger.debug("企业微信图文消息发送成功。")
         except Exception as e:
             logger.error(f"企业微信图文消息发送失败: {e}")
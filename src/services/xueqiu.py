@@ -1,8 +1,99 @@
+import asyncio
+import base64
+import json
+import time
 import requests
+import httpx
 import logging
+from typing import Any, Dict, Optional
+
+from src.utils.retry_policy import XUEQIU_READ_POLICY, XUEQIU_WRITE_POLICY, RETRYABLE_STATUS_CODES
+from src.utils.deadline import request_timeout, httpx_timeout
+from src.config import resolve_url
+from src.utils.metrics import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# 同步发布每个请求的超时 (秒)
+REQUEST_TIMEOUT = 20
+# 异步发布使用的超时与连接池配置
+ASYNC_REQUEST_TIMEOUT = httpx.Timeout(20.0, connect=10.0)
+ASYNC_POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5)
+# cookie 剩余有效期不足该秒数时视为已过期，避免发布途中失效
+COOKIE_EXPIRY_MARGIN_SECONDS = 60
+# 各步骤使用的重试策略：草稿与发帖有副作用，只在请求确定未发出时重试
+STEP_RETRY_POLICIES = {
+    "save_draft": XUEQIU_WRITE_POLICY,
+    "check_text": XUEQIU_READ_POLICY,
+    "session_token": XUEQIU_READ_POLICY,
+    "publish": XUEQIU_WRITE_POLICY,
+}
+
+
+class XueqiuPublishError(Exception):
+    """雪球发布失败。step 为失败的步骤名称，data 为接口返回的原始内容 (如有)。"""
+
+    def __init__(self, step: str, message: str, data: Any = None):
+        super().__init__(f"[雪球:{step}] {message}")
+        self.step = step
+        self.message = message
+        self.data = data
+
+
+class XueqiuAuthError(XueqiuPublishError):
+    """雪球 cookie 缺失、过期或被服务端拒绝。"""
+
+
+def _cookie_value(cookie: str, name: str) -> Optional[str]:
+    for part in cookie.split(';'):
+        key, _, value = part.strip().partition('=')
+        if key == name:
+            return value
+    return None
+
+
+def cookie_expires_at(cookie: str) -> Optional[float]:
+    """从 cookie 中 xq_id_token (JWT) 的 exp 字段解析过期时间 (Unix 时间戳)；无法解析时返回 None。"""
+    id_token = _cookie_value(cookie, 'xq_id_token')
+    if not id_token or id_token.count('.') != 2:
+        return None
+    try:
+        payload_segment = id_token.split('.')[1]
+        payload_segment += '=' * (-len(payload_segment) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(payload_segment))
+        return float(payload['exp'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def check_cookie(cookie: str) -> None:
+    """在发出任何请求之前检查 cookie 是否可用，不可用时抛出 XueqiuAuthError。"""
+    if not cookie or not _cookie_value(cookie, 'xq_a_token'):
+        raise XueqiuAuthError("cookie", "Cookie 缺少 xq_a_token，请重新登录后更新 XUEQIU_COOKIE。")
+    expires_at = cookie_expires_at(cookie)
+    if expires_at is not None and expires_at - time.time() < COOKIE_EXPIRY_MARGIN_SECONDS:
+        expired = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(expires_at))
+        raise XueqiuAuthError("cookie", f"Cookie 已于 {expired} 过期，请重新登录后更新 XUEQIU_COOKIE。")
+
+
+def _build_headers(cookie: str) -> Dict[str, str]:
+    """构建雪球接口通用的请求头。"""
+    return {
+        "Accept": "application/json, text/plain, */*",
+        "Accept-Encoding": "gzip, deflate, br, zstd",
+        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+        "Connection": "keep-alive",
+        "DNT": "1",
+        "Host": "mp.xueqiu.com",
+        "Origin": "https://mp.xueqiu.com",
+        "Referer": "https://mp.xueqiu.com/writeV2/?position=pc_creator_post",
+        "Sec-Fetch-Dest": "empty",
+        "Sec-Fetch-Mode": "cors",
+        "Sec-Fetch-Site": "same-origin",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
+        "Cookie": cookie
+    }
 
-# --- 日志配置 ---
-logging.basicConfig(level=logging.info, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class XueqiuPublisher:
     """
@@ -28,7 +119,7 @@ class XueqiuPublisher:
         if not cookie:
             raise ValueError("Cookie 不能为空")
         # cookie = self.XUEQIU_COOKIE
-        # logging.warning("请在 if __name__ == '__main__': 代码块中设置 XUEQIU_COOKIE 变量。")
+        # logger.warning("请在 if __name__ == '__main__': 代码块中设置 XUEQIU_COOKIE 变量。")
 
         self.title = title
         self.content = content
@@ -37,21 +128,7 @@ class XueqiuPublisher:
         self.session_token = None
 
         # 设置通用的请求头
-        self.base_headers = {
-            "Accept": "application/json, text/plain, */*",
-            "Accept-Encoding": "gzip, deflate, br, zstd",
-            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "Connection": "keep-alive",
-            "DNT": "1",
-            "Host": "mp.xueqiu.com",
-            "Origin": "https://mp.xueqiu.com",
-            "Referer": "https://mp.xueqiu.com/writeV2/?position=pc_creator_post",
-            "Sec-Fetch-Dest": "empty",
-            "Sec-Fetch-Mode": "cors",
-            "Sec-Fetch-Site": "same-origin",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
-            "Cookie": cookie
-        }
+        self.base_headers = _build_headers(cookie)
         self.post_headers = self.base_headers.copy()
         self.post_headers["Content-Type"] = "application/x-www-form-urlencoded"
 
@@ -68,17 +145,18 @@ class XueqiuPublisher:
             "is_private": "false",
         }
         try:
-            response = self.session.post(self.SAVE_DRAFT_URL, headers=self.post_headers, data=payload)
+            response = self.session.post(resolve_url(self.SAVE_DRAFT_URL), headers=self.post_headers, data=payload, timeout=request_timeout(REQUEST_TIMEOUT))
+            run_metrics.record_transfer("xueqiu", response)
             response.raise_for_status()
             data = response.json()
             self.draft_id = data.get("id")
             if self.draft_id:
-                logging.debug(f"保存草稿成功，Draft ID: {self.draft_id}")
+                logger.debug(f"保存草稿成功，Draft ID: {self.draft_id}")
                 return True
-            logging.error(f"保存草稿失败: {data}")
+            logger.error(f"保存草稿失败: {data}")
             return False
         except requests.RequestException as e:
-            logging.error(f"保存草稿时发生网络错误: {e}")
+            logger.error(f"保存草稿时发生网络错误: {e}")
             return False
 
     def _check_text(self) -> bool:
@@ -89,32 +167,34 @@ class XueqiuPublisher:
             "type": "0",
         }
         try:
-            response = self.session.post(self.TEXT_CHECK_URL, headers=self.post_headers, data=payload)
+            response = self.session.post(resolve_url(self.TEXT_CHECK_URL), headers=self.post_headers, data=payload, timeout=request_timeout(REQUEST_TIMEOUT))
+            run_metrics.record_transfer("xueqiu", response)
             response.raise_for_status()
             data = response.json()
             if data.get("success") is True:
-                logging.debug("文本内容检查通过。")
+                logger.debug("文本内容检查通过。")
                 return True
-            logging.error(f"文本内容检查失败: {data}")
+            logger.error(f"文本内容检查失败: {data}")
             return False
         except requests.RequestException as e:
-            logging.error(f"文本检查时发生网络错误: {e}")
+            logger.error(f"文本检查时发生网络错误: {e}")
             return False
 
     def _get_session_token(self) -> bool:
         """第三步：获取用于发布的 session_token。"""
         try:
-            response = self.session.get(self.SESSION_TOKEN_URL, headers=self.base_headers)
+            response = self.session.get(resolve_url(self.SESSION_TOKEN_URL), headers=self.base_headers, timeout=request_timeout(REQUEST_TIMEOUT))
+            run_metrics.record_transfer("xueqiu", response)
             response.raise_for_status()
             data = response.json()
             self.session_token = data.get("session_token")
             if self.session_token:
-                logging.debug(f"获取 Session Token 成功: {self.session_token}")
+                logger.debug(f"获取 Session Token 成功: {self.session_token}")
                 return True
-            logging.error(f"获取 Session Token 失败: {data}")
+            logger.error(f"获取 Session Token 失败: {data}")
             return False
         except requests.RequestException as e:
-            logging.error(f"获取 Session Token 时发生网络错误: {e}")
+            logger.error(f"获取 Session Token 时发生网络错误: {e}")
             return False
 
     def _publish_post(self):
@@ -137,26 +217,176 @@ class XueqiuPublisher:
             "session_token": self.session_token,
         }
         try:
-            response = self.session.post(self.PUBLISH_URL, headers=self.post_headers, data=payload)
+            response = self.session.post(resolve_url(self.PUBLISH_URL), headers=self.post_headers, data=payload, timeout=request_timeout(REQUEST_TIMEOUT))
+            run_metrics.record_transfer("xueqiu", response)
             response.raise_for_status()
             data = response.json()
             if data.get("error_code"):
-                logging.error(f"发布失败: {data.get('error_description')}")
+                logger.error(f"发布失败: {data.get('error_description')}")
             else:
                 post_id = data.get("id")
-                logging.debug(f"文章发布成功！Post ID: {post_id}")
+                logger.debug(f"文章发布成功！Post ID: {post_id}")
+                return post_id
         except requests.RequestException as e:
-            logging.error(f"发布文章时发生网络错误: {e}")
+            logger.error(f"发布文章时发生网络错误: {e}")
+        return None
 
     def publish(self):
-        """执行完整的发布流程。"""
+        """执行完整的发布流程，成功时返回文章的 Post ID，失败时返回 None。"""
         if self._save_draft() and self._check_text() and self._get_session_token():
-            self._publish_post()
+            return self._publish_post()
         else:
-            logging.error("发布流程中止，请检查之前的错误信息。")
+            logger.error("发布流程中止，请检查之前的错误信息。")
+        return None
+
+
+class AsyncXueqiuPublisher:
+    """
+    异步版本的雪球发布器。
+
+    与 XueqiuPublisher 的四步流程相同，但保存草稿、文本检查、获取 session_token 三步互不依赖，
+    会在同一个连接池上并发执行，只有最后的发布需要等待草稿 ID 与 session_token。
+    每一步失败都会抛出带有步骤名称的 XueqiuPublishError；cookie 过期会在发出请求前被检测出来。
+    """
+
+    def __init__(self, cookie: str, title: str, content: str, client: httpx.AsyncClient = None):
+        """
+        Args:
+            cookie (str): 雪球用户登录后的 cookie。
+            title (str): 文章标题。
+            content (str): 文章内容 (HTML 或 Markdown)。
+            client (httpx.AsyncClient): 可选的共享连接池；不传入时在 publish() 期间临时创建。
+        """
+        if not cookie:
+            raise ValueError("Cookie 不能为空")
+        self.cookie = cookie
+        self.title = title
+        self.content = content
+        self.client = client
+        self.base_headers = _build_headers(cookie)
+        # httpx 默认不解码 br/zstd，只声明它确定能处理的压缩格式
+        self.base_headers["Accept-Encoding"] = "gzip, deflate"
+        self.post_headers = self.base_headers.copy()
+        self.post_headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+    @staticmethod
+    async def _send(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+        """发送一次请求；可重试的状态码 (429/5xx) 抛出异常交给重试策略处理。"""
+        # 每次尝试都按当前截止时间收紧超时
+        response = await client.request(method, resolve_url(url), timeout=httpx_timeout(ASYNC_REQUEST_TIMEOUT), **kwargs)
+        run_metrics.record_transfer("xueqiu", response)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            response.raise_for_status()
+        return response
+
+    async def _request_json(self, client: httpx.AsyncClient, step: str, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """发送请求并解析 JSON；把网络错误、鉴权失败和非法响应统一转换为 XueqiuPublishError。"""
+        policy = STEP_RETRY_POLICIES.get(step, XUEQIU_READ_POLICY)
+        try:
+            response = await policy.run_async(self._send, client, method, url, **kwargs)
+        except httpx.TimeoutException as e:
+            raise XueqiuPublishError(step, f"请求超时: {e!r}") from e
+        except httpx.RequestError as e:
+            raise XueqiuPublishError(step, f"网络错误: {e!r}") from e
+        except httpx.HTTPStatusError as e:
+            raise XueqiuPublishError(step, f"HTTP {e.response.status_code}", e.response.text) from e
+        if response.status_code in (401, 403):
+            raise XueqiuAuthError(step, f"鉴权失败 (HTTP {response.status_code})，cookie 可能已失效。", response.text)
+        try:
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise XueqiuPublishError(step, f"HTTP {response.status_code}", response.text) from e
+        except ValueError as e:
+            raise XueqiuPublishError(step, "响应不是合法的 JSON", response.text) from e
+
+    async def _save_draft(self, client: httpx.AsyncClient) -> str:
+        """保存草稿并返回 draft_id。"""
+        payload = {
+            "id": "",
+            "text": self.content,
+            "title": self.title,
+            "cover_pic": "",
+            "flags": "false",
+            "original_event": "",
+            "legal_user_visible": "false",
+            "is_private": "false",
+        }
+        data = await self._request_json(client, "save_draft", "POST", XueqiuPublisher.SAVE_DRAFT_URL,
+                                        headers=self.post_headers, data=payload)
+        draft_id = data.get("id")
+        if not draft_id:
+            raise XueqiuPublishError("save_draft", "未返回草稿 ID", data)
+        logger.debug(f"保存草稿成功，Draft ID: {draft_id}")
+        return draft_id
+
+    async def _check_text(self, client: httpx.AsyncClient) -> None:
+        """对文章内容进行检查。"""
+        payload = {"text": self.content, "title": self.title, "type": "0"}
+        data = await self._request_json(client, "check_text", "POST", XueqiuPublisher.TEXT_CHECK_URL,
+                                        headers=self.post_headers, data=payload)
+        if data.get("success") is not True:
+            raise XueqiuPublishError("check_text", "文本内容检查未通过", data)
+        logger.debug("文本内容检查通过。")
+
+    async def _get_session_token(self, client: httpx.AsyncClient) -> str:
+        """获取用于发布的 session_token。"""
+        data = await self._request_json(client, "session_token", "GET", XueqiuPublisher.SESSION_TOKEN_URL,
+                                        headers=self.base_headers)
+        session_token = data.get("session_token")
+        if not session_token:
+            raise XueqiuPublishError("session_token", "未返回 session_token", data)
+        return session_token
+
+    async def _publish_post(self, client: httpx.AsyncClient, draft_id: str, session_token: str) -> str:
+        """使用 draft_id 和 session_token 发布文章，返回 Post ID。"""
+        payload = {
+            "title": self.title,
+            "status": self.content,
+            "cover_pic": "",
+            "show_cover_pic": "false",
+            "original": "false",
+            "industry_category_name": "",
+            "original_event_id": "",
+            "original_event_active": "true",
+            "legal_user_visible": "false",
+            "is_private": "false",
+            "legal_user_state": "open",
+            "post_position": "pc_creator_post",
+            "draft_id": draft_id,
+            "allow_reward": "false",
+            "session_token": session_token,
+        }
+        data = await self._request_json(client, "publish", "POST", XueqiuPublisher.PUBLISH_URL,
+                                        headers=self.post_headers, data=payload)
+        if data.get("error_code"):
+            raise XueqiuPublishError("publish", data.get("error_description") or str(data.get("error_code")), data)
+        post_id = data.get("id")
+        if not post_id:
+            raise XueqiuPublishError("publish", "未返回 Post ID", data)
+        logger.debug(f"文章发布成功！Post ID: {post_id}")
+        return post_id
+
+    async def _publish_with(self, client: httpx.AsyncClient) -> str:
+        draft_id, _, session_token = await asyncio.gather(
+            self._save_draft(client),
+            self._check_text(client),
+            self._get_session_token(client),
+        )
+        return await self._publish_post(client, draft_id, session_token)
+
+    async def publish(self) -> str:
+        """执行完整的发布流程，返回文章的 Post ID；任一步骤失败时抛出 XueqiuPublishError。"""
+        check_cookie(self.cookie)
+        if self.client is not None:
+            return await self._publish_with(self.client)
+        async with httpx.AsyncClient(timeout=ASYNC_REQUEST_TIMEOUT, limits=ASYNC_POOL_LIMITS) as client:
+            return await self._publish_with(client)
 
 
 if __name__ == '__main__':
+    from src.utils.logger import set_logger
+    set_logger()
     # 请在这里填入您自己的 Cookie
     # # 如何获取 Cookie:
     # 1. 登录雪球 (xueqiu.com)
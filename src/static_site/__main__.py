@@ -0,0 +1,23 @@
+import argparse
+
+from src.static_site.generator import SiteGenerator
+from src.utils.logger import set_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从历史归档增量生成静态站点与 RSS/Atom 订阅源。")
+    parser.add_argument("--output-dir", default=None, help="输出目录，默认使用 [StaticSite] output_dir (留空为 data/site)")
+    parser.add_argument("--full", action="store_true", help="忽略记录的源哈希，重新生成所有页面")
+    args = parser.parse_args()
+
+    set_logger()
+    result = SiteGenerator(output_dir=args.output_dir).build(full=args.full)
+    for relpath in result["rendered"]:
+        print(f"    生成: {relpath}")
+    for relpath in result["removed"]:
+        print(f"    删除: {relpath}")
+    print(f">>> 重新生成 {len(result['rendered'])} 个页面，{result['unchanged']} 个未变化，删除 {len(result['removed'])} 个。")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+import datetime
+import email.utils
+import hashlib
+import html
+import json
+import logging
+import os
+from string import Template
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.config import STATIC_SITE_CONFIG
+from src.utils.json_store import STATE_DIR, load_json, dump_json_atomic, write_text_atomic
+from src.utils.news_archive import NewsArchive, news_archive
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+SITE_DIR = os.path.join(STATE_DIR, 'site')
+# 记录每个页面的源哈希与每天归档的摘要，放在输出目录中
+MANIFEST_NAME = ".manifest.json"
+# 模板或页面结构变化时递增，所有页面的源哈希随之变化而重新生成
+TEMPLATE_VERSION = 1
+TIMEZONE = ZoneInfo("Asia/Shanghai")
+# 首页与月份页的每条摘要中列出的新闻标题数
+SUMMARY_TITLES = 5
+# 站点文件由静态服务器读取
+PAGE_FILE_MODE = 0o644
+
+PAGE_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$title</title>
+<link rel="alternate" type="application/rss+xml" title="$site_title (RSS)" href="$root/feed.xml">
+<link rel="alternate" type="application/atom+xml" title="$site_title (Atom)" href="$root/atom.xml">
+<style>body{max-width:760px;margin:0 auto;padding:1em;font-family:sans-serif;line-height:1.7}nav{margin:1em 0}nav a{margin-right:1em}</style>
+</head>
+<body>
+<header><h1><a href="$root/index.html">$site_title</a></h1></header>
+<main>
+$body
+</main>
+</body>
+</html>
+""")
+
+RSS_TEMPLATE = Template("""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0">
+<channel>
+<title>$title</title>
+<link>$link</link>
+<description>$title</description>
+<language>zh-cn</language>
+<lastBuildDate>$updated</lastBuildDate>
+$items
+</channel>
+</rss>
+""")
+
+ATOM_TEMPLATE = Template("""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>$title</title>
+<id>$id</id>
+<link href="$link"/>
+<link rel="self" href="$self_link"/>
+<updated>$updated</updated>
+$entries
+</feed>
+""")
+
+
+def _episode_hash(episode: Dict[str, Any]) -> str:
+    """只对页面用到的字段取哈希：发布时间、标签等变化不会触发重新生成。"""
+    items = [(item.get("title"), item.get("url")) for item in episode.get("items", [])]
+    source = [episode.get("news_date"), episode.get("fetch_timestamp"), items, episode.get("analysis")]
+    return hashlib.sha256(json.dumps(source, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _episode_time(meta: Dict[str, Any]) -> datetime.datetime:
+    """条目的时间：抓取时间，缺失时取新闻日期当晚 19:30。"""
+    if meta.get("fetch_timestamp"):
+        try:
+            return datetime.datetime.fromisoformat(meta["fetch_timestamp"])
+        except ValueError:
+            pass
+    return datetime.datetime.fromisoformat(meta["news_date"]).replace(hour=19, minute=30, tzinfo=TIMEZONE)
+
+
+class SiteGenerator:
+    """
+    从历史归档 (data/archive) 生成静态站点：
+        days/YYYY-MM-DD.html   每天的解读
+        months/YYYY-MM.html    按月的目录
+        index.html             最近的若干天与所有月份
+        feed.xml / atom.xml    RSS 2.0 与 Atom 订阅源
+
+    增量生成：manifest 中记录每个页面的源哈希，只重新生成源哈希变化的页面。每天的摘要
+    (标题、条目数等) 按归档文件的 (修改时间, 大小) 缓存在 manifest 中，未变化的归档不会重新读取。
+    新增一天只需重新生成当天、前一天 (导航链接)、当月、首页与订阅源，与归档的总天数无关。
+    所有文件都原子写入，站点随时可以被静态服务器直接读取。
+    """
+
+    def __init__(self, archive: NewsArchive = news_archive, output_dir: str = None, settings: Dict[str, Any] = None):
+        self.archive = archive
+        self.settings = dict(settings or STATIC_SITE_CONFIG)
+        self.output_dir = output_dir or self.settings.get("output_dir") or SITE_DIR
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        # 站点标题、地址等变化会影响所有页面，计入每个页面的源哈希
+        self._salt = [TEMPLATE_VERSION, self.settings.get("title"), self.settings.get("site_url")]
+
+    def _source_hash(self, *parts: Any) -> str:
+        data = json.dumps([self._salt, parts], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def _url(self, relpath: str) -> str:
+        """订阅源中使用的链接：配置了 site_url 时为绝对地址。"""
+        site_url = self.settings.get("site_url", "")
+        return f"{site_url}/{relpath}" if site_url else relpath
+
+    # --- 每天的摘要 ---
+
+    def _refresh_episodes(self, cached: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """返回 {日期: 摘要}，只重新读取版本号变化的归档。没有 AI 分析的日期不出现在站点中。"""
+        episodes = {}
+        for news_date in self.archive.dates():
+            version = self.archive.version(news_date)
+            if version is None:
+                continue
+            meta = cached.get(news_date)
+            if meta is None or meta.get("version") != list(version):
+                episode = self.archive.load(news_date)
+                if not episode:
+                    continue
+                items = episode.get("items", [])
+                meta = {
+                    "version": list(version),
+                    "news_date": news_date,
+                    "hash": _episode_hash(episode),
+                    "fetch_timestamp": episode.get("fetch_timestamp"),
+                    "has_analysis": bool(episode.get("analysis")),
+                    "item_count": len(items),
+                    "titles": [item.get("title", "") for item in items[:SUMMARY_TITLES]],
+                }
+            episodes[news_date] = meta
+        return episodes
+
+    # --- 渲染 ---
+
+    def _page(self, title: str, body: str, root: str) -> str:
+        return PAGE_TEMPLATE.substitute(title=html.escape(title), site_title=html.escape(self.settings["title"]),
+                                        root=root, body=body)
+
+    def _summary_html(self, meta: Dict[str, Any], root: str) -> str:
+        titles = "、".join(html.escape(title) for title in meta["titles"])
+        more = " 等" if meta["item_count"] > len(meta["titles"]) else ""
+        return (f'<li><a href="{root}/days/{meta["news_date"]}.html">{meta["news_date"]} 新闻联播解读</a>'
+                f'<br><small>{titles}{more} (共 {meta["item_count"]} 条)</small></li>')
+
+    def _render_day(self, news_date: str, previous: Optional[str], following: Optional[str]) -> str:
+        # markdown 只在确实需要生成页面时导入
+        from src.utils.html_renderer import render_analysis_html
+        episode = self.archive.load(news_date) or {}
+        nav = []
+        if previous:
+            nav.append(f'<a href="{previous}.html">&larr; {previous}</a>')
+        nav.append(f'<a href="../months/{news_date[:7]}.html">{news_date[:7]}</a>')
+        if following:
+            nav.append(f'<a href="{following}.html">{following} &rarr;</a>')
+        items = "".join(
+            f'<li><a href="{html.escape(item["url"])}">{html.escape(item.get("title", ""))}</a></li>' if item.get("url")
+            else f'<li>{html.escape(item.get("title", ""))}</li>'
+            for item in episode.get("items", []))
+        body = (f'<article><h2>{news_date} 新闻联播解读</h2>{render_analysis_html(episode.get("analysis") or "")}</article>'
+                f'<section><h3>新闻条目</h3><ul>{items}</ul></section><nav>{"".join(nav)}</nav>')
+        return self._page(f"{news_date} 新闻联播解读", body, "..")
+
+    def _render_month(self, month: str, metas: List[Dict[str, Any]]) -> str:
+        entries = "".join(self._summary_html(meta, "..") for meta in reversed(metas))
+        return self._page(f"{month} 新闻联播解读", f"<h2>{month}</h2><ul>{entries}</ul>", "..")
+
+    def _render_index(self, latest: List[Dict[str, Any]], months: List[str]) -> str:
+        entries = "".join(self._summary_html(meta, ".") for meta in latest)
+        month_links = "".join(f'<li><a href="./months/{month}.html">{month}</a></li>' for month in reversed(months))
+        body = f"<h2>最近更新</h2><ul>{entries}</ul><h2>按月浏览</h2><ul>{month_links}</ul>"
+        return self._page(self.settings["title"], body, ".")
+
+    def _feed_entries(self, latest: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+        from src.utils.html_renderer import render_analysis_html
+        entries = []
+        for meta in latest:
+            episode = self.archive.load(meta["news_date"]) or {}
+            entries.append((meta, render_analysis_html(episode.get("analysis") or "")))
+        return entries
+
+    def _render_rss(self, latest: List[Dict[str, Any]]) -> str:
+        items = []
+        for meta, content in self._feed_entries(latest):
+            link = html.escape(self._url(f"days/{meta['news_date']}.html"))
+            items.append(
+                f"<item><title>{meta['news_date']} 新闻联播解读</title><link>{link}</link>"
+                f"<guid isPermaLink=\"{'true' if self.settings.get('site_url') else 'false'}\">{link}</guid>"
+                f"<pubDate>{email.utils.format_datetime(_episode_time(meta))}</pubDate>"
+                f"<description>{html.escape(content)}</description></item>")
+        updated = _episode_time(latest[0]) if latest else datetime.datetime.now(TIMEZONE)
+        return RSS_TEMPLATE.substitute(title=html.escape(self.settings["title"]), link=html.escape(self._url("index.html")),
+                                       updated=email.utils.format_datetime(updated), items="\n".join(items))
+
+    def _render_atom(self, latest: List[Dict[str, Any]]) -> str:
+        entries = []
+        for meta, content in self._feed_entries(latest):
+            link = html.escape(self._url(f"days/{meta['news_date']}.html"))
+            entry_id = link if self.settings.get("site_url") else f"urn:news-analysis:{meta['news_date']}"
+            entries.append(
+                f"<entry><title>{meta['news_date']} 新闻联播解读</title><id>{entry_id}</id><link href=\"{link}\"/>"
+                f"<updated>{_episode_time(meta).isoformat()}</updated>"
+                f"<content type=\"html\">{html.escape(content)}</content></entry>")
+        updated = _episode_time(latest[0]) if latest else datetime.datetime.now(TIMEZONE)
+        site_id = self.settings.get("site_url") or "urn:news-analysis"
+        return ATOM_TEMPLATE.substitute(title=html.escape(self.settings["title"]), id=html.escape(site_id),
+                                        link=html.escape(self._url("index.html")), self_link=html.escape(self._url("atom.xml")),
+                                        updated=updated.isoformat(), entries="\n".join(entries))
+
+    # --- 生成 ---
+
+    def _plan(self, episodes: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[str, Callable[[], str]]]:
+        """计算站点应有的所有页面：{相对路径: (源哈希, 渲染函数)}。只计算哈希，不渲染。"""
+        dates = sorted(news_date for news_date, meta in episodes.items() if meta["has_analysis"])
+        pages: Dict[str, Tuple[str, Callable[[], str]]] = {}
+        months: Dict[str, List[Dict[str, Any]]] = {}
+        for index, news_date in enumerate(dates):
+            previous = dates[index - 1] if index > 0 else None
+            following = dates[index + 1] if index + 1 < len(dates) else None
+            pages[f"days/{news_date}.html"] = (
+                self._source_hash("day", episodes[news_date]["hash"], previous, following),
+                lambda news_date=news_date, previous=previous, following=following: self._render_day(news_date, previous, following))
+            months.setdefault(news_date[:7], []).append(episodes[news_date])
+
+        for month, metas in months.items():
+            summaries = [(meta["news_date"], meta["hash"]) for meta in metas]
+            pages[f"months/{month}.html"] = (self._source_hash("month", summaries),
+                                             lambda month=month, metas=metas: self._render_month(month, metas))
+
+        newest_first = [episodes[news_date] for news_date in reversed(dates)]
+        latest = newest_first[:self.settings["index_entries"]]
+        pages["index.html"] = (self._source_hash("index", [(meta["news_date"], meta["hash"]) for meta in latest], sorted(months)),
+                               lambda: self._render_index(latest, sorted(months)))
+        feed_latest = newest_first[:self.settings["feed_entries"]]
+        feed_source = [(meta["news_date"], meta["hash"]) for meta in feed_latest]
+        pages["feed.xml"] = (self._source_hash("rss", feed_source), lambda: self._render_rss(feed_latest))
+        pages["atom.xml"] = (self._source_hash("atom", feed_source), lambda: self._render_atom(feed_latest))
+        return pages
+
+    def build(self, full: bool = False) -> Dict[str, Any]:
+        """
+        生成站点。full=True 时忽略 manifest，重新生成所有页面。
+        返回 {"rendered": [重新生成的页面], "unchanged": 未变化的页面数, "removed": [删除的页面]}。
+        """
+        manifest = {} if full else load_json(self.manifest_path, {}) or {}
+        episodes = self._refresh_episodes(manifest.get("episodes", {}))
+        previous_pages: Dict[str, str] = manifest.get("pages", {})
+        pages = self._plan(episodes)
+
+        rendered, unchanged = [], 0
+        for relpath, (source_hash, render) in pages.items():
+            path = os.path.join(self.output_dir, relpath)
+            if previous_pages.get(relpath) == source_hash and os.path.exists(path):
+                unchanged += 1
+                continue
+            write_text_atomic(path, render(), mode=PAGE_FILE_MODE)
+            rendered.append(relpath)
+
+        # 归档中已删除 (或已没有分析) 的日期
+        removed = [relpath for relpath in previous_pages if relpath not in pages]
+        for relpath in removed:
+            try:
+                os.remove(os.path.join(self.output_dir, relpath))
+            except FileNotFoundError:
+                pass
+
+        new_manifest = {"episodes": episodes, "pages": {relpath: source_hash for relpath, (source_hash, _) in pages.items()}}
+        if new_manifest != manifest:
+            dump_json_atomic(self.manifest_path, new_manifest)
+        return {"rendered": rendered, "unchanged": unchanged, "removed": removed}
+
+
+def build_site(full: bool = False) -> Dict[str, Any]:
+    """按 [StaticSite] 配置增量生成静态站点与订阅源。"""
+    result = SiteGenerator().build(full=full)
+    logger.info(f">>> 静态站点已更新: 重新生成 {len(result['rendered'])} 个页面，"
+                f"{result['unchanged']} 个未变化，删除 {len(result['removed'])} 个。")
+    return result
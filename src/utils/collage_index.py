@@ -0,0 +1,90 @@
+import datetime
+import logging
+import os
+import re
+from zoneinfo import ZoneInfo
+from typing import Dict, Any, Optional
+
+from src.utils.json_store import load_json, dump_json_atomic
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+# 归档的封面文件名: collage_<生成日期>_<时间>[_<布局名>].<扩展名>，default 布局没有布局名
+COLLAGE_FILE_PATTERN = re.compile(r"^(collage_(\d{8})_\d{6})(?:_([a-z][a-z0-9_]*))?\.(?:jpg|jpeg|png|webp)$")
+
+
+class CollageIndex:
+    """
+    按新闻日期索引已归档的封面图，替代对 images/collages 目录的逐文件扫描。
+
+    索引文件格式:
+        {"2024-05-01": {"base_name": "collage_20240501_203512",
+                        "files": {"default": "collage_20240501_203512.jpg", ...},
+                        "encodings": {...},
+                        "created_at": "..."}}
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, INDEX_FILENAME)
+        entries = load_json(self.path)
+        if entries is None:
+            entries = self._backfill()
+        self._entries = entries
+
+    def _backfill(self) -> Dict[str, Dict[str, Any]]:
+        """
+        索引文件不存在时 (如升级前生成的封面)，扫描目录一次重建索引并持久化。
+        与升级前按文件名查找的规则一致：文件名中的生成日期即新闻日期，同一天有多组时取最新的一组。
+        """
+        try:
+            filenames = sorted(os.listdir(self.output_dir))
+        except FileNotFoundError:
+            return {}
+        groups: Dict[str, Dict[str, str]] = {}
+        for filename in filenames:
+            match = COLLAGE_FILE_PATTERN.match(filename)
+            if match:
+                base_name, _, layout = match.groups()
+                groups.setdefault(base_name, {})[layout or "default"] = filename
+        entries = {}
+        for base_name, files in sorted(groups.items()):
+            if "default" not in files:
+                continue
+            day = base_name.split("_")[1]
+            news_date = f"{day[:4]}-{day[4:6]}-{day[6:]}"
+            mtime = os.path.getmtime(os.path.join(self.output_dir, files["default"]))
+            entries[news_date] = {
+                "base_name": base_name,
+                "files": files,
+                "encodings": {},
+                "created_at": datetime.datetime.fromtimestamp(mtime, ZoneInfo("Asia/Shanghai")).isoformat(),
+            }
+        if entries:
+            dump_json_atomic(self.path, entries)
+            logger.info(f"封面索引不存在，已从 {self.output_dir} 中的 {len(entries)} 组封面重建。")
+        return entries
+
+    def lookup(self, news_date: str) -> Optional[Dict[str, str]]:
+        """
+        返回某个新闻日期的封面文件路径字典 (以布局名称为键)。
+        索引中记录的文件若已被删除，则视为没有缓存。
+        """
+        entry = self._entries.get(news_date)
+        if not entry:
+            return None
+        paths = {name: os.path.join(self.output_dir, filename) for name, filename in entry.get("files", {}).items()}
+        if "default" not in paths or not all(os.path.exists(path) for path in paths.values()):
+            return None
+        return paths
+
+    def record(self, news_date: str, base_name: str, paths: Dict[str, str], encodings: Dict[str, Any] = None) -> None:
+        """记录一组已写入磁盘的封面，并立即持久化索引。"""
+        self._entries[news_date] = {
+            "base_name": base_name,
+            "files": {name: os.path.basename(path) for name, path in paths.items()},
+            "encodings": encodings or {},
+            "created_at": datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat(),
+        }
+        dump_json_atomic(self.path, self._entries)
@@ -0,0 +1,122 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+import httpx
+import requests
+
+# --- 配置项 ---
+# 剩余时间不足该秒数时不再发起新的请求，直接视为超时
+MIN_REQUEST_SECONDS = 1.0
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """当前截止时间已到，后续的外部调用不再发起。"""
+
+
+class Deadline:
+    """一个基于单调时钟的截止时间点。"""
+
+    def __init__(self, seconds: float, name: str):
+        self.name = name
+        self.expires_at = time.monotonic() + max(0.0, seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# 当前生效的截止时间。contextvars 会随 asyncio 任务和 asyncio.to_thread 传递，
+# 因此在工作线程中发出的请求同样能读到所属阶段的截止时间。
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """返回当前截止时间的剩余秒数；没有截止时间时返回 None。"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else None
+
+
+def caused_by_deadline(error: BaseException) -> bool:
+    """
+    判断异常是否由当前截止时间到期引起，而不是外部服务的故障：
+    DeadlineExceeded，或者在截止时间 (几乎) 用尽时发生的请求超时。
+    request_timeout / httpx_timeout 会把单次请求的超时收紧到阶段剩余时间，因此截止时间到期时
+    多数情况下抛出的是 requests / httpx 的超时异常 (可能被客户端再包装一层)。
+    """
+    deadline = _current_deadline.get()
+    while error is not None:
+        if isinstance(error, DeadlineExceeded):
+            return True
+        if isinstance(error, (TimeoutError, requests.exceptions.Timeout, httpx.TimeoutException)):
+            return deadline is not None and deadline.remaining() < MIN_REQUEST_SECONDS
+        error = error.__cause__
+    return False
+
+
+@contextmanager
+def deadline_scope(seconds: float, name: str):
+    """
+    在代码块内设置截止时间。嵌套时取外层剩余时间与本层预算的较小值，
+    例如各阶段的预算不会超出整个工作流的总预算。
+    """
+    parent = _current_deadline.get()
+    if parent is not None:
+        seconds = min(seconds, parent.remaining())
+    deadline = Deadline(seconds, name)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def request_timeout(default: float) -> float:
+    """
+    返回一次外部请求应使用的超时秒数：默认值与当前截止剩余时间中的较小值。
+    截止时间已到时抛出 DeadlineExceeded，不再发起请求。
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining < MIN_REQUEST_SECONDS:
+        raise DeadlineExceeded(f"[{deadline.name}] 截止时间已到")
+    return min(default, remaining)
+
+
+def httpx_timeout(default: httpx.Timeout) -> httpx.Timeout:
+    """与 request_timeout 相同，但针对 httpx.Timeout 的各个阶段分别收紧。"""
+    if _current_deadline.get() is None:
+        return default
+    return httpx.Timeout(
+        connect=request_timeout(default.connect or float("inf")),
+        read=request_timeout(default.read or float("inf")),
+        write=request_timeout(default.write or float("inf")),
+        pool=request_timeout(default.pool or float("inf")),
+    )
+
+
+async def run_with_deadline(awaitable: Awaitable[T]) -> T:
+    """
+    在当前截止时间内等待协程完成；超时则取消协程并抛出 DeadlineExceeded。
+    协程被取消时，其中已经完成并写入缓存的部分结果会保留下来。
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=deadline.remaining())
+    except asyncio.TimeoutError as e:
+        raise DeadlineExceeded(f"[{deadline.name}] 超过截止时间") from e
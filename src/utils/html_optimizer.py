@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+# 以下依赖均为可选：缺少时跳过对应的优化步骤，输出原样 HTML
+try:
+    import bleach
+except ImportError:
+    bleach = None
+try:
+    from premailer import Premailer
+except ImportError:
+    Premailer = None
+try:
+    from bs4 import BeautifulSoup, Comment, NavigableString
+except ImportError:
+    BeautifulSoup = None
+
+# --- 配置项 ---
+# 微信图文与东方财富编辑器均支持的标签，其余标签去掉标签保留文字
+ALLOWED_TAGS = {
+    "p", "br", "div", "span", "section", "strong", "b", "em", "i", "u",
+    "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "blockquote",
+    "a", "img", "hr", "code", "pre", "table", "thead", "tbody", "tr", "th", "td",
+}
+ALLOWED_ATTRIBUTES = {"a": ["href", "title"], "img": ["src", "alt"], "td": ["colspan", "rowspan"], "th": ["colspan", "rowspan"]}
+# 这些标签内的内容整体删除，而不是只去掉标签
+DROP_CONTENT_TAGS = ["script", "style", "iframe", "object", "embed", "form", "noscript"]
+# 没有文字也有意义的标签
+VOID_TAGS = {"br", "img", "hr"}
+# 各平台需要内联的最小 CSS，只作用于图片，HTML 中没有 <img> 时不内联
+PLATFORM_CSS = {
+    "wechat_work": "img { max-width: 100%; }",
+    "wechat_mp": "img { max-width: 100%; }",
+    "xueqiu": "img { max-width: 100%; }",
+    "eastmoney": "img { max-width: 100%; }",
+}
+OPTIMIZE_CACHE_SIZE = 32
+
+_optimize_cache: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _drop_unsafe_blocks(soup) -> None:
+    for tag in soup.find_all(DROP_CONTENT_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+
+
+def _is_spacer(tag) -> bool:
+    """<p><br></p> 形式的空行。"""
+    return tag.name == "p" and len(tag.contents) == 1 and getattr(tag.contents[0], "name", None) == "br"
+
+
+def _collapse_empty_nodes(soup) -> None:
+    """删除没有内容的节点、块级元素之间的空白文本，并把连续的空行合并为一个。"""
+    # 从内向外处理，子节点被删除后父节点可能也随之变空
+    for tag in reversed(soup.find_all(True)):
+        if tag.name in VOID_TAGS or tag.find(VOID_TAGS):
+            continue
+        if not tag.get_text(strip=True):
+            tag.decompose()
+    for text in soup.find_all(string=True):
+        if isinstance(text, NavigableString) and not text.strip() and text.parent is not None \
+                and text.parent.name in ("[document]", "div", "section", "ul", "ol", "blockquote", "body"):
+            text.extract()
+    for tag in soup.find_all("p"):
+        if _is_spacer(tag):
+            previous = tag.find_previous_sibling()
+            if previous is not None and _is_spacer(previous) and tag.previous_sibling is previous:
+                tag.decompose()
+
+
+def _inline_css(html: str, css: str) -> str:
+    """用 premailer 把 CSS 内联到 style 属性，并只返回 body 内的片段。"""
+    transformed = Premailer(
+        html, css_text=css, keep_style_tags=False, remove_classes=True, strip_important=True,
+        disable_leftover_css=True, allow_network=False, cssutils_logging_level=logging.CRITICAL,
+    ).transform(pretty_print=False)
+    body = BeautifulSoup(transformed, "lxml").body
+    return body.decode_contents(formatter="html5") if body is not None else transformed
+
+
+def _sanitize(html: str) -> str:
+    """清理不支持的标签与属性，合并空节点与多余空行。"""
+    if bleach is not None:
+        if BeautifulSoup is not None:
+            soup = BeautifulSoup(html, "lxml")
+            _drop_unsafe_blocks(soup)
+            html = soup.body.decode_contents(formatter="html5") if soup.body is not None else ""
+        html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True, strip_comments=True)
+    if BeautifulSoup is not None:
+        soup = BeautifulSoup(html, "lxml")
+        root = soup.body or soup
+        _drop_unsafe_blocks(root)
+        _collapse_empty_nodes(root)
+        html = root.decode_contents(formatter="html5")
+    return html
+
+
+def _optimize(html: str, platform: str) -> str:
+    html = _sanitize(html)
+    css = PLATFORM_CSS.get(platform)
+    if css and "<img" in html and Premailer is not None and BeautifulSoup is not None:
+        # 内联的 style 属性只是排版上的改进：只有使内容变小时才采用
+        inlined = _inline_css(html, css)
+        if len(inlined.encode('utf-8')) < len(html.encode('utf-8')):
+            html = inlined
+    return html
+
+
+def optimize_html(html: str, platform: str) -> Tuple[str, Dict]:
+    """
+    优化单个平台的 HTML：清理不支持的标签与属性，合并空节点与多余空行，内联最小 CSS。
+    清理结果总是被采用 (平台不支持的标签不能因为体积而保留)；内联 CSS 后不比清理结果小时
+    (如只给图片加了 style 属性) 放弃内联。结果按 (平台, 内容哈希) 缓存。
+
+    :return: (优化后的 HTML, 字节数报告)。
+    """
+    digest = hashlib.sha256(f"{platform}\n{html}".encode('utf-8')).hexdigest()
+    with _cache_lock:
+        cached = _optimize_cache.get(digest)
+        if cached is not None:
+            _optimize_cache.move_to_end(digest)
+            return cached
+
+    optimized = _optimize(html, platform)
+    original_bytes = len(html.encode('utf-8'))
+    optimized_bytes = len(optimized.encode('utf-8'))
+    report = {
+        "original_bytes": original_bytes,
+        "optimized_bytes": optimized_bytes,
+        "saved_bytes": original_bytes - optimized_bytes,
+        "saved_percent": round((original_bytes - optimized_bytes) * 100 / original_bytes, 1) if original_bytes else 0.0,
+    }
+
+    with _cache_lock:
+        _optimize_cache[digest] = (optimized, report)
+        while len(_optimize_cache) > OPTIMIZE_CACHE_SIZE:
+            _optimize_cache.popitem(last=False)
+    return optimized, report
+
+
+def optimize_platform_html(platform_html: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+    """对 render_platform_html 的结果逐个平台优化，返回 (各平台 HTML, 各平台字节数报告)。"""
+    optimized, reports = {}, {}
+    for platform, html in platform_html.items():
+        optimized[platform], reports[platform] = optimize_html(html, platform)
+    return optimized, reports
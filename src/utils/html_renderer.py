@@ -0,0 +1,92 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Dict, Iterable
+
+import markdown
+
+# --- 配置项 ---
+QR_CODE_URL = "https://mmbiz.qpic.cn/sz_mmbiz_png/oJkJlLSQ7U2ibmnVgKW2PzL3oicrSta2njI9ghvUiaghV3p1g9oHKTagyqN3iacwswMRDOjJibnKsbK1Z0AzfMcoUDQ/640?wx_fmt=png&amp"
+PROMO_HTML = '<div><strong>公众号 Cloudify 每日更新, 欢迎关注转发:  </strong></div>'
+BR_HTML = "<p><br></p>"
+QR_CODE_HTML = f'<div><img src="{QR_CODE_URL}"></div>'
+# 最多缓存多少份分析文本的渲染结果
+RENDER_CACHE_SIZE = 16
+
+# 各平台的渲染配置：
+#   header / footer   正文前后的固定区块
+#   spaced_headings   是否在 <h3><strong>...</strong></h3> 前后加空行以改善间距 (微信排版)
+RENDER_PROFILES = {
+    "wechat_work": {"header": PROMO_HTML, "footer": BR_HTML + PROMO_HTML + QR_CODE_HTML, "spaced_headings": True},
+    "wechat_mp": {"header": PROMO_HTML, "footer": BR_HTML + PROMO_HTML + QR_CODE_HTML, "spaced_headings": True},
+    "xueqiu": {"header": PROMO_HTML, "footer": BR_HTML + PROMO_HTML + QR_CODE_HTML, "spaced_headings": True},
+    "eastmoney": {"header": PROMO_HTML, "footer": PROMO_HTML, "spaced_headings": False},
+}
+
+H3_HEADING_PATTERN = re.compile(r'(<h3><strong>.*?</strong></h3>)')
+
+
+def _compile_template(profile: Dict) -> Template:
+    """把平台的固定区块预先填入模板，渲染时只需代入正文。"""
+    # 固定区块中的 $ 需要转义，避免被当作占位符
+    header = profile.get("header", "").replace("$", "$$")
+    footer = profile.get("footer", "").replace("$", "$$")
+    return Template(f"{header}$body{footer}")
+
+
+# 预编译的各平台模板
+PLATFORM_TEMPLATES = {platform: _compile_template(profile) for platform, profile in RENDER_PROFILES.items()}
+
+_render_cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analysis_hash(analysis_text: str) -> str:
+    return hashlib.sha256(analysis_text.encode('utf-8')).hexdigest()
+
+
+def _render_body(analysis_text: str) -> Dict[bool, str]:
+    """解析一次 Markdown，得到紧凑正文与加了标题间距的正文两种形式。"""
+    html = markdown.markdown(analysis_text)
+    # 移除换行符
+    compact = html.replace("\n", "").replace("\r", "").strip()
+    spaced = H3_HEADING_PATTERN.sub(rf'{BR_HTML}\1{BR_HTML}', compact)
+    return {False: compact, True: spaced}
+
+
+def render_platform_html(analysis_text: str, platforms: Iterable[str] = None) -> Dict[str, str]:
+    """
+    将 AI 分析的 Markdown 渲染为各平台的 HTML。Markdown 只解析一次，所有平台共用解析结果，
+    再分别套用预编译的模板。结果按分析文本的哈希缓存，相同的分析不会重复渲染。
+
+    :param analysis_text: AI 分析生成的 Markdown 文本。
+    :param platforms: 需要渲染的平台，默认渲染 RENDER_PROFILES 中的全部平台。
+    :return: 以平台名称为键、HTML 为值的字典。
+    """
+    platforms = list(platforms or RENDER_PROFILES)
+    digest = analysis_hash(analysis_text)
+    with _cache_lock:
+        cached = _render_cache.get(digest)
+        if cached is not None and all(platform in cached for platform in platforms):
+            _render_cache.move_to_end(digest)
+            return {platform: cached[platform] for platform in platforms}
+
+    bodies = _render_body(analysis_text)
+    rendered = {
+        platform: PLATFORM_TEMPLATES[platform].substitute(body=bodies[RENDER_PROFILES[platform]["spaced_headings"]])
+        for platform in platforms
+    }
+
+    with _cache_lock:
+        _render_cache.setdefault(digest, {}).update(rendered)
+        _render_cache.move_to_end(digest)
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return rendered
+
+
+def render_analysis_html(analysis_text: str) -> str:
+    """渲染不带平台固定区块的正文 HTML，供归档 API 与静态站点使用。"""
+    return _render_body(analysis_text)[False]
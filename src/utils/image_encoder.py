@@ -0,0 +1,139 @@
+import io
+import logging
+from typing import Dict, Any, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+# 各平台封面的编码配置：
+#   max_bytes: 字节预算，编码结果需不超过该大小
+#   formats:   该平台接受的格式，按优先顺序尝试 (公众号与企业微信均不接受 WebP)
+#   min_quality / max_quality: 质量搜索区间
+PLATFORM_ENCODE_PROFILES = {
+    "default": {"max_bytes": 200 * 1024, "formats": ["JPEG"], "min_quality": 40, "max_quality": 92},
+    "wechat_mp": {"max_bytes": 300 * 1024, "formats": ["JPEG"], "min_quality": 40, "max_quality": 92},
+    "wechat_work": {"max_bytes": 300 * 1024, "formats": ["JPEG"], "min_quality": 40, "max_quality": 92},
+    "square": {"max_bytes": 60 * 1024, "formats": ["WEBP", "JPEG"], "min_quality": 40, "max_quality": 90},
+}
+
+# 只有在 4:2:0 下已能以不低于该质量满足预算时，才尝试更清晰但更大的 4:4:4 采样
+FULL_CHROMA_QUALITY_THRESHOLD = 90
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "WEBP": ".webp"}
+
+# Pillow 中 JPEG 色度采样参数: 0 = 4:4:4, 2 = 4:2:0
+SUBSAMPLING_NAMES = {0: "4:4:4", 2: "4:2:0"}
+
+
+def _encode(image: Image.Image, image_format: str, quality: int, subsampling: int = 2) -> bytes | None:
+    """
+    按指定参数编码一次图片，返回编码后的字节。
+    progressive 编码要求结果不超过 宽*高 字节，超出时 Pillow 会报错，此时返回 None (必然超出预算)。
+    """
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        # optimize 与 progressive 只影响熵编码，不损失画质，却能稳定减小体积
+        try:
+            image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True, subsampling=subsampling)
+        except OSError:
+            return None
+    elif image_format == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=6)
+    else:
+        raise ValueError(f"不支持的编码格式: {image_format}")
+    return buffer.getvalue()
+
+
+def _search_quality(image: Image.Image, image_format: str, max_bytes: int, min_quality: int,
+                    max_quality: int, subsampling: int = 2) -> Tuple[bytes, int] | None:
+    """
+    在 [min_quality, max_quality] 内二分查找满足字节预算的最高质量。
+    若最低质量也无法满足预算，返回 None。
+    """
+    best = None
+    low, high = min_quality, max_quality
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(image, image_format, quality, subsampling)
+        if data is not None and len(data) <= max_bytes:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def _build_params(image_format: str, data: bytes, quality: int, max_bytes: int, subsampling: int | None) -> Dict[str, Any]:
+    """整理最终选用的编码参数，便于记录到缓存中。"""
+    params = {
+        "format": image_format,
+        "extension": FORMAT_EXTENSIONS[image_format],
+        "quality": quality,
+        "bytes": len(data),
+        "max_bytes": max_bytes,
+        "within_budget": len(data) <= max_bytes,
+    }
+    if image_format == "JPEG":
+        params.update({
+            "progressive": True,
+            "optimize": True,
+            "subsampling": SUBSAMPLING_NAMES[subsampling],
+        })
+    else:
+        params["method"] = 6
+    return params
+
+
+def encode_to_budget(image: Image.Image, profile: Dict[str, Any]) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    将图片编码到给定的字节预算内，并尽量保留画质。
+
+    依次尝试 profile 中的每种格式，对每种格式二分搜索满足预算的最高质量；
+    JPEG 在高质量时会额外尝试 4:4:4 色度采样。第一个满足预算的格式即被采用。
+    若所有格式在最低质量下仍超出预算，则返回体积最小的结果，并标记 within_budget=False。
+
+    :return: (编码后的字节, 选用的编码参数)
+    """
+    max_bytes = profile["max_bytes"]
+    min_quality = profile.get("min_quality", 40)
+    max_quality = profile.get("max_quality", 92)
+    image = image.convert("RGB")
+
+    for image_format in profile["formats"]:
+        if image_format == "JPEG":
+            result = _search_quality(image, "JPEG", max_bytes, min_quality, max_quality, subsampling=2)
+            if not result:
+                continue
+            data, quality = result
+            subsampling = 2
+            if quality >= FULL_CHROMA_QUALITY_THRESHOLD:
+                full_chroma = _search_quality(image, "JPEG", max_bytes, FULL_CHROMA_QUALITY_THRESHOLD, max_quality, subsampling=0)
+                if full_chroma:
+                    (data, quality), subsampling = full_chroma, 0
+            return data, _build_params("JPEG", data, quality, max_bytes, subsampling)
+
+        result = _search_quality(image, image_format, max_bytes, min_quality, max_quality)
+        if result:
+            data, quality = result
+            return data, _build_params(image_format, data, quality, max_bytes, None)
+
+    # 预算无法满足：退而求其次，返回最低质量下体积最小的编码
+    fallbacks = []
+    for image_format in profile["formats"]:
+        data = _encode(image, image_format, min_quality)
+        if data is None:
+            continue
+        fallbacks.append((len(data), image_format, data))
+    if not fallbacks:
+        raise ValueError("封面无法按任何配置的格式编码。")
+    _, image_format, data = min(fallbacks)
+    logger.warning(f"警告: 封面在最低质量 {min_quality} 下仍超出预算 ({len(data)} > {max_bytes} 字节)。")
+    return data, _build_params(image_format, data, min_quality, max_bytes, 2 if image_format == "JPEG" else None)
+
+
+def encode_for_platform(image: Image.Image, platform: str) -> Tuple[bytes, Dict[str, Any]]:
+    """使用平台对应的编码配置编码封面；未知平台使用 default 配置。"""
+    profile = PLATFORM_ENCODE_PROFILES.get(platform, PLATFORM_ENCODE_PROFILES["default"])
+    return encode_to_budget(image, profile)
@@ -2,32 +2,49 @@ import asyncio
 import httpx
 import random
 import io
-from typing import List
+import logging
+import os
+from typing import List, Dict, Any, Tuple
 
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+logger = logging.getLogger(__name__)
 
 try:
     from PIL import Image, ImageOps
 except ImportError:
-    print("错误: Pillow 库未安装。请在终端运行 'pip install Pillow' 来安装它。")
+    logger.error("错误: Pillow 库未安装。请在终端运行 'pip install Pillow' 来安装它。")
     exit(1)
 
+from src.utils.image_encoder import encode_for_platform
+from src.utils.retry_policy import IMAGE_DOWNLOAD_POLICY
+from src.utils.metrics import run_metrics
+from src.utils.deadline import request_timeout
+from src.config import resolve_url
+
 # --- 配置项 ---
 THUMBNAIL_SIZE = (200, 200)
 GRID_COLS = 3
 GRID_ROWS = 2
 IMAGES_NEEDED = GRID_COLS * GRID_ROWS
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type(httpx.RequestError),
-    reraise=True
-)
+# 封面布局配置：每个平台一种布局，size 为输出尺寸 (宽, 高)，cols/rows 为网格行列数。
+# 所有布局共用同一次解码的图片，只在裁剪尺寸上不同。
+COVER_LAYOUTS = {
+    # 原有的 600x400 3x2 拼接图，用于本地存档
+    "default": {"cols": GRID_COLS, "rows": GRID_ROWS, "size": (THUMBNAIL_SIZE[0] * GRID_COLS, THUMBNAIL_SIZE[1] * GRID_ROWS)},
+    # 微信公众号图文封面，2.35:1
+    "wechat_mp": {"cols": 3, "rows": 2, "size": (900, 383)},
+    # 企业微信图文消息缩略图，推荐 1068x455
+    "wechat_work": {"cols": 3, "rows": 2, "size": (1068, 455)},
+    # 方形预览图
+    "square": {"cols": 2, "rows": 2, "size": (400, 400)},
+}
+
+@IMAGE_DOWNLOAD_POLICY
 async def download_image_with_retry(client: httpx.AsyncClient, url: str):
     """使用重试机制异步下载单个图片。"""
     # print(f"尝试下载: {url}")
-    response = await client.get(url, timeout=20.0)
+    response = await client.get(resolve_url(url), timeout=request_timeout(20.0))
+    run_metrics.record_transfer("image_cdn", response)
     response.raise_for_status()
     return response.content
 
@@ -39,7 +56,7 @@ async def _download_images_concurrently(client: httpx.AsyncClient, image_urls: L
     image_bytes_list = []
     for i, result in enumerate(results):
         if isinstance(result, Exception):
-            print(f"下载最终失败 {image_urls[i]}: {repr(result)}")
+            logger.error(f"下载最终失败 {image_urls[i]}: {repr(result)}")
         else:
             # print(f"下载成功: {image_urls[i]}")
             image_bytes_list.append(result)
@@ -62,7 +79,7 @@ async def download_selected_images(image_urls: List[str]) -> List[bytes]:
             # 随机选择要尝试下载的URL，数量不超过剩余URL数
             urls_to_try = random.sample(remaining_urls, min(num_to_select, len(remaining_urls)))
             
-            print(f"尝试从 {len(remaining_urls)} 个链接中下载 {len(urls_to_try)} 张图片...")
+            logger.info(f"尝试从 {len(remaining_urls)} 个链接中下载 {len(urls_to_try)} 张图片...")
             
             # 并发下载选定的图片
             newly_downloaded = await _download_images_concurrently(client, urls_to_try)
@@ -72,17 +89,99 @@ async def download_selected_images(image_urls: List[str]) -> List[bytes]:
             remaining_urls = [url for url in remaining_urls if url not in urls_to_try]
             
             if not newly_downloaded and remaining_urls:
-                print("本次尝试未能下载任何新图片，且仍有剩余链接，继续尝试...")
+                logger.info("本次尝试未能下载任何新图片，且仍有剩余链接，继续尝试...")
             elif not remaining_urls and len(downloaded_images_bytes) < IMAGES_NEEDED:
-                print(f"所有可用链接已尝试完毕，但未能下载到足够的 {IMAGES_NEEDED} 张图片。")
+                logger.info(f"所有可用链接已尝试完毕，但未能下载到足够的 {IMAGES_NEEDED} 张图片。")
                 break
 
     if len(downloaded_images_bytes) < IMAGES_NEEDED:
-        print(f"警告: 最终只成功下载了 {len(downloaded_images_bytes)} 张图片，未能达到所需的 {IMAGES_NEEDED} 张。")
+        logger.warning(f"警告: 最终只成功下载了 {len(downloaded_images_bytes)} 张图片，未能达到所需的 {IMAGES_NEEDED} 张。")
     
     return downloaded_images_bytes
 
 
+def decode_images(image_bytes_list: List[bytes], max_size: tuple = None) -> List["Image.Image"]:
+    """
+    将图片二进制列表解码为RGB图像，每张图片只解码一次。
+    若提供 max_size，会利用 JPEG 的 draft 模式直接以较低分辨率解码，减少解码开销。
+    解码失败的图片会被跳过。
+    """
+    decoded_images = []
+    for img_bytes in image_bytes_list:
+        try:
+            img = Image.open(io.BytesIO(img_bytes))
+            if max_size:
+                img.draft("RGB", max_size)
+            decoded_images.append(img.convert("RGB"))
+        except Exception as e:
+            logger.error(f"处理一张图片时失败: {e}")
+    return decoded_images
+
+
+def _largest_cell_size(layouts: Dict[str, Dict[str, Any]]) -> tuple:
+    """计算所有布局中最大的单元格尺寸，用于确定解码分辨率的下限。"""
+    width = max(layout["size"][0] // layout["cols"] for layout in layouts.values())
+    height = max(layout["size"][1] // layout["rows"] for layout in layouts.values())
+    return width, height
+
+
+def render_layouts(images: List["Image.Image"], layouts: Dict[str, Dict[str, Any]] = None) -> Dict[str, "Image.Image"]:
+    """
+    布局引擎：使用同一组已解码的图片，一次性渲染多个网格布局。
+
+    相同单元格尺寸的缩略图只裁剪一次并在各布局间复用。
+    每个布局按 cols * rows 取用前若干张图片，并铺满整个输出尺寸。
+
+    :param images: 已解码的RGB图片列表。
+    :param layouts: 布局配置，格式同 COVER_LAYOUTS。
+    :return: 以布局名称为键的拼接图字典。
+    """
+    layouts = layouts or COVER_LAYOUTS
+    thumb_cache = {}
+    variants = {}
+    for name, layout in layouts.items():
+        cols, rows = layout["cols"], layout["rows"]
+        total_width, total_height = layout["size"]
+        needed = cols * rows
+        if len(images) < needed:
+            raise ValueError(f"布局 {name} 需要至少 {needed} 张图片, 但只提供了 {len(images)} 张。")
+
+        # 列宽/行高按整数切分，余数分配给最后一列/行，保证铺满输出尺寸
+        col_edges = [total_width * c // cols for c in range(cols + 1)]
+        row_edges = [total_height * r // rows for r in range(rows + 1)]
+
+        grid_image = Image.new('RGB', (total_width, total_height))
+        for index in range(needed):
+            row = index // cols
+            col = index % cols
+            cell_size = (col_edges[col + 1] - col_edges[col], row_edges[row + 1] - row_edges[row])
+            cache_key = (index, cell_size)
+            thumb = thumb_cache.get(cache_key)
+            if thumb is None:
+                thumb = ImageOps.fit(images[index], cell_size, Image.Resampling.LANCZOS)
+                thumb_cache[cache_key] = thumb
+            grid_image.paste(thumb, (col_edges[col], row_edges[row]))
+        variants[name] = grid_image
+    return variants
+
+
+def create_cover_variants(image_bytes_list: List[bytes], layouts: Dict[str, Dict[str, Any]] = None) -> Dict[str, "Image.Image"]:
+    """
+    从图片二进制列表一次性生成所有平台的封面变体。
+    图片只解码一次，随后交给布局引擎按各平台的尺寸与网格渲染。
+    """
+    layouts = layouts or COVER_LAYOUTS
+    needed = max(layout["cols"] * layout["rows"] for layout in layouts.values())
+    if len(image_bytes_list) < needed:
+        raise ValueError(f"创建封面需要至少 {needed} 张图片, 但只提供了 {len(image_bytes_list)} 张。")
+
+    logger.info(f"开始解码 {len(image_bytes_list)} 张已下载的图片，渲染 {len(layouts)} 种封面布局...")
+    images = decode_images(image_bytes_list, max_size=_largest_cell_size(layouts))
+    if len(images) < needed:
+        raise ValueError(f"能成功处理的图片少于 {needed} 张，无法创建网格。")
+    return render_layouts(images, layouts)
+
+
 def create_image_grid(image_bytes_list: List[bytes], output_path: str = "collage.jpg") -> str:
     """
     从给定的图片二进制列表中，通过裁剪来填充单元格，创建一个无缝的3x2网格图片并保存。
@@ -91,31 +190,58 @@ def create_image_grid(image_bytes_list: List[bytes], output_path: str = "collage
     if len(image_bytes_list) < IMAGES_NEEDED:
         raise ValueError(f"创建网格需要至少 {IMAGES_NEEDED} 张图片, 但只提供了 {len(image_bytes_list)} 张。")
 
-    print(f"开始处理 {IMAGES_NEEDED} 张已下载的图片以创建网格...")
-    processed_images = []
-    for img_bytes in image_bytes_list: # 直接使用传入的列表，不再随机选择
-        try:
-            img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-            cropped_thumb = ImageOps.fit(img, THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            processed_images.append(cropped_thumb)
-        except Exception as e:
-            print(f"处理一张图片时失败: {e}")
-
-    if len(processed_images) < IMAGES_NEEDED:
-        raise ValueError(f"能成功处理的图片少于 {IMAGES_NEEDED} 张，无法创建网格。")
-
-    total_width = THUMBNAIL_SIZE[0] * GRID_COLS
-    total_height = THUMBNAIL_SIZE[1] * GRID_ROWS
-    grid_image = Image.new('RGB', (total_width, total_height))
-
-    print("开始将6张裁剪后的图片拼接到一张大图上...")
-    for index, thumb in enumerate(processed_images):
-        row = index // GRID_COLS
-        col = index % GRID_COLS
-        x_offset = col * THUMBNAIL_SIZE[0]
-        y_offset = row * THUMBNAIL_SIZE[1]
-        grid_image.paste(thumb, (x_offset, y_offset))
-
-    grid_image.save(output_path)
-    print(f"成功！无缝拼接的图片已保存至: {output_path}")
-    return output_path
\ No newline at end of file
+    layouts = {"default": COVER_LAYOUTS["default"]}
+    grid_image = create_cover_variants(image_bytes_list[:IMAGES_NEEDED], layouts)["default"]
+    data, params = encode_for_platform(grid_image, "default")
+    with open(output_path, 'wb') as f:
+        f.write(data)
+    logger.info(f"封面编码参数: {params}")
+    logger.info(f"成功！无缝拼接的图片已保存至: {output_path}")
+    return output_path
+
+
+def encode_cover_variants(variants: Dict[str, "Image.Image"]) -> Tuple[Dict[str, bytes], Dict[str, Dict[str, Any]]]:
+    """
+    将布局引擎输出的封面变体按各平台的字节预算编码到内存中。
+
+    :return: (以布局名称为键的编码字节, 以布局名称为键的编码参数)
+    """
+    encoded = {}
+    encodings = {}
+    for name, image in variants.items():
+        data, params = encode_for_platform(image, name)
+        encoded[name] = data
+        encodings[name] = params
+        logger.info(f"    封面变体 {name}: {params['format']} q={params['quality']}, {params['bytes'] // 1024} KB")
+    return encoded, encodings
+
+
+def _write_cover_files(encoded: Dict[str, bytes], encodings: Dict[str, Dict[str, Any]], output_dir: str, base_name: str) -> Dict[str, str]:
+    """将已编码的封面变体写入磁盘，返回以布局名称为键的文件路径字典。"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name, data in encoded.items():
+        suffix = "" if name == "default" else f"_{name}"
+        path = os.path.join(output_dir, f"{base_name}{suffix}{encodings[name]['extension']}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths[name] = path
+    logger.info(f"成功！{len(paths)} 种封面变体已归档至: {output_dir}")
+    return paths
+
+
+async def persist_cover_variants(encoded: Dict[str, bytes], encodings: Dict[str, Dict[str, Any]], output_dir: str, base_name: str) -> Dict[str, str]:
+    """
+    在后台线程中将封面变体写入磁盘归档，不阻塞事件循环。
+    default 布局保存为 `<base_name>.jpg`，其余布局保存为 `<base_name>_<布局名><扩展名>`。
+    """
+    return await asyncio.to_thread(_write_cover_files, encoded, encodings, output_dir, base_name)
+
+
+def read_cover_files(paths: Dict[str, str]) -> Dict[str, bytes]:
+    """将已归档的封面文件一次性读入内存，供各平台上传复用。"""
+    encoded = {}
+    for name, path in paths.items():
+        with open(path, 'rb') as f:
+            encoded[name] = f.read()
+    return encoded
@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+import tempfile
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# 运行时状态文件 (media ID 账本、token 缓存等) 统一存放在项目根目录下的 data 文件夹中
+STATE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data'))
+
+
+def load_json(path: str, default: Any = None) -> Any:
+    """读取 JSON 文件；文件不存在或内容损坏时返回 default。"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"读取 JSON 文件失败 ({path}): {e}")
+        return default
+
+
+def write_text_atomic(path: str, text: str, mode: int = None) -> None:
+    """
+    原子地写入文本文件：先写入同目录下的临时文件，再通过 os.replace 替换目标文件，
+    避免进程中断时留下写了一半的文件，读者也不会读到写了一半的内容。
+    临时文件的权限为 0600；需要被其他用户 (如 Web 服务器) 读取时传入 mode。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def dump_json_atomic(path: str, data: Any) -> None:
+    """原子地写入 JSON 文件 (见 write_text_atomic)。"""
+    write_text_atomic(path, json.dumps(data, ensure_ascii=False, indent=4))
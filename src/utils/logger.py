@@ -1,30 +1,130 @@
 #!/usr/bin/env python
 # -*- encoding=utf8 -*-
+import atexit
+import datetime
+import json
 import logging
 import logging.handlers
 import os
+import queue
+from zoneinfo import ZoneInfo
+
+from src.config import LOGGING_CONFIG, register_reload_hook
+from src.utils.tracing import current_span, tracer
 
 # 确保日志文件在项目根目录下的 logs 文件夹中
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_FILENAME = os.path.join(LOG_DIR, 'app.log') # 统一日志文件名
 
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
 logger = logging.getLogger()
 
-def set_logger():
-    logger.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s - %(filename)s [line:%(lineno)d] '
-                                  '- %(levelname)s - %(process)d: %(message)s')
+# LogRecord 的标准属性；其余属性视为调用方通过 extra 传入的结构化字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "run_id", "stage"}
+
+_listener: logging.handlers.QueueListener = None
+
+
+class RunContextFilter(logging.Filter):
+    """在产生日志的线程中为记录附加运行 ID 与当前阶段 (取自追踪上下文)。"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        record.run_id = tracer.run_id
+        record.stage = span.inherited("stage") if span else None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为单行 JSON。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created, ZoneInfo("Asia/Shanghai")).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+            "file": record.filename,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队前只做最少的处理：合并消息参数、把异常栈转为文本，
+    保留 run_id / stage 等字段，真正的格式化与 I/O 在监听线程中进行。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def set_logger(config: dict = LOGGING_CONFIG):
+    """
+    配置基于队列的日志：各线程 (包括异步工作流所在线程) 只把记录放入队列，
+    控制台与文件输出由后台的 QueueListener 线程完成。重复调用不会重复添加 handler。
+
+    - 日志文件为 JSON lines，每行带有 run_id 与 stage；
+    - 控制台按 console_format 输出文本或 JSON；
+    - module_levels 按模块覆盖日志级别。
+    """
+    global _listener
+    if _listener is not None:
+        return
 
     # 控制台输出
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.setFormatter(JsonFormatter() if config["console_format"] == "json" else logging.Formatter(TEXT_FORMAT))
 
     # 文件输出，使用 RotatingFileHandler 实现日志轮转
     file_handler = logging.handlers.RotatingFileHandler(
         LOG_FILENAME, maxBytes=10485760, backupCount=5, encoding="utf-8")
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _ContextQueueHandler(log_queue)
+    queue_handler.addFilter(RunContextFilter())
+
+    logger.handlers.clear()
+    logger.addHandler(queue_handler)
+    apply_log_levels(config)
+    # 常驻模式下修改 [Logging] 后按新级别生效
+    register_reload_hook(lambda: apply_log_levels(config))
+
+    _listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    # 进程退出前把队列中剩余的日志写完
+    atexit.register(stop_logger)
+
+
+def apply_log_levels(config: dict = LOGGING_CONFIG):
+    """设置全局与按模块的日志级别。"""
+    logger.setLevel(config["level"])
+    for name, level in config["module_levels"].items():
+        logging.getLogger(name).setLevel(level)
+
 
-set_logger()
+def stop_logger():
+    """停止监听线程并写出队列中剩余的日志。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,222 @@
+import asyncio
+import contextlib
+import datetime
+import glob
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterator, List, Tuple
+from zoneinfo import ZoneInfo
+
+from src.utils.json_store import STATE_DIR, dump_json_atomic
+
+# --- 配置项 ---
+METRICS_DIR = os.path.join(STATE_DIR, 'metrics')
+# 每次运行的 JSON 报告保留的份数
+REPORT_KEEP = 30
+# Prometheus 指标名前缀
+METRIC_PREFIX = "cctv_news"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels) + "}"
+
+
+def _payload_size(body: Any) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    try:
+        return len(body)
+    except TypeError:
+        # 流式请求体 (如文件对象) 无法直接得到长度
+        return 0
+
+
+class RunMetrics:
+    """
+    单次运行的指标：耗时区间 (span) 与计数器。
+
+    - span: 阶段、外部调用、各平台发布的耗时与结果 (ok / error / timeout / cancelled)；
+    - 计数器: 重试次数、缓存命中、失败次数、传输字节数、Gemini token 数等。
+
+    运行结束后通过 export() 导出为 JSON 运行报告和 Prometheus textfile，
+    供 node_exporter 的 textfile collector 采集，用于 cron 运行的绘图与告警。
+    线程安全：发布与上传在线程池中执行，也会写入同一个实例。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, run_id: str = None) -> None:
+        with self._lock:
+            self.run_id = run_id
+            self.started_at = time.time()
+            self._started = time.perf_counter()
+            self.status = "running"
+            self._spans: List[Dict[str, Any]] = []
+            self._counters: Dict[Tuple[str, LabelKey], float] = defaultdict(float)
+
+    def set_status(self, status: str) -> None:
+        self.status = status
+
+    @contextlib.contextmanager
+    def span(self, name: str, **labels) -> Iterator[Dict[str, Any]]:
+        """
+        记录一段操作的耗时。产出的字典可用于在操作过程中补充标签，
+        例如 with run_metrics.span("call", operation="x") as span: span["labels"]["status_code"] = 200
+        """
+        record = {"name": name, "labels": dict(labels), "start": time.time(), "status": "ok"}
+        started = time.perf_counter()
+        try:
+            yield record
+        except (TimeoutError, asyncio.TimeoutError):
+            record["status"] = "timeout"
+            raise
+        except asyncio.CancelledError:
+            record["status"] = "cancelled"
+            raise
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["duration"] = round(time.perf_counter() - started, 6)
+            with self._lock:
+                self._spans.append(record)
+
+    def add_span(self, name: str, duration: float, status: str = "ok", **labels) -> None:
+        """记录一段已经结束、由调用方自行计时的操作。"""
+        record = {"name": name, "labels": labels, "start": time.time() - duration, "status": status, "duration": round(duration, 6)}
+        with self._lock:
+            self._spans.append(record)
+
+    def incr(self, name: str, value: float = 1, **labels) -> None:
+        """累加一个计数器。"""
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += value
+
+    def record_transfer(self, service: str, response: Any) -> None:
+        """记录一次 HTTP 交互的收发字节数，兼容 requests 与 httpx 的响应对象。"""
+        request = getattr(response, "request", None)
+        body = getattr(request, "body", None)
+        if body is None and request is not None:
+            with contextlib.suppress(Exception):
+                body = request.content
+        self.incr("bytes_sent", _payload_size(body), service=service)
+        self.incr("bytes_received", len(response.content or b""), service=service)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, _label_key(labels)), 0)
+
+    def spans(self, name: str = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(span) for span in self._spans if name is None or span["name"] == name]
+
+    def report(self) -> Dict[str, Any]:
+        """整理为 JSON 运行报告：运行概况、各 span 明细与计数器。"""
+        with self._lock:
+            spans = [dict(span) for span in self._spans]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        return {
+            "run_id": self.run_id,
+            "started_at": datetime.datetime.fromtimestamp(self.started_at, ZoneInfo("Asia/Shanghai")).isoformat(),
+            "duration": round(time.perf_counter() - self._started, 3),
+            "status": self.status,
+            "spans": sorted(spans, key=lambda span: span["start"]),
+            "counters": counters,
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        生成 Prometheus textfile 格式。每次运行都会重置指标，因此全部以 gauge 导出 "上次运行" 的数值：
+        span 按名称与标签汇总为总耗时和次数，计数器直接导出。
+        """
+        with self._lock:
+            span_sums: Dict[LabelKey, float] = defaultdict(float)
+            span_counts: Dict[LabelKey, int] = defaultdict(int)
+            for span in self._spans:
+                key = _label_key({"span": span["name"], "status": span["status"], **span["labels"]})
+                span_sums[key] += span["duration"]
+                span_counts[key] += 1
+            counters = sorted(self._counters.items())
+
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_last_run_timestamp_seconds 上次运行的开始时间。",
+            f"# TYPE {p}_last_run_timestamp_seconds gauge",
+            f"{p}_last_run_timestamp_seconds {self.started_at:.3f}",
+            f"# HELP {p}_last_run_duration_seconds 上次运行的总耗时。",
+            f"# TYPE {p}_last_run_duration_seconds gauge",
+            f"{p}_last_run_duration_seconds {time.perf_counter() - self._started:.3f}",
+            f"# HELP {p}_last_run_success 上次运行是否完整结束 (1 为是)。",
+            f"# TYPE {p}_last_run_success gauge",
+            f"{p}_last_run_success {1 if self.status == 'completed' else 0}",
+            f"# HELP {p}_last_run_info 上次运行的运行 ID，与追踪文件中的 trace ID 相同。",
+            f"# TYPE {p}_last_run_info gauge",
+            f"{p}_last_run_info{_format_labels(_label_key({'run_id': self.run_id}))} 1",
+            f"# HELP {p}_span_duration_seconds 上次运行中各操作的累计耗时。",
+            f"# TYPE {p}_span_duration_seconds gauge",
+        ]
+        lines += [f"{p}_span_duration_seconds{_format_labels(key)} {value:.6f}" for key, value in sorted(span_sums.items())]
+        lines += [f"# HELP {p}_span_count 上次运行中各操作的执行次数。", f"# TYPE {p}_span_count gauge"]
+        lines += [f"{p}_span_count{_format_labels(key)} {value}" for key, value in sorted(span_counts.items())]
+
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{p}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines += [f"# HELP {metric} 上次运行中的 {name} 计数。", f"# TYPE {metric} gauge"]
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, report_dir: str = METRICS_DIR, textfile_path: str = None) -> str:
+        """写入本次运行的 JSON 报告与 Prometheus textfile，返回报告路径。"""
+        report = self.report()
+        stamp = datetime.datetime.fromtimestamp(self.started_at, ZoneInfo("Asia/Shanghai")).strftime("%Y%m%d_%H%M%S")
+        # 常驻模式下同一秒内可能有多次运行，文件名带上运行 ID 前缀
+        suffix = f"_{self.run_id[:8]}" if self.run_id else ""
+        report_path = os.path.join(report_dir, f"run_{stamp}{suffix}.json")
+        dump_json_atomic(report_path, report)
+        # 只保留最近的若干份报告
+        for old in sorted(glob.glob(os.path.join(report_dir, "run_*.json")))[:-REPORT_KEEP]:
+            os.remove(old)
+
+        textfile_path = textfile_path or os.path.join(report_dir, f"{METRIC_PREFIX}.prom")
+        directory = os.path.dirname(os.path.abspath(textfile_path))
+        os.makedirs(directory, exist_ok=True)
+        # textfile collector 可能随时读取，同样先写临时文件再替换
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".prom")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, textfile_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return report_path
+
+
+# 全局单例，每次运行开始时 reset()
+run_metrics = RunMetrics()
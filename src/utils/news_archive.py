@@ -0,0 +1,124 @@
+import datetime
+import glob
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from src.services.publishers import PUBLISH_TIMESTAMP_KEYS
+from src.utils.json_store import STATE_DIR, load_json, dump_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+ARCHIVE_DIR = os.path.join(STATE_DIR, 'archive')
+# 抓取的标题带有 "[视频]" 前缀，正文中的标题则没有
+TITLE_PREFIX = "[视频]"
+
+
+def normalize_date(value: str) -> str:
+    """把 "2024-5-1" 等新闻日期统一为 "2024-05-01"；格式无效时抛出 ValueError。"""
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+
+
+def _strip_prefix(title: str) -> str:
+    return title[len(TITLE_PREFIX):] if title.startswith(TITLE_PREFIX) else title
+
+
+def build_episode(news_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从工作流的 news_data 中提取需要长期保存的内容：新闻条目 (含标签)、AI 分析与各平台的发布时间。
+    封面 Media ID、HTML 优化报告等只对当次发布有意义的字段不归档。
+    """
+    urls = {_strip_prefix(item.get("title", "")): item.get("url") for item in news_data.get("news_list_detail", [])}
+    items = []
+    for item in news_data.get("contents", []):
+        entry = {"title": item.get("title", ""), "url": urls.get(item.get("title", "")), "content": (item.get("content") or "").strip()}
+        if "tags" in item:
+            entry["tags"] = item["tags"]
+        items.append(entry)
+    published = {platform: news_data[key] for platform, key in PUBLISH_TIMESTAMP_KEYS.items() if news_data.get(key)}
+    return {
+        "news_date": normalize_date(news_data["news_date"]),
+        "fetch_timestamp": news_data.get("fetch_timestamp"),
+        "items": items,
+        "analysis": news_data.get("analysis"),
+        "published": published,
+        # 打标签所用词典的摘要，统计分析据此判断能否直接复用标签
+        "tags_dictionary": news_data.get("tags_dictionary"),
+    }
+
+
+class NewsArchive:
+    """
+    按新闻日期保存的历史归档，每天一个 JSON 文件: data/archive/2024-05-01.json。
+
+    news_data.json 只保存最近一天的工作状态，归档供 API、静态站点与统计分析读取，
+    这些读者不会接触工作流正在使用的文件。文件整体原子替换，读者不会读到写了一半的内容。
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+
+    def path(self, news_date: str) -> str:
+        return os.path.join(self.directory, f"{normalize_date(news_date)}.json")
+
+    def save(self, news_data: Dict[str, Any]) -> Optional[str]:
+        """
+        归档 news_data，返回文件路径。没有新闻内容或内容不完整时不归档；
+        与已归档内容相同时不重写文件 (文件的修改时间是读者判断内容是否变化的依据)。
+        """
+        if not news_data.get("news_date") or not news_data.get("contents") or news_data.get("contents_partial"):
+            return None
+        episode = build_episode(news_data)
+        path = self.path(episode["news_date"])
+        existing = load_json(path)
+        if existing:
+            episode["archived_at"] = existing.get("archived_at")
+            if existing == episode:
+                return path
+        episode["archived_at"] = datetime.datetime.now(ZoneInfo("Asia/Shanghai")).isoformat()
+        dump_json_atomic(path, episode)
+        return path
+
+    def dates(self) -> List[str]:
+        """所有已归档的日期，升序。"""
+        names = (os.path.basename(path)[:-len(".json")] for path in glob.glob(os.path.join(self.directory, "*.json")))
+        dates = []
+        for name in names:
+            try:
+                dates.append(normalize_date(name))
+            except ValueError:
+                continue
+        return sorted(dates)
+
+    def load(self, news_date: str) -> Optional[Dict[str, Any]]:
+        try:
+            return load_json(self.path(news_date))
+        except ValueError:
+            return None
+
+    def version(self, news_date: str) -> Optional[Tuple[int, int]]:
+        """某一天归档文件的 (修改时间, 大小)，文件不存在时返回 None。用作缓存的版本号。"""
+        try:
+            stat = os.stat(self.path(news_date))
+        except (OSError, ValueError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def archive_version(self) -> Tuple[int, int]:
+        """整个归档的版本号：(文件数, 最新修改时间)。任何一天新增或更新都会改变。"""
+        count, latest = 0, 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".json") and not entry.name.startswith("."):
+                        count += 1
+                        latest = max(latest, entry.stat().st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return count, latest
+
+
+# 全局单例
+news_archive = NewsArchive()
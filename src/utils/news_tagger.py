@@ -0,0 +1,223 @@
+import collections
+import functools
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+try:
+    import ahocorasick  # pyahocorasick：C 实现的自动机，未安装时使用下面的纯 Python 实现
+except ImportError:
+    ahocorasick = None
+
+from src.config import TAGGING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+DEFAULT_DICTIONARY_PATH = os.path.join(PROJECT_ROOT, 'config', 'tag_dictionary.tsv')
+# 词典中的标签类别 -> 提示词中的名称
+TAG_KINDS = {"sector": "板块", "company": "公司", "policy": "政策"}
+
+
+class TagEntry(NamedTuple):
+    tag: str
+    kind: str
+    code: str
+
+
+def load_dictionary(path: str) -> Dict[str, Tuple[TagEntry, ...]]:
+    """
+    读取标签词典，返回 {关键词: (标签, ...)}。每行一个标签，用制表符分隔:
+        类别    标签    代码    关键词1|关键词2|...
+    类别为 sector / company / policy，代码 (如股票代码) 可以留空，# 开头的行为注释。
+    同一个关键词可以属于多个标签。
+    """
+    terms: Dict[str, List[TagEntry]] = collections.defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) != 4 or fields[0] not in TAG_KINDS or not fields[1].strip():
+                logger.warning(f"标签词典第 {line_number} 行格式无效，已跳过: {line}")
+                continue
+            entry = TagEntry(fields[1].strip(), fields[0], fields[2].strip())
+            for term in fields[3].split("|"):
+                term = term.strip().casefold()
+                if term and entry not in terms[term]:
+                    terms[term].append(entry)
+    return {term: tuple(entries) for term, entries in terms.items()}
+
+
+class AhoCorasick:
+    """
+    纯 Python 的 Aho-Corasick 自动机：一次线性扫描找出文本中所有词典关键词的出现位置，
+    耗时与文本长度 (加上匹配数) 成正比，与词典大小无关。
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的关键词 (长度, 值)，构建时合并失败链上的输出
+        self._out: List[List[Tuple[int, Any]]] = [[]]
+        self._root_pattern = re.compile("(?!)")
+
+    def add(self, term: str, value: Any) -> None:
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(term), value))
+
+    def build(self) -> None:
+        """按广度优先计算失败链接。"""
+        queue = collections.deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                if self._out[self._fail[next_state]]:
+                    self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        if self._goto[0]:
+            self._root_pattern = re.compile("[" + "".join(re.escape(char) for char in sorted(self._goto[0])) + "]")
+
+    def iter(self, text: str) -> Iterator[Tuple[int, Tuple[int, Any]]]:
+        """产出 (结束位置, (关键词长度, 值))，与 pyahocorasick 的 Automaton.iter 一致。"""
+        goto, fail, out = self._goto, self._fail, self._out
+        # 回到初始状态时，用正则直接跳到下一个可能开始关键词的字符，跳过大段无关文本
+        search = self._root_pattern.search
+        state, index, length = 0, 0, len(text)
+        while index < length:
+            if not state:
+                match = search(text, index)
+                if match is None:
+                    return
+                index = match.start()
+            char = text[index]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for match in out[state]:
+                    yield index, match
+            index += 1
+
+
+def _build_automaton(terms: Dict[str, Tuple[TagEntry, ...]]):
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for term, entries in terms.items():
+            automaton.add_word(term, (len(term), entries))
+        automaton.make_automaton()
+        return automaton
+    automaton = AhoCorasick()
+    for term, entries in terms.items():
+        automaton.add(term, entries)
+    automaton.build()
+    return automaton
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class NewsTagger:
+    """
+    把词典编译为一个自动机，为新闻打上板块、公司与政策标签。
+
+    同一位置有多个关键词重叠时取最长且最靠左的一个 (如 "新能源汽车" 不再重复计为 "新能源")；
+    英文与数字关键词 (如 "AI"、"5G") 要求前后不是字母或数字，避免匹配到单词内部。
+    """
+
+    def __init__(self, terms: Dict[str, Tuple[TagEntry, ...]]):
+        self.term_count = len(terms)
+        self.digest = hashlib.sha256(repr(sorted(terms.items())).encode('utf-8')).hexdigest()[:16]
+        self._automaton = _build_automaton(terms)
+
+    @classmethod
+    def from_file(cls, path: str) -> "NewsTagger":
+        return cls(load_dictionary(path))
+
+    def matches(self, text: str) -> List[Tuple[int, int, str, Tuple[TagEntry, ...]]]:
+        """返回不重叠的匹配 [(起始位置, 结束位置, 原文关键词, 标签)]，按位置排序。"""
+        folded = text.casefold()
+        if len(folded) != len(text):
+            # 少数字符 casefold 后长度改变，此时位置无法对应原文，改用逐字符折叠
+            folded = "".join(char.casefold()[0] for char in text)
+        candidates = []
+        for end, (length, entries) in self._automaton.iter(folded):
+            start = end - length + 1
+            if _is_word_char(folded[start]) and start > 0 and _is_word_char(folded[start - 1]):
+                continue
+            if _is_word_char(folded[end]) and end + 1 < len(folded) and _is_word_char(folded[end + 1]):
+                continue
+            candidates.append((start, end + 1, entries))
+        candidates.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected, last_end = [], 0
+        for start, end, entries in candidates:
+            if start >= last_end:
+                selected.append((start, end, text[start:end], entries))
+                last_end = end
+        return selected
+
+    def tag_text(self, text: str) -> List[Dict[str, Any]]:
+        """统计文本中每个标签的出现次数与命中的关键词，按次数从多到少排序。"""
+        tags: Dict[TagEntry, Dict[str, Any]] = {}
+        for _, _, term, entries in self.matches(text):
+            for entry in entries:
+                tag = tags.setdefault(entry, {"tag": entry.tag, "kind": entry.kind, "code": entry.code, "count": 0, "terms": []})
+                tag["count"] += 1
+                if term not in tag["terms"]:
+                    tag["terms"].append(term)
+        return sorted(tags.values(), key=lambda tag: -tag["count"])
+
+    def tag_contents(self, contents: List[Dict[str, Any]]) -> None:
+        """为每条新闻 (含 title 与 content) 原地加上 tags 字段。"""
+        for item in contents:
+            item["tags"] = self.tag_text(f"{item.get('title', '')}\n{item.get('content') or ''}")
+
+
+@functools.lru_cache(maxsize=1)
+def _load_tagger(path: str, mtime_ns: int) -> NewsTagger:
+    tagger = NewsTagger.from_file(path)
+    logger.info(f"标签词典已编译: {tagger.term_count} 个关键词 ({'pyahocorasick' if ahocorasick else '纯 Python'} 自动机)")
+    return tagger
+
+
+def get_tagger() -> Optional[NewsTagger]:
+    """
+    返回按 [Tagging] 配置编译的标签器；词典不存在时返回 None。
+    自动机在进程内只编译一次，词典文件修改后下次取用时重新编译。
+    """
+    path = TAGGING_CONFIG["dictionary_path"] or DEFAULT_DICTIONARY_PATH
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        logger.warning(f"标签词典不存在: {path}")
+        return None
+    return _load_tagger(path, mtime_ns)
+
+
+def format_tag_hints(tags: List[Dict[str, Any]], limit: int = None) -> str:
+    """把一条新闻的标签格式化为提示词中的一行，如 "板块: 电力设备、汽车; 公司: 宁德时代(300750)"。"""
+    limit = TAGGING_CONFIG["max_prompt_tags"] if limit is None else limit
+    groups: Dict[str, List[str]] = {}
+    for tag in tags[:limit]:
+        label = f"{tag['tag']}({tag['code']})" if tag.get("code") else tag["tag"]
+        groups.setdefault(tag["kind"], []).append(label)
+    return "; ".join(f"{TAG_KINDS.get(kind, kind)}: {'、'.join(labels)}" for kind, labels in groups.items())
@@ -0,0 +1,246 @@
+import asyncio
+import contextvars
+import email.utils
+import functools
+import inspect
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple, Type
+
+import httpx
+import requests
+
+from src.utils.deadline import remaining_time
+from src.utils.metrics import run_metrics
+from src.utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# --- 配置项 ---
+# 单次运行 (一次 main_workflow) 内所有操作合计允许的重试次数
+RUN_RETRY_BUDGET = 30
+# 服务端通过 Retry-After 要求等待的时长上限，超过则放弃重试
+MAX_RETRY_AFTER_SECONDS = 60
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 请求尚未发出即失败的异常 (连接阶段出错)，即使是非幂等操作重试也不会产生重复副作用
+NOT_SENT_ERRORS: Tuple[Type[BaseException], ...] = (
+    requests.exceptions.ConnectTimeout,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+)
+
+# 常用的可重试异常集合
+REQUESTS_NETWORK_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError)
+HTTPX_NETWORK_ERRORS = (httpx.TransportError, httpx.HTTPStatusError)
+
+# 当前调用所处的重试次数 (从 1 开始)，供日志与追踪读取
+current_attempt: contextvars.ContextVar[int] = contextvars.ContextVar("current_attempt", default=1)
+# 是否已处于某个重试策略内部：嵌套的策略只执行一次，由最外层统一重试，避免重试次数相乘
+_inside_retry: contextvars.ContextVar[bool] = contextvars.ContextVar("inside_retry", default=False)
+
+
+class RetryBudget:
+    """
+    单次运行的重试预算。所有策略共享同一个预算，预算耗尽后任何操作都不再重试，
+    从而限制一次运行中重试带来的最坏延迟。
+    """
+
+    def __init__(self, max_retries: int = RUN_RETRY_BUDGET):
+        self.max_retries = max_retries
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.used >= self.max_retries:
+                return False
+            self.used += 1
+            return True
+
+    def reset(self, max_retries: int = None) -> None:
+        with self._lock:
+            self.used = 0
+            if max_retries is not None:
+                self.max_retries = max_retries
+
+
+run_retry_budget = RetryBudget()
+
+
+def _response_of(exc: BaseException):
+    return getattr(exc, "response", None)
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    response = _response_of(exc)
+    return getattr(response, "status_code", None) if response is not None else None
+
+
+def parse_retry_after(exc: BaseException) -> Optional[float]:
+    """从异常携带的 HTTP 响应中解析 Retry-After (秒数或 HTTP 日期)，没有时返回 None。"""
+    response = _response_of(exc)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    统一的重试策略，替代各模块中层层嵌套的 tenacity 装饰器。
+
+    - 每个操作有自己的最大尝试次数与累计等待上限 (单操作预算)，所有操作共享运行级预算；
+    - 退避采用带完全抖动的指数退避，并优先遵循服务端返回的 Retry-After；
+    - 非幂等操作 (发消息、建草稿、上传永久素材) 只在请求确定未发出时重试，避免重复副作用；
+    - 策略嵌套时只有最外层会重试，内层只执行一次。
+
+    既可作为装饰器使用 (同步与异步函数均可)，也可通过 run()/run_async() 直接调用。
+    """
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 10.0,
+                 max_total_delay: float = 30.0, retry_on: Tuple[Type[BaseException], ...] = REQUESTS_NETWORK_ERRORS,
+                 idempotent: bool = True, budget: RetryBudget = None):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_delay = max_total_delay
+        self.retry_on = retry_on
+        self.idempotent = idempotent
+        self.budget = budget or run_retry_budget
+
+    def _is_retryable(self, exc: BaseException) -> bool:
+        if not isinstance(exc, self.retry_on):
+            return False
+        status = _status_of(exc)
+        if status is not None and status not in RETRYABLE_STATUS_CODES:
+            return False
+        if self.idempotent:
+            return True
+        # 非幂等操作：只有确定请求未被处理时才重试 (连接失败，或服务端明确限流)
+        return isinstance(exc, NOT_SENT_ERRORS) or status == 429
+
+    def _next_delay(self, attempt: int, exc: BaseException) -> float:
+        retry_after = parse_retry_after(exc)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _plan_retry(self, attempt: int, exc: BaseException, waited: float) -> Optional[float]:
+        """决定是否重试；返回需要等待的秒数，不重试时返回 None。"""
+        if attempt >= self.max_attempts or not self._is_retryable(exc):
+            return None
+        delay = self._next_delay(attempt, exc)
+        if delay > MAX_RETRY_AFTER_SECONDS or waited + delay > self.max_total_delay:
+            logger.warning(f"[重试] {self.name} 需等待 {delay:.1f}s，超出该操作的重试预算，放弃重试。")
+            return None
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            logger.warning(f"[重试] {self.name} 需等待 {delay:.1f}s，但当前阶段只剩 {remaining:.1f}s，放弃重试。")
+            return None
+        if not self.budget.try_acquire():
+            logger.warning(f"[重试] 本次运行的重试预算 ({self.budget.max_retries} 次) 已用尽，{self.name} 不再重试。")
+            return None
+        logger.warning(f"[重试] {self.name} 第 {attempt} 次尝试失败 ({exc!r})，{delay:.1f}s 后重试。")
+        run_metrics.incr("retries", operation=self.name)
+        return delay
+
+    def run(self, func: Callable, *args, **kwargs) -> Any:
+        """按策略同步执行 func。"""
+        if _inside_retry.get():
+            return func(*args, **kwargs)
+        inside_token = _inside_retry.set(True)
+        try:
+            waited = 0.0
+            attempt = 1
+            while True:
+                attempt_token = current_attempt.set(attempt)
+                try:
+                    # 每次尝试记录为一个 call span，最终失败计入 call_failures；追踪中的 HTTP 请求挂在该尝试之下
+                    with run_metrics.span("call", operation=self.name), tracer.span(self.name, **{"retry.attempt": attempt}):
+                        return func(*args, **kwargs)
+                except Exception as e:
+                    delay = self._plan_retry(attempt, e, waited)
+                    if delay is None:
+                        run_metrics.incr("call_failures", operation=self.name)
+                        raise
+                finally:
+                    current_attempt.reset(attempt_token)
+                time.sleep(delay)
+                waited += delay
+                attempt += 1
+        finally:
+            _inside_retry.reset(inside_token)
+
+    async def run_async(self, func: Callable, *args, **kwargs) -> Any:
+        """按策略异步执行协程函数 func。"""
+        if _inside_retry.get():
+            return await func(*args, **kwargs)
+        inside_token = _inside_retry.set(True)
+        try:
+            waited = 0.0
+            attempt = 1
+            while True:
+                attempt_token = current_attempt.set(attempt)
+                try:
+                    # 每次尝试记录为一个 call span，最终失败计入 call_failures；追踪中的 HTTP 请求挂在该尝试之下
+                    with run_metrics.span("call", operation=self.name), tracer.span(self.name, **{"retry.attempt": attempt}):
+                        return await func(*args, **kwargs)
+                except Exception as e:
+                    delay = self._plan_retry(attempt, e, waited)
+                    if delay is None:
+                        run_metrics.incr("call_failures", operation=self.name)
+                        raise
+                finally:
+                    current_attempt.reset(attempt_token)
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+        finally:
+            _inside_retry.reset(inside_token)
+
+    def __call__(self, func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.run_async(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.run(func, *args, **kwargs)
+        return wrapper
+
+
+# --- 各操作的重试策略 ---
+# 只读/幂等请求：可放心重试
+WECHAT_TOKEN_POLICY = RetryPolicy("wechat.token", max_attempts=3, base_delay=1, max_delay=8)
+CCTV_PAGE_POLICY = RetryPolicy("cctv.page", max_attempts=3, base_delay=2, max_delay=10, retry_on=HTTPX_NETWORK_ERRORS)
+CRAWL_SERVICE_POLICY = RetryPolicy("crawl.service", max_attempts=3, base_delay=2, max_delay=10, retry_on=HTTPX_NETWORK_ERRORS)
+IMAGE_DOWNLOAD_POLICY = RetryPolicy("image.download", max_attempts=3, base_delay=1, max_delay=5, max_total_delay=10, retry_on=HTTPX_NETWORK_ERRORS)
+GEMINI_PROXY_POLICY = RetryPolicy("gemini.proxy", max_attempts=2, base_delay=5, max_delay=20, max_total_delay=30)
+XUEQIU_READ_POLICY = RetryPolicy("xueqiu.read", max_attempts=3, base_delay=1, max_delay=5, retry_on=HTTPX_NETWORK_ERRORS)
+# 临时素材重复上传没有副作用，按幂等处理
+WECHAT_WORK_MEDIA_POLICY = RetryPolicy("wechat_work.media_upload", max_attempts=3, base_delay=1, max_delay=8)
+
+# 有副作用的写操作：只在请求确定未发出时重试
+WECHAT_MP_UPLOAD_POLICY = RetryPolicy("wechat_mp.upload", max_attempts=3, base_delay=1, max_delay=8, idempotent=False)
+WECHAT_MP_DRAFT_POLICY = RetryPolicy("wechat_mp.draft", max_attempts=3, base_delay=1, max_delay=8, idempotent=False)
+WECHAT_WORK_SEND_POLICY = RetryPolicy("wechat_work.send", max_attempts=3, base_delay=1, max_delay=8, idempotent=False)
+XUEQIU_WRITE_POLICY = RetryPolicy("xueqiu.write", max_attempts=3, base_delay=1, max_delay=5, retry_on=HTTPX_NETWORK_ERRORS, idempotent=False)
+EASTMONEY_PUBLISH_POLICY = RetryPolicy("eastmoney.publish", max_attempts=3, base_delay=1, max_delay=8, idempotent=False)
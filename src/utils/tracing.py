@@ -0,0 +1,300 @@
+import contextlib
+import contextvars
+import datetime
+import functools
+import glob
+import os
+import secrets
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+from zoneinfo import ZoneInfo
+
+import httpx
+import requests
+
+from src.utils.json_store import STATE_DIR, dump_json_atomic
+
+# --- 配置项 ---
+TRACES_DIR = os.path.join(STATE_DIR, 'traces')
+# 保留最近的若干份追踪文件
+TRACE_KEEP = 30
+SERVICE_NAME = "cctv-news"
+
+# OTLP 中的 SpanKind 与 StatusCode 取值
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# 计时阶段 -> httpcore trace 扩展的 (开始事件, 结束事件)。httpcore 在 connect_tcp 内部完成 DNS 解析，因此 DNS 计入 connect
+_PHASE_EVENTS = {
+    "connect": ("connection.connect_tcp.started", "connection.connect_tcp.complete"),
+    "tls": ("connection.start_tls.started", "connection.start_tls.complete"),
+    "send": ("send_request_headers.started", "send_request_body.complete"),
+    "wait": ("send_request_body.complete", "receive_response_headers.complete"),
+    "download": ("receive_response_body.started", "receive_response_body.complete"),
+}
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一个追踪区间，字段与 OpenTelemetry 的 Span 对应。"""
+
+    def __init__(self, trace_id: str, name: str, parent: Optional["Span"], kind: int, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+        self._started = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._started) * 1000, 3)
+
+    def inherited(self, key: str) -> Any:
+        """沿父链查找某个属性，例如 HTTP 请求所属的重试次数。"""
+        span = self
+        while span is not None:
+            if key in span.attributes:
+                return span.attributes[key]
+            span = span.parent
+        return None
+
+    def to_otlp(self) -> Dict[str, Any]:
+        data = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message} if self.status_message else {"code": self.status_code},
+        }
+        if self.parent is not None:
+            data["parentSpanId"] = self.parent.span_id
+        return data
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        # OTLP JSON 中 int64 以字符串表示
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def current_span() -> Optional[Span]:
+    """返回当前上下文中的 span，不在任何 span 内时返回 None。"""
+    return _current_span.get()
+
+
+class Tracer:
+    """
+    单次运行的轻量追踪器：一次运行对应一个 trace (其 ID 即运行 ID)，
+    阶段、重试策略的每次尝试、每个 HTTP 请求依次嵌套为子 span。
+    当前 span 保存在 contextvar 中，会随 asyncio 任务与 asyncio.to_thread 传播。
+    结束后以 OTLP JSON 格式写入本地文件，可直接导入 Jaeger 等支持 OTLP 的工具。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start_run()
+
+    @property
+    def run_id(self) -> str:
+        return self.trace_id
+
+    def start_run(self) -> str:
+        """开始新的一次运行，清空已记录的 span 并返回新的运行 ID。"""
+        with self._lock:
+            self.trace_id = secrets.token_hex(16)
+            self.started_at = time.time()
+            self._spans: List[Span] = []
+        return self.trace_id
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Span]:
+        """开启一个子 span；块内抛出的异常会把 span 标记为 ERROR。"""
+        span = Span(self.trace_id, name, _current_span.get(), kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_attribute("error.type", type(e).__name__)
+            span.set_error(str(e) or type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            if span.status_code == STATUS_UNSET:
+                span.status_code = STATUS_OK
+            with self._lock:
+                self._spans.append(span)
+
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME),
+                                            _otlp_attribute("run.id", self.trace_id)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in sorted(self.spans(), key=lambda span: span.start_ns)],
+                }],
+            }]
+        }
+
+    def export(self, trace_dir: str = TRACES_DIR) -> str:
+        """写入 OTLP JSON 追踪文件并返回路径。"""
+        stamp = datetime.datetime.fromtimestamp(self.started_at, ZoneInfo("Asia/Shanghai")).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(trace_dir, f"trace_{stamp}_{self.trace_id[:8]}.json")
+        dump_json_atomic(path, self.to_otlp())
+        for old in sorted(glob.glob(os.path.join(trace_dir, "trace_*.json")))[:-TRACE_KEEP]:
+            os.remove(old)
+        return path
+
+
+# 全局单例，每次运行开始时 start_run()
+tracer = Tracer()
+
+
+# --- HTTP 请求追踪 ---
+def _start_http_span(method: str, url: str, request_headers) -> contextlib.AbstractContextManager:
+    parts = urlsplit(str(url))
+    # 查询参数中可能带有 access_token 等凭证，不写入追踪文件
+    attributes = {
+        "http.request.method": method,
+        "url.full": urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")),
+        "server.address": parts.hostname,
+    }
+    if request_headers.get("Content-Length"):
+        attributes["http.request.body.size"] = int(request_headers["Content-Length"])
+    return tracer.span(f"{method} {parts.hostname}", kind=SPAN_KIND_CLIENT, **attributes)
+
+
+def _finish_http_span(span: Span, status_code: int, body_size: Optional[int]) -> None:
+    attempt = span.inherited("retry.attempt")
+    if attempt:
+        # OpenTelemetry 语义约定：重发次数，首次请求为 0
+        span.set_attribute("http.request.resend_count", attempt - 1)
+    span.set_attribute("http.response.status_code", status_code)
+    span.set_attribute("http.response.body.size", body_size)
+    span.set_attribute("http.timing.total_ms", span.elapsed_ms())
+    if status_code >= 400:
+        span.set_error(f"HTTP {status_code}")
+
+
+class _PhaseTimer:
+    """接收 httpcore 的 trace 事件，计算连接 (含 DNS)、TLS、发送、等待首字节与下载各阶段耗时。"""
+
+    def __init__(self, previous: Callable = None):
+        self.previous = previous
+        self.events: Dict[str, float] = {}
+
+    def record(self, event: str, info: Dict[str, Any]) -> None:
+        # 事件名形如 "http11.send_request_body.complete"，去掉协议前缀后统一处理 HTTP/1.1 与 HTTP/2
+        name = event if event.startswith("connection.") else event.partition(".")[2]
+        self.events[name] = time.perf_counter()
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        self.record(event, info)
+        if self.previous:
+            self.previous(event, info)
+
+    async def async_callback(self, event: str, info: Dict[str, Any]) -> None:
+        self.record(event, info)
+        if self.previous:
+            await self.previous(event, info)
+
+    def apply(self, span: Span) -> None:
+        for phase, (start_event, end_event) in _PHASE_EVENTS.items():
+            started, completed = self.events.get(start_event), self.events.get(end_event)
+            if started is not None and completed is not None:
+                span.set_attribute(f"http.timing.{phase}_ms", round((completed - started) * 1000, 3))
+        headers_done = self.events.get("receive_response_headers.complete")
+        if headers_done is not None:
+            span.set_attribute("http.timing.ttfb_ms", round((headers_done - span._started) * 1000, 3))
+
+
+def _response_size(response) -> Optional[int]:
+    with contextlib.suppress(Exception):
+        return len(response.content)
+    length = response.headers.get("Content-Length")
+    return int(length) if length else None
+
+
+def _trace_httpx_send(original: Callable) -> Callable:
+    @functools.wraps(original)
+    def send(self, request: httpx.Request, **kwargs):
+        with _start_http_span(request.method, request.url, request.headers) as span:
+            timer = _PhaseTimer(request.extensions.get("trace"))
+            request.extensions["trace"] = timer
+            response = original(self, request, **kwargs)
+            timer.apply(span)
+            _finish_http_span(span, response.status_code, _response_size(response))
+            return response
+    send._traced = True
+    return send
+
+
+def _trace_httpx_send_async(original: Callable) -> Callable:
+    @functools.wraps(original)
+    async def send(self, request: httpx.Request, **kwargs):
+        with _start_http_span(request.method, request.url, request.headers) as span:
+            timer = _PhaseTimer(request.extensions.get("trace"))
+            request.extensions["trace"] = timer.async_callback
+            response = await original(self, request, **kwargs)
+            timer.apply(span)
+            _finish_http_span(span, response.status_code, _response_size(response))
+            return response
+    send._traced = True
+    return send
+
+
+def _trace_requests_send(original: Callable) -> Callable:
+    @functools.wraps(original)
+    def send(self, request: requests.PreparedRequest, **kwargs):
+        with _start_http_span(request.method, request.url, request.headers) as span:
+            response = original(self, request, **kwargs)
+            # requests 不提供连接阶段的细分，elapsed 为发出请求到解析完响应头的耗时
+            span.set_attribute("http.timing.ttfb_ms", round(response.elapsed.total_seconds() * 1000, 3))
+            _finish_http_span(span, response.status_code, _response_size(response))
+            return response
+    send._traced = True
+    return send
+
+
+def install_http_tracing() -> None:
+    """
+    为 requests 与 httpx 的所有请求开启追踪 (包括 google SDK 的 REST 传输)，重复调用无副作用。
+    做法与 OpenTelemetry 的 requests/httpx instrumentation 相同：包装 Session.send 与 Client.send。
+    """
+    if getattr(requests.Session.send, "_traced", False):
+        return
+    requests.Session.send = _trace_requests_send(requests.Session.send)
+    httpx.Client.send = _trace_httpx_send(httpx.Client.send)
+    httpx.AsyncClient.send = _trace_httpx_send_async(httpx.AsyncClient.send)